@@ -1,89 +1,66 @@
-from typing import Any, Dict, Optional
-from google.adk.agents import Agent
+import functools
+import os
+from typing import TYPE_CHECKING, Any, Dict, Optional
 import json
 
-
-def classify_document_with_llm(document_content: str, image_data: Optional[str] = None) -> Dict[str, Any]:
+from lazy_registry import LazyRegistry
+
+from .classification import STREAM_CHUNK_SIZE, classify_stream
+from .document_store import CLASSIFICATION_STATE_KEY, content_ref
+from .field_extractor import EXPECTED_FIELDS, extract_fields
+
+if TYPE_CHECKING:
+    from google.adk.tools import ToolContext
+
+# 'multi_agent' (root, classifier and extractor turns) or 'single_shot' (one structured-output call)
+AGENT_MODE = os.environ.get('DOCUMENT_AGENT_MODE', 'multi_agent')
+# Path of a JSON lines file that receives per-stage trace spans; unset disables tracing
+TRACE_PATH = os.environ.get('DOCUMENT_AGENT_TRACE')
+# Extraction specialists started speculatively, for the top N keyword types, while the LLM classifies; 0 disables
+SPECULATIVE_EXTRACTIONS = int(os.environ.get('DOCUMENT_AGENT_SPECULATE', '0'))
+# Path of a near-duplicate index (SQLite, needs numpy); unset disables near-duplicate reuse
+NEAR_DUPLICATE_INDEX_PATH = os.environ.get('DOCUMENT_AGENT_NEAR_DUPLICATES')
+# Root agent attribute served in each agent mode
+AGENT_MODE_ROOTS = {
+    'multi_agent': 'multi_agent_root',
+    'single_shot': 'single_shot_agent',
+}
+if AGENT_MODE not in AGENT_MODE_ROOTS:
+    raise ValueError(f"DOCUMENT_AGENT_MODE must be one of {', '.join(AGENT_MODE_ROOTS)}, not {AGENT_MODE!r}")
+
+# Agents and their callbacks are built on first access, so importing the tools needs no google.adk
+_lazy = LazyRegistry(globals())
+__getattr__ = _lazy.module_getattr
+__dir__ = _lazy.module_dir
+
+
+def classify_document_with_llm(document_content: str, image_data: Optional[str] = None,
+                               tool_context: Optional['ToolContext'] = None) -> Dict[str, Any]:
     """
     Classify document type using LLM analysis through a specialized sub-agent.
     
     Args:
         document_content: Text content extracted from document
-        image_data: Base64 encoded image data (optional)
+        image_data: Base64 encoded image data (optional): a PNG, or one or
+            more concatenated PGM/PPM pages
         
     Returns:
-        Dictionary with classification results
+        Dictionary with classification results, plus an 'image' summary of
+        the scan's pages when image_data is given
     """
-    # This function will be called by the classification sub-agent
-    # For now, we'll create a structured prompt that the LLM can process
-    
-    classification_prompt = f"""
-    Analyze the following document content and classify it into one of these categories:
-    1. KYC (Know Your Customer) - Identity verification, customer due diligence, compliance documents
-    2. PASSPORT - Travel documents with personal identification information
-    3. W9 - US tax forms for taxpayer identification and certification
-    4. UNKNOWN - If the document doesn't fit the above categories
-    
-    Document content:
-    {document_content}
-    
-    Provide your response in JSON format with:
-    - document_type: one of "kyc", "passport", "w9", or "unknown"
-    - confidence: a number between 0 and 1
-    - reasoning: brief explanation for the classification
-    """
-    
-    # This will be handled by the sub-agent, but for direct function calls,
-    # we'll provide a fallback classification logic
-    content_lower = document_content.lower()
-    
-    # Enhanced keyword sets for better LLM-style analysis
-    classification_indicators = {
-        'kyc': {
-            'keywords': ['know your customer', 'kyc', 'identity verification', 'customer identification',
-                        'due diligence', 'aml', 'anti-money laundering', 'beneficial owner', 'customer name',
-                        'customer id', 'verification date', 'risk level', 'compliance'],
-            'patterns': ['customer', 'verification', 'identity', 'risk']
-        },
-        'passport': {
-            'keywords': ['passport', 'travel document', 'nationality', 'passport number', 'passport no',
-                        'place of birth', 'issuing authority', 'expiry date', 'given names', 'surname'],
-            'patterns': ['passport', 'nationality', 'travel', 'issued', 'expiry']
-        },
-        'w9': {
-            'keywords': ['w-9', 'form w-9', 'taxpayer identification', 'request for taxpayer',
-                        'backup withholding', 'ein', 'ssn', 'taxpayer identification number',
-                        'tax classification', 'business name'],
-            'patterns': ['taxpayer', 'form', 'tax', 'withholding', 'certification']
-        }
-    }
-    
-    # Calculate sophisticated scores
-    scores = {}
-    for doc_type, indicators in classification_indicators.items():
-        keyword_score = sum(1 for keyword in indicators['keywords'] if keyword in content_lower)
-        pattern_score = sum(1 for pattern in indicators['patterns'] if pattern in content_lower)
-        scores[doc_type] = keyword_score + (pattern_score * 0.5)
-    
-    # Determine classification with confidence
-    if max(scores.values()) == 0:
-        classification = 'unknown'
-        confidence = 0.0
-        reasoning = 'No matching patterns found for any supported document type'
-    else:
-        classification = max(scores, key=scores.get)
-        total_score = sum(scores.values())
-        confidence = scores[classification] / total_score if total_score > 0 else 0.0
-        reasoning = f'High confidence match for {classification} document based on content analysis'
-    
-    return {
-        'document_type': classification,
-        'confidence': min(confidence, 1.0),  # Cap confidence at 1.0
-        'scores': scores,
-        'reasoning': reasoning,
-        'classification_method': 'llm_enhanced',
-        'description': f'Document classified as {classification} with confidence {confidence:.2%}'
-    }
+    # Score the text slice by slice so a very large document is never lowercased in one full-size copy
+    chunks = (document_content[i:i + STREAM_CHUNK_SIZE] for i in range(0, len(document_content), STREAM_CHUNK_SIZE))
+    classification = classify_stream(chunks)
+    if image_data:
+        # Headers and hash samples only; the pixels the model sees come from image_compactor
+        try:
+            from .image_intake import scan_summary
+            classification['image'] = scan_summary(image_data)
+        except (ImportError, ValueError) as e:
+            classification['image'] = {'error': str(e)}
+    if tool_context is not None:
+        tool_context.state[CLASSIFICATION_STATE_KEY] = classification
+    return classification
 
 
 # Legacy function for backward compatibility
@@ -106,15 +83,18 @@ def extract_kyc_with_llm(document_content: str) -> Dict[str, Any]:
     """
     # This function provides the expected structure for KYC extraction
     # The actual extraction will be performed by the LLM sub-agent
+    local = extract_fields('kyc', document_content)
     return {
         'document_type': 'kyc',
-        'expected_fields': [
-            'customer_name', 'customer_id', 'date_of_birth', 'address', 
-            'phone_number', 'email', 'id_document_type', 'id_document_number', 
-            'verification_date', 'risk_level'
-        ],
+        'expected_fields': list(EXPECTED_FIELDS['kyc']),
+        # Fields parsed from labelled lines; the LLM only needs to fill missing_fields
+        'extracted_fields': local['extracted_fields'],
+        'field_confidence': local['field_confidence'],
+        'missing_fields': local['missing_fields'],
         'extraction_method': 'llm_based',
-        'document_content': document_content
+        # The text is already in the conversation; return a handle instead of echoing it
+        'document_ref': content_ref(document_content),
+        'document_length': len(document_content)
     }
 
 
@@ -130,15 +110,18 @@ def extract_passport_with_llm(document_content: str) -> Dict[str, Any]:
     """
     # This function provides the expected structure for passport extraction
     # The actual extraction will be performed by the LLM sub-agent
+    local = extract_fields('passport', document_content)
     return {
         'document_type': 'passport',
-        'expected_fields': [
-            'passport_number', 'surname', 'given_names', 'nationality', 
-            'date_of_birth', 'place_of_birth', 'sex', 'date_of_issue', 
-            'date_of_expiry', 'issuing_authority'
-        ],
+        'expected_fields': list(EXPECTED_FIELDS['passport']),
+        # Fields parsed from labelled lines; the LLM only needs to fill missing_fields
+        'extracted_fields': local['extracted_fields'],
+        'field_confidence': local['field_confidence'],
+        'missing_fields': local['missing_fields'],
         'extraction_method': 'llm_based',
-        'document_content': document_content
+        # The text is already in the conversation; return a handle instead of echoing it
+        'document_ref': content_ref(document_content),
+        'document_length': len(document_content)
     }
 
 
@@ -154,15 +137,18 @@ def extract_w9_with_llm(document_content: str) -> Dict[str, Any]:
     """
     # This function provides the expected structure for W9 extraction
     # The actual extraction will be performed by the LLM sub-agent
+    local = extract_fields('w9', document_content)
     return {
         'document_type': 'w9',
-        'expected_fields': [
-            'name', 'business_name', 'tax_classification', 'address', 
-            'city', 'state', 'zip_code', 'taxpayer_id_number', 
-            'backup_withholding', 'signature_date'
-        ],
+        'expected_fields': list(EXPECTED_FIELDS['w9']),
+        # Fields parsed from labelled lines; the LLM only needs to fill missing_fields
+        'extracted_fields': local['extracted_fields'],
+        'field_confidence': local['field_confidence'],
+        'missing_fields': local['missing_fields'],
         'extraction_method': 'llm_based',
-        'document_content': document_content
+        # The text is already in the conversation; return a handle instead of echoing it
+        'document_ref': content_ref(document_content),
+        'document_length': len(document_content)
     }
 
 
@@ -205,12 +191,8 @@ def extract_w9_with_llm(document_content: str) -> Dict[str, Any]:
 #     }
 
 
-# Create specialized extraction sub-agents
-kyc_extraction_agent = Agent(
-    name="kyc_extraction_specialist",
-    model="gemini-2.0-flash",
-    description="Specialized agent for extracting structured data from KYC documents.",
-    instruction="""You are a KYC (Know Your Customer) data extraction specialist. Your task is to analyze KYC documents and extract all relevant structured information.
+# Instructions of the agents built below
+KYC_EXTRACTION_INSTRUCTION = """You are a KYC (Know Your Customer) data extraction specialist. Your task is to analyze KYC documents and extract all relevant structured information.
 
 For KYC documents, extract these fields when available:
 - customer_name: Full name of the customer
@@ -226,20 +208,16 @@ For KYC documents, extract these fields when available:
 
 Analyze the document content carefully and extract as much information as possible. Provide confidence scores for each extracted field based on how certain you are about the accuracy of the extraction.
 
+The tool response includes extracted_fields already parsed from labelled lines. Keep those values and focus on the fields listed in missing_fields.
+
 Return the results in a structured JSON format with:
 - document_type: "kyc"
 - extracted_fields: dictionary of field names and values
 - extraction_confidence: overall confidence score
 - field_confidence: individual confidence for each field
-- description: brief summary of extraction results""",
-    tools=[extract_kyc_with_llm]
-)
+- description: brief summary of extraction results"""
 
-passport_extraction_agent = Agent(
-    name="passport_extraction_specialist", 
-    model="gemini-2.0-flash",
-    description="Specialized agent for extracting structured data from passport documents.",
-    instruction="""You are a passport data extraction specialist. Your task is to analyze passport documents and extract all relevant structured information.
+PASSPORT_EXTRACTION_INSTRUCTION = """You are a passport data extraction specialist. Your task is to analyze passport documents and extract all relevant structured information.
 
 For passport documents, extract these fields when available:
 - passport_number: Passport identification number
@@ -255,20 +233,16 @@ For passport documents, extract these fields when available:
 
 Analyze the document content carefully and extract as much information as possible. Pay attention to various passport formats and layouts.
 
+The tool response includes extracted_fields already parsed from labelled lines. Keep those values and focus on the fields listed in missing_fields.
+
 Return the results in a structured JSON format with:
 - document_type: "passport"
 - extracted_fields: dictionary of field names and values
 - extraction_confidence: overall confidence score
 - field_confidence: individual confidence for each field
-- description: brief summary of extraction results""",
-    tools=[extract_passport_with_llm]
-)
+- description: brief summary of extraction results"""
 
-w9_extraction_agent = Agent(
-    name="w9_extraction_specialist",
-    model="gemini-2.0-flash", 
-    description="Specialized agent for extracting structured data from W9 tax forms.",
-    instruction="""You are a W9 tax form data extraction specialist. Your task is to analyze W9 forms and extract all relevant structured information.
+W9_EXTRACTION_INSTRUCTION = """You are a W9 tax form data extraction specialist. Your task is to analyze W9 forms and extract all relevant structured information.
 
 For W9 forms, extract these fields when available:
 - name: Individual or business name
@@ -284,21 +258,16 @@ For W9 forms, extract these fields when available:
 
 Analyze the document content carefully and extract as much information as possible. Be aware of different W9 form versions and layouts.
 
+The tool response includes extracted_fields already parsed from labelled lines. Keep those values and focus on the fields listed in missing_fields.
+
 Return the results in a structured JSON format with:
 - document_type: "w9"
 - extracted_fields: dictionary of field names and values
 - extraction_confidence: overall confidence score
 - field_confidence: individual confidence for each field
-- description: brief summary of extraction results""",
-    tools=[extract_w9_with_llm]
-)
+- description: brief summary of extraction results"""
 
-# Create a specialized classification sub-agent
-classification_specialist_agent = Agent(
-    name="document_classification_specialist",
-    model="gemini-2.0-flash",
-    description="Specialized sub-agent focused exclusively on document type classification.",
-    instruction="""You are an expert document classification specialist. Your only task is to analyze document content and classify it into one of these categories:
+CLASSIFICATION_INSTRUCTION = """You are an expert document classification specialist. Your only task is to analyze document content and classify it into one of these categories:
 
 1. KYC (Know Your Customer) - Documents containing customer identification and verification information
 2. PASSPORT - Travel documents with personal identification data
@@ -310,17 +279,9 @@ Analyze the document content carefully and provide:
 - High confidence score for clear matches
 - Detailed reasoning for your classification decision
 
-Always respond with structured data including document_type, confidence, and reasoning.""",
-    tools=[classify_document_with_llm]
-)
+Always respond with structured data including document_type, confidence, and reasoning."""
 
-
-# Create the main document classification agent with all specialized sub-agents
-root_agent = Agent(
-    name="document_classification_agent",
-    model="gemini-2.0-flash",
-    description="Comprehensive agent for document classification and data extraction from KYC, passport, and W9 forms using specialized LLM-based sub-agents.",
-    instruction="""You are a comprehensive document processing system with access to specialized sub-agents for both classification and extraction.
+ROOT_INSTRUCTION = """You are a comprehensive document processing system with access to specialized sub-agents for both classification and extraction.
 
 Your workflow:
 1. First, use the classification specialist sub-agent to accurately classify the document
@@ -337,7 +298,240 @@ You have access to:
 
 Always delegate to the appropriate specialist sub-agents rather than trying to do the work yourself. Each sub-agent is optimized for their specific task and will provide more accurate results.
 
-Provide thorough analysis with confidence scores and detailed extraction results from the specialist agents.""",
-    tools=[],  # No tools needed - everything is handled by sub-agents
-    sub_agents=[classification_specialist_agent, kyc_extraction_agent, passport_extraction_agent, w9_extraction_agent]
-)
\ No newline at end of file
+Provide thorough analysis with confidence scores and detailed extraction results from the specialist agents."""
+
+SINGLE_SHOT_INSTRUCTION = """You are a document processing specialist. Classify the document and extract its fields in one response.
+
+Set document_type to one of:
+- kyc: customer identification and verification records
+- passport: travel documents with personal identification data
+- w9: US tax forms for taxpayer identification and certification
+- unknown: anything else
+
+Set confidence between 0 and 1 and give a one-sentence reasoning.
+
+Then fill only the fields of that type, copying values as written in the document:
+- kyc: customer_name, customer_id, date_of_birth, address, phone_number, email, id_document_type, id_document_number, verification_date, risk_level
+- passport: passport_number, surname, given_names, nationality, date_of_birth, place_of_birth, sex, date_of_issue, date_of_expiry, issuing_authority
+- w9: name, business_name, tax_classification, address, city, state, zip_code, taxpayer_id_number, backup_withholding, signature_date
+
+Leave out fields that are not present. For unknown documents, fill no fields."""
+
+
+def record_results(callback_context) -> None:
+    """Store a finished run's results in the result cache and the near-duplicate index."""
+    _lazy.get('result_cache_callbacks').after_agent(callback_context)
+    _lazy.get('near_duplicate_callbacks').after_agent(callback_context)
+
+
+@_lazy.register('result_cache')
+def _build_result_cache():
+    from .result_cache import InMemoryLRUBackend, ResultCache, walk_agents
+    # Serve resubmitted documents from cache; keys change whenever any agent's model or instruction does.
+    # The callbacks key by the tree that is running (either mode's root); root_agent is for direct callers
+    return ResultCache(InMemoryLRUBackend(max_entries=10000, ttl=24 * 3600), lambda: walk_agents(_lazy.get('root_agent')))
+
+
+@_lazy.register('result_cache_callbacks')
+def _build_result_cache_callbacks():
+    from .routing import ResultCacheCallbacks
+    return ResultCacheCallbacks(_lazy.get('result_cache'))
+
+
+@_lazy.register('near_duplicate_callbacks')
+def _build_near_duplicate_callbacks():
+    from .routing import NearDuplicateCallbacks
+    # Serve near-identical resubmissions from earlier results
+    callbacks = NearDuplicateCallbacks()
+    if NEAR_DUPLICATE_INDEX_PATH:
+        from .near_duplicates import NearDuplicateIndex
+        from .result_cache import walk_agents
+        callbacks.index = NearDuplicateIndex(NEAR_DUPLICATE_INDEX_PATH, lambda: walk_agents(_lazy.get('root_agent')))
+    return callbacks
+
+
+@_lazy.register('classification_trimmer')
+def _build_classification_trimmer():
+    from .context_trimming import ContextTrimmer, classification_excerpt
+    # Send each specialist a bounded excerpt of the document instead of all of it
+    return ContextTrimmer(classification_excerpt)
+
+
+@_lazy.register('extraction_trimmers')
+def _build_extraction_trimmers():
+    from .context_trimming import ContextTrimmer, extraction_excerpt
+    return {
+        document_type: ContextTrimmer(functools.partial(extraction_excerpt, document_type))
+        for document_type in ('kyc', 'passport', 'w9')
+    }
+
+
+@_lazy.register('image_compactor')
+def _build_image_compactor():
+    from .context_trimming import ImageCompactor
+    # Replace scanned page images with a small overview and the crops the classified type needs
+    return ImageCompactor()
+
+
+@_lazy.register('speculative_extraction')
+def _build_speculative_extraction():
+    from .routing import SpeculativeExtraction
+    # Start the likely extraction specialists alongside LLM classification and keep the one the LLM picks
+    return SpeculativeExtraction({
+        'kyc': 'kyc_extraction_specialist',
+        'passport': 'passport_extraction_specialist',
+        'w9': 'w9_extraction_specialist',
+    }, top_k=max(SPECULATIVE_EXTRACTIONS, 1), enabled=SPECULATIVE_EXTRACTIONS > 0,
+        on_result=record_results)
+
+
+def _extraction_agent(document_type: str, name: str, description: str, instruction: str, tool: Any) -> Any:
+    """Build the extraction specialist for one document type."""
+    from google.adk.agents import Agent
+    from local_llm import resolve_model
+    from .routing import LocalExtractionCallback, record_extraction_reply
+    speculative_extraction = _lazy.get('speculative_extraction')
+    return Agent(
+        name=name,
+        model=resolve_model(),
+        description=description,
+        instruction=instruction,
+        tools=[tool],
+        before_agent_callback=[speculative_extraction.before_extraction,
+                               LocalExtractionCallback(document_type, on_result=record_results)],
+        before_model_callback=[_lazy.get('extraction_trimmers')[document_type], _lazy.get('image_compactor'),
+                               speculative_extraction.count_model_call],
+        # Leaves the result in state as a dict, like the local shortcuts; an output_key would store the reply text
+        after_agent_callback=[record_extraction_reply, record_results]
+    )
+
+
+# Create specialized extraction sub-agents
+@_lazy.register('kyc_extraction_agent')
+def _build_kyc_extraction_agent():
+    return _extraction_agent(
+        'kyc', "kyc_extraction_specialist",
+        "Specialized agent for extracting structured data from KYC documents.",
+        KYC_EXTRACTION_INSTRUCTION, extract_kyc_with_llm)
+
+
+@_lazy.register('passport_extraction_agent')
+def _build_passport_extraction_agent():
+    return _extraction_agent(
+        'passport', "passport_extraction_specialist",
+        "Specialized agent for extracting structured data from passport documents.",
+        PASSPORT_EXTRACTION_INSTRUCTION, extract_passport_with_llm)
+
+
+@_lazy.register('w9_extraction_agent')
+def _build_w9_extraction_agent():
+    return _extraction_agent(
+        'w9', "w9_extraction_specialist",
+        "Specialized agent for extracting structured data from W9 tax forms.",
+        W9_EXTRACTION_INSTRUCTION, extract_w9_with_llm)
+
+
+# Create a specialized classification sub-agent
+@_lazy.register('classification_specialist_agent')
+def _build_classification_specialist_agent():
+    from google.adk.agents import Agent
+    from local_llm import resolve_model
+    return Agent(
+        name="document_classification_specialist",
+        model=resolve_model(),
+        description="Specialized sub-agent focused exclusively on document type classification.",
+        instruction=CLASSIFICATION_INSTRUCTION,
+        tools=[classify_document_with_llm],
+        before_model_callback=[_lazy.get('classification_trimmer'), _lazy.get('image_compactor')],
+        # Runs when the classifier ends the run without a transfer, e.g. for unknown documents
+        after_agent_callback=_lazy.get('speculative_extraction').finish
+    )
+
+
+@_lazy.register('keyword_fast_path')
+def _build_keyword_fast_path():
+    from .routing import KeywordFastPathRouter
+    # Route documents the keyword scorer classifies decisively straight to their extraction specialist
+    return KeywordFastPathRouter({
+        'kyc': 'kyc_extraction_specialist',
+        'passport': 'passport_extraction_specialist',
+        'w9': 'w9_extraction_specialist',
+    })
+
+
+# Create the main document classification agent with all specialized sub-agents
+@_lazy.register('multi_agent_root')
+def _build_multi_agent_root():
+    from google.adk.agents import Agent
+    from local_llm import resolve_model
+    speculative_extraction = _lazy.get('speculative_extraction')
+    return Agent(
+        name="document_classification_agent",
+        model=resolve_model(),
+        description="Comprehensive agent for document classification and data extraction from KYC, passport, and W9 forms using specialized LLM-based sub-agents.",
+        instruction=ROOT_INSTRUCTION,
+        tools=[],  # No tools needed - everything is handled by sub-agents
+        sub_agents=[_lazy.get('classification_specialist_agent'), _lazy.get('kyc_extraction_agent'),
+                    _lazy.get('passport_extraction_agent'), _lazy.get('w9_extraction_agent')],
+        before_model_callback=[_lazy.get('keyword_fast_path'), speculative_extraction.start,
+                               _lazy.get('classification_trimmer'), _lazy.get('image_compactor')],
+        before_agent_callback=[_lazy.get('result_cache_callbacks').before_agent,
+                               _lazy.get('near_duplicate_callbacks').before_agent],
+        after_agent_callback=speculative_extraction.finish
+    )
+
+
+@_lazy.register('single_shot_trimmer')
+def _build_single_shot_trimmer():
+    from .context_trimming import ContextTrimmer, single_shot_excerpt
+    return ContextTrimmer(single_shot_excerpt)
+
+
+@_lazy.register('single_shot_validator')
+def _build_single_shot_validator():
+    from .single_shot import SingleShotValidator
+    return SingleShotValidator()
+
+
+# Classify and extract in one model call with a combined response schema, validated locally
+@_lazy.register('single_shot_agent')
+def _build_single_shot_agent():
+    from google.adk.agents import Agent
+    from local_llm import resolve_model
+    from .single_shot import SingleShotResult
+    return Agent(
+        name="document_single_shot_agent",
+        model=resolve_model(),
+        description="Classifies a KYC, passport or W9 document and extracts its fields in a single structured response.",
+        instruction=SINGLE_SHOT_INSTRUCTION,
+        output_schema=SingleShotResult,
+        before_agent_callback=[_lazy.get('result_cache_callbacks').before_agent,
+                               _lazy.get('near_duplicate_callbacks').before_agent],
+        before_model_callback=[_lazy.get('single_shot_trimmer'), _lazy.get('image_compactor')],
+        after_model_callback=_lazy.get('single_shot_validator'),
+        after_agent_callback=record_results
+    )
+
+
+@_lazy.register('AGENT_MODES')
+def _build_agent_modes():
+    return {mode: _lazy.get(name) for mode, name in AGENT_MODE_ROOTS.items()}
+
+
+@_lazy.register('root_agent')
+def _build_root_agent():
+    return _lazy.get(AGENT_MODE_ROOTS[AGENT_MODE])
+
+
+# ADK's CLI serves `app` when present, with the tracer seeing every agent, model and tool call
+if TRACE_PATH:
+    @_lazy.register('stage_tracer')
+    def _build_stage_tracer():
+        from .tracing import JsonlSpanSink, StageTracer
+        return StageTracer(JsonlSpanSink(TRACE_PATH))
+
+    @_lazy.register('app')
+    def _build_app():
+        from google.adk.apps import App
+        return App(name='document_classification_agent', root_agent=_lazy.get('root_agent'),
+                   plugins=[_lazy.get('stage_tracer')])
@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark suite for the document classification agent.
+
+Generates a synthetic corpus from the sample documents (shuffled lines,
+OCR-style noise, filler up to hundreds of KB, mixed and unknown types) and
+runs it through four stages: the keyword classifier, the extraction tools,
+and the multi-agent and single-shot flows against a local scripted model. Each stage
+reports docs/sec, p50/p95/p99 latency, peak RSS and token counts. Results
+can be written as JSON and compared against an earlier run.
+
+Run from the ``src`` directory:
+    python -m document_classification_agent.benchmark_suite --json before.json
+    python -m document_classification_agent.benchmark_suite --compare before.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional
+
+from google.adk.agents import BaseAgent
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+from local_llm import LatencyModel, estimate_tokens
+
+from . import agent
+from .benchmark import _percentile, _perturb_layout, _scripted_agents
+from .classification import classify_text
+from .keyword_matcher import CLASSIFICATION_INDICATORS
+from .routing import CLASSIFICATION_STATE_KEY, EXTRACTION_STATE_KEY
+from .sample_data import SAMPLE_DOCUMENTS
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+SUITE_FORMAT_VERSION = 1
+STAGES = ['classify', 'extract', 'agent', 'single_shot']
+DEFAULT_DOCUMENTS = 200
+DEFAULT_MAX_BYTES = 256 * 1024
+DEFAULT_NOISE = 0.002
+# Share of the corpus that blends two document types / contains no document at all
+MIXED_SHARE = 0.1
+UNKNOWN_SHARE = 0.1
+# Relative change beyond which --compare reports a regression
+DEFAULT_TOLERANCE = 0.1
+
+_EXTRACTION_TOOLS = {
+    'kyc': agent.extract_kyc_with_llm,
+    'passport': agent.extract_passport_with_llm,
+    'w9': agent.extract_w9_with_llm,
+}
+
+_INDICATOR_TERMS = [term for groups in CLASSIFICATION_INDICATORS.values() for group in groups.values() for term in group]
+# Neutral filler vocabulary; words containing any indicator term (e.g. 'being' has 'ein') are dropped
+FILLER_WORDS = [word for word in (
+    'lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore '
+    'et dolore magna aliqua enim ad minim veniam quis nostrud exercitation ullamco laboris nisi aliquip '
+    'ex ea commodo consequat duis aute irure in reprehenderit voluptate velit esse cillum fugiat nulla '
+    'pariatur excepteur sint occaecat cupidatat non proident sunt culpa qui officia deserunt mollit anim '
+    'id est laborum page scanned copy attached archive reference office note see above below total'
+).split() if not any(term in word for term in _INDICATOR_TERMS)]
+
+# Characters OCR commonly confuses, by original character
+_OCR_CONFUSIONS = {'O': '0', 'o': '0', 'l': '1', 'I': '1', 'S': '5', 'B': '8', 'e': 'c'}
+
+
+def _filler(rng: random.Random, size: int) -> str:
+    """Roughly ``size`` characters of neutral paragraphs."""
+    paragraphs = []
+    written = 0
+    while written < size:
+        words = rng.choices(FILLER_WORDS, k=rng.randint(20, 120))
+        paragraph = ' '.join(words).capitalize() + '.'
+        paragraphs.append(paragraph)
+        written += len(paragraph) + 2
+    return '\n\n'.join(paragraphs)
+
+
+def _ocr_noise(content: str, rng: random.Random, rate: float) -> str:
+    """Apply confusable-character substitutions at about ``rate`` of positions."""
+    if rate <= 0:
+        return content
+    chars = list(content)
+    for i in rng.sample(range(len(chars)), k=int(len(chars) * rate)):
+        chars[i] = _OCR_CONFUSIONS.get(chars[i], chars[i])
+    return ''.join(chars)
+
+
+def _pad(document: str, rng: random.Random, target_bytes: int) -> str:
+    """Insert filler paragraphs between the document's lines until it reaches ``target_bytes``."""
+    lines = document.split('\n')
+    missing = target_bytes - len(document)
+    if missing <= 0:
+        return document
+    slots = rng.randint(1, min(8, len(lines)))
+    for _ in range(slots):
+        at = rng.randint(0, len(lines))
+        lines.insert(at, '\n' + _filler(rng, missing // slots) + '\n')
+    return '\n'.join(lines)
+
+
+def generate_corpus(documents: int = DEFAULT_DOCUMENTS, seed: int = 0, max_bytes: int = DEFAULT_MAX_BYTES,
+                    noise: float = DEFAULT_NOISE) -> List[Dict[str, Any]]:
+    """
+    Build a reproducible synthetic corpus from the sample documents.
+
+    Every document has its lines shuffled and label layout varied, OCR-style
+    character noise applied, and filler inserted so sizes are spread
+    log-uniformly up to ``max_bytes``. Most documents are a single sample
+    type; some blend two types and some contain only filler.
+
+    Args:
+        documents: Number of documents to generate
+        seed: Random seed; the same seed always yields the same corpus
+        max_bytes: Largest document size
+        noise: Fraction of characters replaced by OCR confusions
+
+    Returns:
+        List of {'label', 'content'} dictionaries; the label is the expected
+        document type, 'unknown' for filler-only documents, or None for blends
+    """
+    rng = random.Random(seed)
+    types_ = list(SAMPLE_DOCUMENTS)
+    corpus = []
+    for _ in range(documents):
+        draw = rng.random()
+        if draw < UNKNOWN_SHARE:
+            label, body = 'unknown', _filler(rng, 200)
+        elif draw < UNKNOWN_SHARE + MIXED_SHARE:
+            first, second = rng.sample(types_, 2)
+            label = None
+            body = _perturb_layout(SAMPLE_DOCUMENTS[first], rng) + '\n' + _perturb_layout(SAMPLE_DOCUMENTS[second], rng)
+        else:
+            label = rng.choice(types_)
+            body = _perturb_layout(SAMPLE_DOCUMENTS[label], rng)
+        target = int(math.exp(rng.uniform(math.log(len(body)), math.log(max(max_bytes, len(body))))))
+        corpus.append({'label': label, 'content': _ocr_noise(_pad(body, rng, target), rng, noise)})
+    return corpus
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far, in MB (None where unsupported)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _summarize(latencies: List[float], elapsed: float, total_bytes: int) -> Dict[str, Any]:
+    """Throughput and latency percentiles of one stage."""
+    return {
+        'documents': len(latencies),
+        'elapsed_s': elapsed,
+        'docs_per_sec': len(latencies) / elapsed if elapsed else 0.0,
+        'mb_per_sec': total_bytes / (1024 * 1024) / elapsed if elapsed else 0.0,
+        'p50_ms': _percentile(latencies, 50) * 1e3,
+        'p95_ms': _percentile(latencies, 95) * 1e3,
+        'p99_ms': _percentile(latencies, 99) * 1e3,
+        'max_ms': max(latencies) * 1e3,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def run_classify_stage(corpus: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Keyword classifier over every document."""
+    latencies = []
+    correct = labelled = input_tokens = output_tokens = 0
+    start = time.perf_counter()
+    for document in corpus:
+        begin = time.perf_counter()
+        result = classify_text(document['content'])
+        latencies.append(time.perf_counter() - begin)
+        input_tokens += estimate_tokens(document['content'])
+        output_tokens += estimate_tokens(json.dumps(result))
+        if document['label'] is not None:
+            labelled += 1
+            correct += result['document_type'] == document['label']
+    elapsed = time.perf_counter() - start
+
+    summary = _summarize(latencies, elapsed, sum(len(d['content']) for d in corpus))
+    summary['accuracy'] = correct / labelled if labelled else None
+    summary['tokens'] = {'input': input_tokens, 'output': output_tokens}
+    return summary
+
+
+def run_extract_stage(corpus: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Extraction tool for each document's true type, as the specialists would call it."""
+    documents = [d for d in corpus if d['label'] in _EXTRACTION_TOOLS]
+    latencies = []
+    filled = expected = input_tokens = output_tokens = 0
+    start = time.perf_counter()
+    for document in documents:
+        begin = time.perf_counter()
+        result = _EXTRACTION_TOOLS[document['label']](document['content'])
+        latencies.append(time.perf_counter() - begin)
+        input_tokens += estimate_tokens(document['content'])
+        output_tokens += estimate_tokens(json.dumps(result))
+        expected += len(result['expected_fields'])
+        filled += len(result['expected_fields']) - len(result['missing_fields'])
+    elapsed = time.perf_counter() - start
+
+    summary = _summarize(latencies, elapsed, sum(len(d['content']) for d in documents))
+    summary['fields_filled'] = filled / expected if expected else None
+    summary['tokens'] = {'input': input_tokens, 'output': output_tokens}
+    return summary
+
+
+async def _run_agent_corpus(corpus: List[Dict[str, Any]], root_agent: BaseAgent) -> Dict[str, Any]:
+    """Run each document through ``root_agent`` in a fresh session, tallying per-agent usage."""
+    runner = InMemoryRunner(agent=root_agent, app_name='benchmark_suite')
+    latencies = []
+    correct = labelled = extracted = 0
+    calls: Counter = Counter()
+    tokens: Dict[str, Counter] = defaultdict(Counter)
+    for document in corpus:
+        session = await runner.session_service.create_session(app_name='benchmark_suite', user_id='bench')
+        message = types.Content(role='user', parts=[types.Part(text=document['content'])])
+        begin = time.perf_counter()
+        async for event in runner.run_async(user_id='bench', session_id=session.id, new_message=message):
+            usage = event.usage_metadata
+            if usage is not None and not event.partial:
+                calls[event.author] += 1
+                tokens[event.author]['prompt'] += usage.prompt_token_count or 0
+                tokens[event.author]['output'] += usage.candidates_token_count or 0
+        latencies.append(time.perf_counter() - begin)
+
+        session = await runner.session_service.get_session(
+            app_name='benchmark_suite', user_id='bench', session_id=session.id)
+        classification = session.state.get(CLASSIFICATION_STATE_KEY)
+        extracted += session.state.get(EXTRACTION_STATE_KEY) is not None
+        if document['label'] is not None:
+            labelled += 1
+            document_type = classification['document_type'] if classification else 'unknown'
+            correct += document_type == document['label']
+        await runner.session_service.delete_session(app_name='benchmark_suite', user_id='bench', session_id=session.id)
+    return {'latencies': latencies, 'accuracy': correct / labelled if labelled else None,
+            'extracted': extracted, 'calls': calls, 'tokens': tokens}
+
+
+def run_agent_stage(corpus: List[Dict[str, Any]], latency: Optional[LatencyModel] = None,
+                    root_agent: Optional[BaseAgent] = None) -> Dict[str, Any]:
+    """Full agent flow with the default shortcuts, against the local routing model (multi-agent by default)."""
+    with _scripted_agents(latency=latency or LatencyModel()) as model:
+        start = time.perf_counter()
+        run = asyncio.run(_run_agent_corpus(corpus, root_agent or agent.multi_agent_root))
+        elapsed = time.perf_counter() - start
+
+    summary = _summarize(run['latencies'], elapsed, sum(len(d['content']) for d in corpus))
+    summary['accuracy'] = run['accuracy']
+    summary['extracted'] = run['extracted']
+    summary['model_calls'] = model.calls
+    summary['calls_by_agent'] = dict(run['calls'])
+    summary['tokens'] = {'prompt': model.prompt_tokens, 'output': model.output_tokens}
+    summary['tokens_by_agent'] = {author: dict(counts) for author, counts in run['tokens'].items()}
+    return summary
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(stages: List[str], documents: int = DEFAULT_DOCUMENTS, seed: int = 0,
+              max_bytes: int = DEFAULT_MAX_BYTES, noise: float = DEFAULT_NOISE,
+              model_latency: float = 0.0) -> Dict[str, Any]:
+    """
+    Generate the corpus and run the selected stages.
+
+    Args:
+        stages: Names from STAGES, run in that order
+        documents: Corpus size
+        seed: Corpus random seed
+        max_bytes: Largest document size
+        noise: OCR noise rate
+        model_latency: Median simulated model latency in seconds for the agent stage
+
+    Returns:
+        JSON-serializable results with run metadata, corpus shape and per-stage metrics
+    """
+    corpus = generate_corpus(documents, seed, max_bytes, noise)
+    sizes = [len(d['content']) for d in corpus]
+    latency = LatencyModel(model_latency, 'lognormal', 0.5) if model_latency else None
+    runners = {
+        'classify': run_classify_stage,
+        'extract': run_extract_stage,
+        'agent': lambda docs: run_agent_stage(docs, latency),
+        'single_shot': lambda docs: run_agent_stage(docs, latency, agent.single_shot_agent),
+    }
+    return {
+        'format_version': SUITE_FORMAT_VERSION,
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'corpus': {
+            'documents': documents, 'seed': seed, 'max_bytes': max_bytes, 'noise': noise,
+            'model_latency': model_latency, 'total_bytes': sum(sizes),
+            'p50_bytes': _percentile(sizes, 50), 'largest_bytes': max(sizes),
+            'labels': dict(Counter(str(d['label']) for d in corpus)),
+        },
+        'stages': {name: runners[name](corpus) for name in STAGES if name in stages},
+    }
+
+
+def print_results(results: Dict[str, Any]) -> None:
+    corpus = results['corpus']
+    print(f"Corpus: {corpus['documents']} documents, {corpus['total_bytes'] / 1024:.0f} KB total, "
+          f"median {corpus['p50_bytes'] / 1024:.1f} KB, largest {corpus['largest_bytes'] / 1024:.0f} KB")
+    print(f"  {'stage':<10}{'docs/sec':>10}{'MB/sec':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'RSS MB':>9}{'accuracy':>10}{'tokens':>10}")
+    for name, stage in results['stages'].items():
+        accuracy = stage.get('accuracy', stage.get('fields_filled'))
+        rss = stage['peak_rss_mb']
+        print(f"  {name:<10}{stage['docs_per_sec']:>10.1f}{stage['mb_per_sec']:>9.1f}{stage['p50_ms']:>9.2f}"
+              f"{stage['p95_ms']:>9.2f}{stage['p99_ms']:>9.2f}{rss if rss is not None else float('nan'):>9.1f}"
+              f"{accuracy if accuracy is not None else float('nan'):>10.1%}{sum(stage['tokens'].values()):>10}")
+    agent_stages = [results['stages'][name] for name in ('agent', 'single_shot') if name in results['stages']]
+    if agent_stages:
+        print(f"\n  {'agent':<36}{'calls':>7}{'prompt tok':>12}{'output tok':>12}")
+        for agent_stage in agent_stages:
+            for author, counts in sorted(agent_stage['tokens_by_agent'].items()):
+                print(f"  {author:<36}{agent_stage['calls_by_agent'].get(author, 0):>7}"
+                      f"{counts.get('prompt', 0):>12}{counts.get('output', 0):>12}")
+
+
+# Metrics compared across runs, with the direction that counts as better
+COMPARED_METRICS = {
+    'docs_per_sec': 'higher',
+    'p50_ms': 'lower',
+    'p95_ms': 'lower',
+    'p99_ms': 'lower',
+    'peak_rss_mb': 'lower',
+    'accuracy': 'higher',
+    'fields_filled': 'higher',
+}
+
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any],
+                    tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """
+    Print per-stage changes against a baseline run and list the regressions.
+
+    Token totals are compared as well; any increase beyond the tolerance is a
+    regression since the corpus is deterministic for a given seed.
+
+    Returns:
+        One message per metric that got worse by more than ``tolerance``
+    """
+    if any(current['corpus'][key] != baseline['corpus'].get(key) for key in ('documents', 'seed', 'max_bytes', 'noise')):
+        print("  warning: corpus settings differ from the baseline")
+    regressions = []
+    print(f"\nCompared with {baseline['meta'].get('commit') or 'baseline'}:")
+    print(f"  {'stage':<10}{'metric':<16}{'baseline':>12}{'current':>12}{'change':>9}")
+    for name, stage in current['stages'].items():
+        before_stage = baseline['stages'].get(name)
+        if before_stage is None:
+            continue
+        metrics = {key: (before_stage.get(key), stage.get(key), better) for key, better in COMPARED_METRICS.items()}
+        metrics['tokens'] = (sum(before_stage['tokens'].values()), sum(stage['tokens'].values()), 'lower')
+        for key, (before, after, better) in metrics.items():
+            if before is None or after is None:
+                continue
+            change = (after - before) / before if before else 0.0
+            worse = change < -tolerance if better == 'higher' else change > tolerance
+            flag = '  REGRESSION' if worse else ''
+            print(f"  {name:<10}{key:<16}{before:>12.2f}{after:>12.2f}{change:>+9.1%}{flag}")
+            if worse:
+                regressions.append(f'{name} {key}: {before:.2f} -> {after:.2f} ({change:+.1%})')
+    return regressions
+
+
+def main():
+    """Run the suite, optionally saving JSON and comparing with a previous run."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('stages', nargs='*', metavar='STAGE', help=f"stages to run: {', '.join(STAGES)} (default: all)")
+    parser.add_argument('--documents', type=int, default=DEFAULT_DOCUMENTS, help='corpus size')
+    parser.add_argument('--seed', type=int, default=0, help='corpus random seed')
+    parser.add_argument('--max-kb', type=int, default=DEFAULT_MAX_BYTES // 1024, help='largest document size in KB')
+    parser.add_argument('--noise', type=float, default=DEFAULT_NOISE, help='OCR noise rate')
+    parser.add_argument('--model-latency', type=float, default=0.0,
+                        help='median simulated model latency in seconds (default: instant)')
+    parser.add_argument('--json', metavar='PATH', help='write results to PATH')
+    parser.add_argument('--compare', metavar='PATH', help='compare with results saved by an earlier --json run')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='relative change reported as a regression (default: 0.1)')
+    args = parser.parse_args()
+    unknown = [name for name in args.stages if name not in STAGES]
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)}")
+
+    print("Document Classification Agent Benchmark Suite")
+    print("=" * 60)
+    results = run_suite(args.stages or STAGES, args.documents, args.seed, args.max_kb * 1024,
+                        args.noise, args.model_latency)
+    print_results(results)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare_results(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s):")
+            for message in regressions:
+                print(f"  {message}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
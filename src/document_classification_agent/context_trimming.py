@@ -0,0 +1,459 @@
+"""
+Bounded document excerpts for the classification and extraction specialists.
+"""
+
+import hashlib
+import re
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Pattern, Tuple
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+from google.genai import types
+
+from .classification import classify_text
+from .field_extractor import FIELD_EXTRACTORS, FIELD_LABELS, FIELD_VALIDATORS, extract_fields
+from .keyword_matcher import DEFAULT_MATCHER
+from .mrz import find_td3_span
+from .routing import CLASSIFICATION_STATE_KEY, _user_text
+
+
+# Opening lines (and at most this many characters) always kept for the classifier
+HEAD_LINES = 8
+HEAD_CHARS = 1500
+# Short all-caps or title lines kept as headers, at most this many
+MAX_HEADER_LINES = 10
+# Characters kept on either side of a hit inside a line too long to keep whole
+HIT_CONTEXT_CHARS = 160
+# Lines up to this length are kept whole around a hit
+MAX_LINE_CHARS = 400
+# Lines of context kept above and below each extraction label
+LABEL_CONTEXT_LINES = 1
+# Mentions of a missing field's labels and cues, and values of its shape, kept at most this many of each
+MISSING_FIELD_WINDOWS = 4
+# Words that introduce a value in prose rather than after a label, by field; used with the field's labels
+FIELD_CUES = {
+    'customer_name': ['customer', 'applicant'],
+    'phone_number': ['call', 'reach', 'contact', 'tel'],
+    'email': ['e-mail', 'mail'],
+    'address': ['resides', 'lives at', 'located at', 'mail to'],
+    'place_of_birth': ['born in', 'born at', 'birthplace'],
+    'date_of_birth': ['born on', 'born'],
+    'date_of_expiry': ['valid until', 'valid through'],
+    'date_of_issue': ['issued on'],
+    'nationality': ['citizen'],
+    'city': ['mail to'],
+    'state': ['mail to'],
+    'zip_code': ['mail to', 'postal code'],
+    'signature_date': ['signed'],
+    'taxpayer_id_number': ['employer identification', 'social security'],
+}
+# Separator between non-adjacent excerpt regions
+EXCERPT_GAP = '\n[...]\n'
+# Marks a region cut out of the middle of a long line; also keeps a cut line from reading as 'label: value'
+CLIP_MARK = '...'
+# Inline image parts the ImageCompactor decodes and replaces; see image_intake
+COMPACTED_IMAGE_MIME_TYPES = ('image/png', 'image/x-portable-graymap', 'image/x-portable-pixmap',
+                              'image/x-portable-anymap')
+# Bytes of scans (pages, decoded pixels and rendered parts) the ImageCompactor keeps between calls
+SCAN_CACHE_BYTES = 64 * 1024 * 1024
+
+# Short lines in capitals, e.g. 'PASSPORT' or 'REQUEST FOR TAXPAYER IDENTIFICATION'
+_HEADER_RE = re.compile(r"^[ \t]*[A-Z][A-Z0-9 ()/&,.'-]{2,78}[ \t]*\r?$", re.MULTILINE)
+
+
+def _line_bounds(text: str, start: int, end: int) -> Tuple[int, int]:
+    """Offsets of the start of the line holding ``start`` and the end of the line holding ``end``."""
+    line_start = text.rfind('\n', 0, start) + 1
+    line_end = text.find('\n', end)
+    return line_start, len(text) if line_end < 0 else line_end
+
+
+def _region(text: str, start: int, end: int, context_lines: int = 0) -> Tuple[int, int]:
+    """
+    Whole lines around [start, end) with ``context_lines`` neighbours each side.
+
+    Falls back to HIT_CONTEXT_CHARS either side when that would exceed
+    MAX_LINE_CHARS per line kept.
+    """
+    line_start, line_end = _line_bounds(text, start, end)
+    for _ in range(context_lines):
+        if line_start > 0:
+            line_start = text.rfind('\n', 0, line_start - 1) + 1
+        if line_end < len(text):
+            next_end = text.find('\n', line_end + 1)
+            line_end = len(text) if next_end < 0 else next_end
+    if line_end - line_start <= MAX_LINE_CHARS * (2 * context_lines + 1):
+        return line_start, line_end
+    line_start, line_end = _line_bounds(text, start, end)
+    if line_end - line_start <= MAX_LINE_CHARS:
+        return line_start, line_end
+    return max(line_start, start - HIT_CONTEXT_CHARS), min(line_end, end + HIT_CONTEXT_CHARS)
+
+
+def _join_regions(text: str, regions: List[Tuple[int, int]]) -> str:
+    """Merge overlapping regions in document order and join them, marking cuts inside lines."""
+    merged: List[List[int]] = []
+    for start, end in sorted(regions):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    pieces = []
+    for start, end in merged:
+        piece = text[start:end]
+        if start > 0 and text[start - 1] != '\n':
+            piece = CLIP_MARK + piece
+        if end < len(text) and text[end] != '\n':
+            piece = piece + CLIP_MARK
+        pieces.append(piece)
+    return EXCERPT_GAP.join(pieces)
+
+
+def _case_insensitive_finder(document_content: str) -> Callable[[str], int]:
+    """Return find(term) over the document, ignoring case, for lowercase terms."""
+    lower = document_content.lower()
+    if len(lower) == len(document_content):
+        return lower.find
+
+    # Some characters change length when lowercased, so offsets would drift; search the original instead
+    def find(term: str) -> int:
+        match = re.search(re.escape(term), document_content, re.IGNORECASE)
+        return match.start() if match else -1
+    return find
+
+
+def _classification_regions(document_content: str) -> List[Tuple[int, int]]:
+    """Regions kept for the classifier: opening lines, headers and the first hit of every term."""
+    head_end = 0
+    for _ in range(HEAD_LINES):
+        head_end = document_content.find('\n', head_end + 1)
+        if head_end < 0:
+            head_end = len(document_content)
+            break
+    regions = [(0, min(head_end, HEAD_CHARS))]
+    for match in _HEADER_RE.finditer(document_content):
+        regions.append(match.span())
+        if len(regions) > MAX_HEADER_LINES:  # plus the head region
+            break
+    find = _case_insensitive_finder(document_content)
+    for term in DEFAULT_MATCHER.terms:
+        start = find(term)
+        if start >= 0:
+            regions.append(_region(document_content, start, start + len(term)))
+    return regions
+
+
+def _extraction_regions(document_type: str, document_content: str) -> List[Tuple[int, int]]:
+    """Regions kept for one type's extractor: title, labelled lines, label mentions and the MRZ."""
+    title_start = len(document_content) - len(document_content.lstrip())
+    regions = [_region(document_content, title_start, title_start)]
+    regions.extend(FIELD_EXTRACTORS[document_type].label_spans(document_content))
+    find = _case_insensitive_finder(document_content)
+    for labels in FIELD_LABELS[document_type].values():
+        for label in labels:
+            start = find(label)
+            if start >= 0:
+                regions.append(_region(document_content, start, start + len(label), LABEL_CONTEXT_LINES))
+    if document_type == 'passport':
+        span = find_td3_span(document_content)
+        if span is not None:
+            regions.append(span)
+    return regions
+
+
+def _word_re(terms: List[str]) -> Pattern[str]:
+    """Case-insensitive regex for any of the terms as whole words, longest first."""
+    alternation = '|'.join(re.escape(term) for term in sorted(set(terms), key=len, reverse=True))
+    return re.compile(rf'(?<!\w)(?:{alternation})(?!\w)', re.IGNORECASE)
+
+
+# For each type's fields: (labels and cues, value shape or None), compiled once
+_MISSING_FIELD_RES = {
+    document_type: {
+        field: (_word_re(labels + FIELD_CUES.get(field, [])),
+                re.compile(rf'(?<![A-Za-z0-9])(?:{FIELD_VALIDATORS[field]})(?![A-Za-z0-9])')
+                if field in FIELD_VALIDATORS else None)
+        for field, labels in FIELD_LABELS[document_type].items()
+    }
+    for document_type in FIELD_EXTRACTORS
+}
+
+
+def _missing_field_regions(document_type: str, document_content: str,
+                           missing_fields: List[str]) -> List[Tuple[int, int]]:
+    """
+    Regions where an unlabelled value of each missing field is likely to be.
+
+    The lines around the first MISSING_FIELD_WINDOWS mentions of each field's
+    labels and cues, and around as many values with the field's shape, so the
+    excerpt stays bounded however large the document is.
+    """
+    regions = []
+    for field in missing_fields:
+        cue_re, shape_re = _MISSING_FIELD_RES[document_type].get(field, (None, None))
+        for pattern in (cue_re, shape_re):
+            if pattern is None:
+                continue
+            found = 0
+            for match in pattern.finditer(document_content):
+                if not any(character.isalnum() for character in match.group()):
+                    continue  # e.g. a run of spaces and dots matching the phone number shape
+                regions.append(_region(document_content, match.start(), match.end(), LABEL_CONTEXT_LINES))
+                found += 1
+                if found == MISSING_FIELD_WINDOWS:
+                    break
+    return regions
+
+
+def _excerpt(document_content: str, regions: List[Tuple[int, int]]) -> str:
+    """Join the regions, or return the document itself when that saves nothing."""
+    excerpt = _join_regions(document_content, regions)
+    return excerpt if len(excerpt) < len(document_content) else document_content
+
+
+def classification_excerpt(document_content: str) -> str:
+    """
+    Bounded excerpt that still carries every classification signal.
+
+    Keeps the opening lines, short header lines, and the region around the
+    first occurrence of every indicator term. Every term found in the document
+    is therefore found in the excerpt, and no new ones can appear, so the
+    keyword scores of the excerpt equal those of the document.
+
+    Args:
+        document_content: Full document text
+
+    Returns:
+        Excerpt of at most a few KB regardless of document size, or the document
+        itself when it is no longer than the excerpt would be
+    """
+    return _excerpt(document_content, _classification_regions(document_content))
+
+
+def extraction_excerpt(document_type: str, document_content: str) -> str:
+    """
+    Bounded excerpt with the regions an extraction specialist reads.
+
+    Keeps the title line, every labelled line the local extractor reads, the
+    lines around the first mention of each of the type's field labels, and for
+    passports the machine-readable zone. Labelled lines are kept whole and in
+    order, so the local extractors return the same fields for the excerpt as
+    for the document.
+
+    With local extraction on, the specialist only runs when a field is
+    missing, and that value is one no label points at. For each missing
+    field the excerpt also keeps the lines around a few mentions of its
+    labels and cues (FIELD_CUES, e.g. 'born in') and a few values of its
+    shape (FIELD_VALIDATORS). A value in prose with none of these near it
+    is not sent.
+
+    Args:
+        document_type: One of the types in FIELD_LABELS
+        document_content: Full document text
+
+    Returns:
+        The excerpt, or the document itself for unsupported types or when
+        nothing would be saved
+    """
+    if document_type not in FIELD_EXTRACTORS:
+        return document_content
+    missing_fields = extract_fields(document_type, document_content)['missing_fields']
+    regions = _extraction_regions(document_type, document_content)
+    regions.extend(_missing_field_regions(document_type, document_content, missing_fields))
+    return _excerpt(document_content, regions)
+
+
+def single_shot_excerpt(document_content: str) -> str:
+    """
+    Bounded excerpt for a single call that both classifies and extracts.
+
+    The union of the classifier's excerpt and every type's extraction excerpt,
+    so it carries the same keyword scores and labelled fields as the document.
+    Fields of the type it scores highest for that are missing get the same
+    extra regions as in extraction_excerpt.
+
+    Args:
+        document_content: Full document text
+
+    Returns:
+        The excerpt, or the document itself when it scores highest for an
+        unsupported type or nothing would be saved
+    """
+    top_type = classify_text(document_content)['document_type']
+    if top_type not in FIELD_EXTRACTORS:
+        return document_content
+    regions = _classification_regions(document_content)
+    for document_type in FIELD_EXTRACTORS:
+        regions.extend(_extraction_regions(document_type, document_content))
+    missing_fields = extract_fields(top_type, document_content)['missing_fields']
+    regions.extend(_missing_field_regions(top_type, document_content, missing_fields))
+    return _excerpt(document_content, regions)
+
+
+class ContextTrimmer:
+    """
+    before_model_callback that swaps the full document for an excerpt in a model request.
+
+    The user's document text is replaced wherever it appears in the request:
+    as the user message, as the argument of an earlier tool call, or quoted in
+    another agent's transcript. Callbacks that read the document from the
+    invocation's user content (fast path, local extraction, result cache) still
+    see all of it. Chain after any callback that must read the full request.
+
+    Excerpts of the last ``cache_size`` documents are kept under a hash of the
+    document, so the specialists' calls in one invocation trim it once; a
+    document sent whole is remembered without keeping its text.
+    """
+
+    def __init__(self, excerpt: Callable[[str], str], enabled: bool = True, cache_size: int = 64):
+        self.excerpt = excerpt
+        self.enabled = enabled
+        self.calls = 0
+        self.characters_before = 0
+        self.characters_after = 0
+        self._cache_size = cache_size
+        self._excerpts: 'OrderedDict[bytes, Optional[str]]' = OrderedDict()
+
+    @property
+    def characters_saved(self) -> int:
+        return self.characters_before - self.characters_after
+
+    def _excerpt_for(self, document_content: str) -> Optional[str]:
+        """The document's excerpt, or None when it is sent whole."""
+        key = hashlib.sha256(document_content.encode('utf-8')).digest()
+        if key in self._excerpts:
+            self._excerpts.move_to_end(key)
+            return self._excerpts[key]
+        excerpt = self.excerpt(document_content)
+        if excerpt == document_content:
+            excerpt = None
+        self._excerpts[key] = excerpt
+        if len(self._excerpts) > self._cache_size:
+            self._excerpts.popitem(last=False)
+        return excerpt
+
+    def __call__(self, callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+        if not self.enabled:
+            return None
+        document_content = _user_text(callback_context.user_content)
+        if not document_content:
+            return None
+        excerpt = self._excerpt_for(document_content)
+        if excerpt is None:
+            return None
+
+        # Transcripts of other agents quote tool arguments as a dict repr
+        quoted, quoted_excerpt = repr(document_content)[1:-1], repr(excerpt)[1:-1]
+        self.calls += 1
+        for content in llm_request.contents:
+            for part in content.parts or []:
+                if part.text:
+                    if part.text == document_content:
+                        part.text = excerpt
+                        self.characters_before += len(document_content)
+                        self.characters_after += len(excerpt)
+                    elif quoted in part.text:
+                        count = part.text.count(quoted)
+                        part.text = part.text.replace(quoted, quoted_excerpt)
+                        self.characters_before += count * len(quoted)
+                        self.characters_after += count * len(quoted_excerpt)
+                elif part.function_call and part.function_call.args:
+                    names = [name for name, value in part.function_call.args.items() if value == document_content]
+                    if names:
+                        # The args dict is shared with the session event, so it is copied, never edited
+                        args = dict(part.function_call.args, **{name: excerpt for name in names})
+                        part.function_call = part.function_call.model_copy(update={'args': args})
+                        self.characters_before += len(names) * len(document_content)
+                        self.characters_after += len(names) * len(excerpt)
+        return None
+
+
+class ImageCompactor:
+    """
+    before_model_callback that replaces scanned page images with compact crops.
+
+    The inline image parts of each message in the request are taken as the
+    pages of one scan and replaced, in place of the first, by the parts
+    ``image_intake.Scan.compact`` returns: a downsampled first page, the
+    regions of the classified document type once the session state has one,
+    and thumbnails of the other unique pages. Scans are kept under a hash of
+    their pages, so later calls in the same invocation only render what is
+    new; the least recently used are dropped beyond ``cache_bytes`` in all,
+    and a scan larger than that is not kept.
+
+    image_intake (and numpy) are imported on the first image; without numpy,
+    or for formats it cannot decode, images are sent unchanged.
+    """
+
+    def __init__(self, enabled: bool = True, cache_bytes: int = SCAN_CACHE_BYTES):
+        self.enabled = enabled
+        self.calls = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self.duplicate_pages = 0
+        self._cache_bytes = cache_bytes
+        self._cached_bytes = 0
+        self._scans: 'OrderedDict[bytes, Tuple[Any, int, Tuple[bytes, ...]]]' = OrderedDict()
+        # Digests of the cached scans by the ids of their page objects, which the entries keep alive; later
+        # calls of an invocation usually pass the same objects and skip hashing them again
+        self._digests: Dict[Tuple[int, ...], bytes] = {}
+
+    def _digest(self, pages: Tuple[bytes, ...]) -> bytes:
+        key = self._digests.get(tuple(map(id, pages)))
+        if key is not None and all(page is cached for page, cached in zip(pages, self._scans[key][2])):
+            return key
+        digest = hashlib.sha256()
+        for page in pages:
+            digest.update(len(page).to_bytes(8, 'big'))
+            digest.update(page)
+        return digest.digest()
+
+    def _compact(self, pages: Tuple[bytes, ...], document_type: Optional[str]) -> Dict[str, Any]:
+        """Compact the pages with the image_intake.Scan kept from an earlier call, or a new one."""
+        key = self._digest(pages)
+        entry = self._scans.pop(key, None)
+        if entry is None:
+            from .image_intake import Scan
+            scan = Scan(list(pages))
+        else:
+            scan, size, cached_pages = entry
+            self._cached_bytes -= size
+            del self._digests[tuple(map(id, cached_pages))]
+        compacted = scan.compact(document_type)
+        size = scan.memory_bytes()
+        if size <= self._cache_bytes:
+            self._scans[key] = (scan, size, pages)
+            self._digests[tuple(map(id, pages))] = key
+            self._cached_bytes += size
+            while self._cached_bytes > self._cache_bytes:
+                _, (_, evicted, evicted_pages) = self._scans.popitem(last=False)
+                self._cached_bytes -= evicted
+                del self._digests[tuple(map(id, evicted_pages))]
+        return compacted
+
+    def __call__(self, callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+        if not self.enabled:
+            return None
+        classification = callback_context.state.get(CLASSIFICATION_STATE_KEY)
+        document_type = classification.get('document_type') if classification else None
+        for content in llm_request.contents:
+            images = [index for index, part in enumerate(content.parts or [])
+                      if part.inline_data and part.inline_data.data
+                      and part.inline_data.mime_type in COMPACTED_IMAGE_MIME_TYPES]
+            if not images:
+                continue
+            pages = tuple(content.parts[index].inline_data.data for index in images)
+            try:
+                compacted = self._compact(pages, document_type)
+            except (ImportError, ValueError):
+                continue  # numpy missing, or not a format image_intake decodes; send the images unchanged
+            self.calls += 1
+            self.bytes_before += sum(len(page) for page in pages)
+            self.bytes_after += compacted['output_bytes']
+            self.duplicate_pages += len(compacted['duplicate_pages'])
+            replacement = [types.Part(inline_data=types.Blob(mime_type=part['mime_type'], data=part['data']))
+                           for part in compacted['parts']]
+            parts = [part for index, part in enumerate(content.parts) if index not in images]
+            content.parts = parts[:images[0]] + replacement + parts[images[0]:]
+        return None
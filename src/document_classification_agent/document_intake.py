@@ -0,0 +1,113 @@
+"""
+Memory-mapped intake of document files for local classification and extraction.
+"""
+
+import mmap
+import os
+from typing import Any, Dict, Iterator, Optional, Sequence
+
+from .classification import classification_from_scores
+from .field_extractor import extract_fields
+from .keyword_matcher import CLASSIFICATION_INDICATORS, KeywordMatcher
+
+
+# Bytes lowercased and scored at a time when classifying a mapped file
+INTAKE_WINDOW_SIZE = 1024 * 1024
+DOCUMENT_SUFFIXES = ('.txt',)
+
+# The shared term table over UTF-8 encoded terms, for matching raw bytes
+BYTES_MATCHER = KeywordMatcher({
+    doc_type: {group: [term.encode('utf-8') for term in terms] for group, terms in groups.items()}
+    for doc_type, groups in CLASSIFICATION_INDICATORS.items()
+})
+
+
+class MappedDocument:
+    """
+    Read-only memory map of a UTF-8 text document.
+
+    The file is never read into a Python string. Classification lowercases
+    and scores bounded windows of the map (ASCII case folding, which covers
+    every indicator term), and the label and MRZ scanners run their byte
+    patterns over the map itself, so only matched labels and values are
+    copied out. ``text`` materializes a slice on demand, e.g. for an LLM prompt.
+
+    Use as a context manager, or call ``close``.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        # Empty files cannot be mapped
+        self.buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+
+    def __enter__(self) -> 'MappedDocument':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def close(self) -> None:
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+        self._file.close()
+
+    def text(self, start: int = 0, end: Optional[int] = None) -> str:
+        """Decode the bytes from ``start`` to ``end`` (a partial character at either edge is replaced)."""
+        return self.buffer[start:end].decode('utf-8', errors='replace')
+
+    def classify(self, window_size: int = INTAKE_WINDOW_SIZE) -> Dict[str, Any]:
+        """
+        Classify the document with the keyword scorer.
+
+        Returns:
+            Classification result with the same scores as classify_text over
+            the decoded file
+        """
+        match = BYTES_MATCHER.stream()
+        for start in range(0, self.size, window_size):
+            match.feed(self.buffer[start:start + window_size].lower())
+            if match.complete:
+                break
+        return classification_from_scores(match.score())
+
+    def extract(self, document_type: str) -> Optional[Dict[str, Any]]:
+        """Run the local field extractors for ``document_type`` over the mapped bytes."""
+        return extract_fields(document_type, self.buffer)
+
+
+def process_file(path: str, window_size: int = INTAKE_WINDOW_SIZE) -> Dict[str, Any]:
+    """
+    Classify a document file and extract the fields of its winning type.
+
+    Args:
+        path: Path to a UTF-8 text document
+        window_size: Bytes lowercased at a time during classification
+
+    Returns:
+        Dictionary with the path, file size, classification and extraction
+        (None for unknown documents)
+    """
+    with MappedDocument(path) as document:
+        classification = document.classify(window_size)
+        document_type = classification['document_type']
+        extraction = document.extract(document_type) if document_type != 'unknown' else None
+        return {
+            'path': path,
+            'size': document.size,
+            'classification': classification,
+            'extraction': extraction,
+        }
+
+
+def iter_document_files(directory: str, suffixes: Sequence[str] = DOCUMENT_SUFFIXES) -> Iterator[str]:
+    """Yield the paths of document files under ``directory``, recursively, in sorted order."""
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(tuple(suffixes)):
+                yield os.path.join(root, name)
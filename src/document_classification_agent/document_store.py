@@ -0,0 +1,39 @@
+"""
+Content handles for documents and the session state keys results are recorded under.
+"""
+
+import hashlib
+import json
+import re
+from typing import Any, Dict, Optional
+
+
+# Session state keys under which locally produced results are recorded
+CLASSIFICATION_STATE_KEY = 'classification'
+EXTRACTION_STATE_KEY = 'extraction'
+# The extraction specialist's final reply, as text
+EXTRACTION_REPLY_STATE_KEY = 'extraction_reply'
+
+_CODE_FENCE_RE = re.compile(r'^\s*```(?:json)?\s*|\s*```\s*$')
+
+
+def content_ref(document_content: str) -> str:
+    """
+    Return a stable content handle for a document's text.
+
+    The extraction tools return this instead of echoing the text, which is
+    already in the conversation; the text itself is not stored anywhere.
+    """
+    return 'doc-' + hashlib.sha256(document_content.encode('utf-8')).hexdigest()[:16]
+
+
+def as_extraction(value: Any) -> Optional[Dict[str, Any]]:
+    """An extraction result as a dict, parsing an agent's JSON reply; None if it has no extracted_fields."""
+    if isinstance(value, str):
+        try:
+            value = json.loads(_CODE_FENCE_RE.sub('', value))
+        except ValueError:
+            return None
+    if isinstance(value, dict) and isinstance(value.get('extracted_fields'), dict):
+        return value
+    return None
@@ -0,0 +1,272 @@
+"""
+Table-driven local field extractor for label: value formatted documents.
+"""
+
+import mmap
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Pattern, Tuple, Union
+
+from .mrz import find_td3
+
+
+# Fields each extraction specialist is asked to fill
+EXPECTED_FIELDS = {
+    'kyc': [
+        'customer_name', 'customer_id', 'date_of_birth', 'address',
+        'phone_number', 'email', 'id_document_type', 'id_document_number',
+        'verification_date', 'risk_level'
+    ],
+    'passport': [
+        'passport_number', 'surname', 'given_names', 'nationality',
+        'date_of_birth', 'place_of_birth', 'sex', 'date_of_issue',
+        'date_of_expiry', 'issuing_authority'
+    ],
+    'w9': [
+        'name', 'business_name', 'tax_classification', 'address',
+        'city', 'state', 'zip_code', 'taxpayer_id_number',
+        'backup_withholding', 'signature_date'
+    ]
+}
+
+# Printed labels that introduce each field, per document type
+FIELD_LABELS = {
+    'kyc': {
+        'customer_name': ['customer name', 'full name', 'name'],
+        'customer_id': ['customer id', 'customer number', 'client id'],
+        'date_of_birth': ['date of birth', 'dob', 'birth date'],
+        'address': ['address', 'residential address'],
+        'phone_number': ['phone', 'phone number', 'telephone', 'mobile'],
+        'email': ['email', 'e-mail', 'email address'],
+        'id_document_type': ['id document type', 'document type', 'id type'],
+        'id_document_number': ['id document number', 'document number', 'id number'],
+        'verification_date': ['verification date', 'date verified'],
+        'risk_level': ['risk level', 'risk rating'],
+    },
+    'passport': {
+        'passport_number': ['passport no', 'passport number', 'passport no.', 'document no'],
+        'surname': ['surname', 'last name', 'family name'],
+        'given_names': ['given names', 'given name', 'first names'],
+        'nationality': ['nationality'],
+        'date_of_birth': ['date of birth', 'dob'],
+        'place_of_birth': ['place of birth'],
+        'sex': ['sex', 'gender'],
+        'date_of_issue': ['date of issue', 'issue date', 'issued'],
+        'date_of_expiry': ['date of expiry', 'expiry date', 'expiration date', 'expires'],
+        'issuing_authority': ['issuing authority', 'authority'],
+    },
+    'w9': {
+        'name': ['name'],
+        'business_name': ['business name', 'business name/disregarded entity name'],
+        'tax_classification': ['tax classification', 'federal tax classification'],
+        'address': ['address', 'street address'],
+        'city': ['city'],
+        'state': ['state'],
+        'zip_code': ['zip code', 'zip'],
+        'taxpayer_id_number': ['taxpayer identification number', 'tin', 'ein', 'ssn'],
+        'backup_withholding': ['backup withholding'],
+        'signature_date': ['signature date', 'date signed', 'date'],
+    }
+}
+
+_DATE = r'(?:\d{1,2}\s+[A-Za-z]{3,9}\.?\s+\d{4}|[A-Za-z]{3,9}\.?\s+\d{1,2},?\s+\d{4}|\d{4}-\d{2}-\d{2}|\d{1,2}/\d{1,2}/\d{2,4})'
+
+# Shape a value must have to be trusted without the LLM, by field name
+FIELD_VALIDATORS = {
+    'date_of_birth': _DATE,
+    'verification_date': _DATE,
+    'date_of_issue': _DATE,
+    'date_of_expiry': _DATE,
+    'signature_date': _DATE,
+    'email': r'[^@\s]+@[^@\s]+\.[A-Za-z]{2,}',
+    'phone_number': r'\+?[\d\s().-]{7,20}',
+    'zip_code': r'\d{5}(?:-\d{4})?',
+    'state': r'[A-Z]{2}',
+    'taxpayer_id_number': r'\d{2}-\d{7}|\d{3}-\d{2}-\d{4}|\d{9}',
+    'sex': r'[MFX]',
+    'passport_number': r'[A-Z0-9]{6,10}',
+    'risk_level': r'(?i:low|medium|high)',
+}
+
+# Per-field confidence for a labelled value that passes / has no validator
+VALIDATED_CONFIDENCE = 0.95
+UNVALIDATED_CONFIDENCE = 0.8
+# Minimum confidence for a field to be considered filled locally
+FIELD_MIN_CONFIDENCE = 0.7
+# Confidence of a field read from a machine-readable zone with valid check digits
+MRZ_CONFIDENCE = 1.0
+
+
+class FieldExtractor:
+    """
+    Compiled label scanner for one document type.
+
+    All labels for the type are folded into a single anchored, case-insensitive
+    regex (longest label first, so 'business name' wins over 'name'), which is
+    run once over the document. The first labelled value for each field is kept
+    and checked against FIELD_VALIDATORS to set its confidence.
+    """
+
+    def __init__(self, document_type: str, labels: Dict[str, List[str]], expected_fields: List[str]):
+        self.document_type = document_type
+        self.expected_fields = list(expected_fields)
+        self._field_by_label = {label: field for field, names in labels.items() for label in names}
+        alternation = '|'.join(re.escape(label) for label in sorted(self._field_by_label, key=len, reverse=True))
+        self._line_re: Pattern[str] = re.compile(
+            rf'^[ \t]*({alternation})[ \t]*[:#][ \t]*(\S[^\r\n]*?)[ \t]*\r?$', re.IGNORECASE | re.MULTILINE)
+        # Same scanner over raw bytes (labels are ASCII), for memory-mapped files
+        self._line_bytes_re: Pattern[bytes] = re.compile(
+            self._line_re.pattern.encode('ascii'), re.IGNORECASE | re.MULTILINE)
+        self._validators: Dict[str, Pattern[str]] = {
+            field: re.compile(FIELD_VALIDATORS[field]) for field in self.expected_fields if field in FIELD_VALIDATORS
+        }
+
+    def scan(self, document_content: Union[str, bytes, mmap.mmap]) -> Dict[str, Tuple[str, float]]:
+        """
+        Return {field: (value, confidence)} for every labelled field found.
+
+        Bytes and memory maps are scanned in place; only the matched labels
+        and values are decoded (as UTF-8).
+        """
+        raw = not isinstance(document_content, str)
+        found: Dict[str, Tuple[str, float]] = {}
+        for match in (self._line_bytes_re if raw else self._line_re).finditer(document_content):
+            label, value = match.group(1, 2)
+            if raw:
+                label, value = label.decode('ascii'), value.decode('utf-8', errors='replace')
+            field = self._field_by_label[label.lower()]
+            if field in found:
+                continue
+            validator = self._validators.get(field)
+            if validator is None:
+                confidence = UNVALIDATED_CONFIDENCE
+            elif validator.fullmatch(value):
+                confidence = VALIDATED_CONFIDENCE
+            else:
+                confidence = 0.0
+            found[field] = (value, confidence)
+        return found
+
+    def label_spans(self, document_content: str) -> List[Tuple[int, int]]:
+        """Offsets of the labelled lines ``scan`` reads: the first match for each field."""
+        seen = set()
+        spans = []
+        for match in self._line_re.finditer(document_content):
+            field = self._field_by_label[match.group(1).lower()]
+            if field not in seen:
+                seen.add(field)
+                spans.append(match.span())
+        return spans
+
+    def labelled_lines(self, document_content: str) -> Dict[str, str]:
+        """The line each field is read from by ``scan``, by field."""
+        lines = {}
+        for match in self._line_re.finditer(document_content):
+            lines.setdefault(self._field_by_label[match.group(1).lower()], match.group(0))
+        return lines
+
+    def extract(self, document_content: Union[str, bytes, mmap.mmap]) -> Dict[str, Any]:
+        """
+        Extract every expected field that can be parsed deterministically.
+
+        Args:
+            document_content: Text content of the document, or its raw bytes
+
+        Returns:
+            Dictionary with extracted fields, per-field confidence and the
+            fields that still need the LLM
+        """
+        found = self.scan(document_content)
+        extracted = {field: value for field, (value, confidence) in found.items() if confidence >= FIELD_MIN_CONFIDENCE}
+        field_confidence = {field: found[field][1] for field in extracted}
+        missing = [field for field in self.expected_fields if field not in extracted]
+        filled = len(self.expected_fields) - len(missing)
+        return {
+            'document_type': self.document_type,
+            'extracted_fields': extracted,
+            'field_confidence': field_confidence,
+            'missing_fields': missing,
+            'extraction_confidence': sum(field_confidence.values()) / len(self.expected_fields),
+            'extraction_method': 'local_labels',
+            'description': f'Extracted {filled} of {len(self.expected_fields)} {self.document_type} fields locally'
+        }
+
+
+# Extractors compiled once at import time, by document type
+FIELD_EXTRACTORS = {
+    document_type: FieldExtractor(document_type, FIELD_LABELS[document_type], fields)
+    for document_type, fields in EXPECTED_FIELDS.items()
+}
+
+
+def _merge_mrz(extraction: Dict[str, Any], mrz: Dict[str, Any], expected_fields: List[str]) -> None:
+    """
+    Take every field a check-digit-verified MRZ covers from the MRZ, in its formats.
+
+    Label values for those fields are dropped; the ones that disagree with
+    the MRZ are listed under ``mrz_conflicts``. Fields the MRZ does not
+    cover (place of birth, issue date, authority) keep their label values.
+    """
+    extracted = extraction['extracted_fields']
+    field_confidence = extraction['field_confidence']
+    conflicts = {}
+    for field in expected_fields:
+        if not mrz.get(field):
+            continue
+        label_value = extracted.get(field)
+        if label_value is not None and _mrz_form(field, label_value) != mrz[field]:
+            conflicts[field] = label_value
+        extracted[field] = mrz[field]
+        field_confidence[field] = MRZ_CONFIDENCE
+    extraction['missing_fields'] = [field for field in expected_fields if field not in extracted]
+    extraction['extraction_confidence'] = sum(field_confidence.values()) / len(expected_fields)
+    extraction['extraction_method'] = 'mrz+local_labels'
+    extraction['mrz_verified'] = True
+    extraction['mrz_conflicts'] = conflicts
+    extraction['mrz'] = mrz
+    extraction['description'] = (f"Extracted {len(extracted)} of {len(expected_fields)} "
+                                 f"{extraction['document_type']} fields locally with a verified MRZ"
+                                 + (f"; labels disagree with it on {', '.join(conflicts)}" if conflicts else ''))
+
+
+def _mrz_form(field: str, value: str) -> str:
+    """A label value written the way the MRZ writes that field, as far as it can be converted."""
+    if field in ('date_of_birth', 'date_of_expiry'):
+        for layout in ('%d %b %Y', '%B %d, %Y', '%Y-%m-%d', '%d/%m/%Y', '%d.%m.%Y'):
+            try:
+                return datetime.strptime(value.strip(), layout).date().isoformat()
+            except ValueError:
+                pass
+        return value
+    if field == 'sex':
+        return value.strip()[:1].upper()
+    if field == 'nationality':
+        # Full country names are not converted to codes; only a 3-letter code can agree
+        return value.strip().upper()
+    return ' '.join(value.replace('<', ' ').split()).upper()
+
+
+def extract_fields(document_type: str,
+                   document_content: Union[str, bytes, mmap.mmap]) -> Optional[Dict[str, Any]]:
+    """
+    Run the local extractors for a document type.
+    
+    Passports are first checked for a TD3 machine-readable zone; when its check
+    digits validate, the result carries ``mrz_verified`` and needs no LLM even
+    if fields outside the MRZ (place of birth, issue date) are missing.
+    
+    Args:
+        document_type: One of the types in EXPECTED_FIELDS
+        document_content: Text content of the document, or its raw bytes
+        
+    Returns:
+        Extraction result, or None for unsupported document types
+    """
+    extractor = FIELD_EXTRACTORS.get(document_type)
+    if extractor is None:
+        return None
+    mrz = find_td3(document_content) if document_type == 'passport' else None
+    extraction = extractor.extract(document_content)
+    if mrz is not None:
+        _merge_mrz(extraction, mrz, extractor.expected_fields)
+    return extraction
@@ -0,0 +1,496 @@
+"""
+Lazy decoding and compaction of scanned document images for model requests.
+
+A scan arrives as base64 text (the ``image_data`` tool argument) or as raw
+bytes (inline image parts of a user message). Pages are located by reading
+their headers only; base64 is decoded just for the byte ranges a step
+needs. Near-identical pages are dropped by a perceptual hash, and only a
+downsampled first page plus the regions the document type needs (the
+passport MRZ strip, the W-9 header) are rendered and re-encoded as small
+grayscale PNGs.
+
+Supported inputs, with numpy and the standard library only:
+- binary PGM/PPM (Netpbm P5/P6, 8-bit), one or more pages concatenated;
+  rows are read directly from the source, so a crop decodes only its rows
+- PNG, 8-bit and non-interlaced; the zlib stream is decoded once per page
+
+Requires numpy (optional for the rest of the package).
+"""
+
+import binascii
+import struct
+import zlib
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+
+# Longest side of the first-page overview sent to the model
+OVERVIEW_MAX_SIDE = 768
+# Longest side of the other unique pages, sent as thumbnails
+THUMBNAIL_MAX_SIDE = 384
+# Widest a type-specific region crop is sent; regions keep more detail than the overview
+REGION_MAX_WIDTH = 1600
+# Unique pages after the first sent as thumbnails, at most
+MAX_EXTRA_PAGES = 3
+# Bands of the first page (fractions of its height) sent at region resolution, per document type
+IMAGE_REGIONS = {
+    'passport': (('mrz', 0.70, 1.0),),
+    'w9': (('header', 0.0, 0.22),),
+    'kyc': (),
+}
+# Pages whose 64-bit difference hashes differ in at most this many bits are duplicates
+DUPLICATE_HASH_DISTANCE = 6
+# Rows sampled from a page to compute its hash
+HASH_SAMPLE_ROWS = 64
+# Rows converted to grayscale at a time while rendering
+RENDER_STRIP_ROWS = 256
+PNG_COMPRESSION_LEVEL = 6
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# PNG colour type -> samples per pixel
+_PNG_CHANNELS = {0: 1, 2: 3, 4: 2, 6: 4}
+_PNM_CHANNELS = {b'P5': 1, b'P6': 3}
+# ITU-R 601 luma weights in 1/256ths
+_LUMA = (np.uint16(77), np.uint16(150), np.uint16(29))
+
+
+class _RawSource:
+    """Bytes already in memory, read by slice."""
+
+    def __init__(self, data: Union[bytes, bytearray, memoryview]):
+        self._data = memoryview(data).cast('B')
+        self.decoded_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def read(self, start: int, stop: int) -> memoryview:
+        chunk = self._data[start:stop]
+        self.decoded_bytes += len(chunk)
+        return chunk
+
+
+class _Base64Source:
+    """
+    Base64 text decoded on demand, one byte range at a time.
+
+    Every 4 characters encode 3 bytes, so a range maps to a character range
+    and is decoded without touching the rest of the text.
+    """
+
+    def __init__(self, text: str):
+        text = text.strip()
+        if text.startswith('data:'):
+            text = text[text.index(',') + 1:]
+        if any(character in text for character in ' \t\r\n'):
+            text = ''.join(text.split())
+        if len(text) % 4:
+            raise ValueError("Base64 image data length is not a multiple of 4")
+        self._text = text
+        self._length = len(text) // 4 * 3 - (2 if text.endswith('==') else 1 if text.endswith('=') else 0)
+        self.decoded_bytes = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def read(self, start: int, stop: int) -> bytes:
+        start, stop = max(start, 0), min(stop, self._length)
+        if start >= stop:
+            return b''
+        first, last = start // 3, -(-stop // 3)
+        chunk = binascii.a2b_base64(self._text[first * 4:last * 4])
+        self.decoded_bytes += len(chunk)
+        return chunk[start - first * 3:stop - first * 3]
+
+
+def _to_gray(pixels: np.ndarray, channels: int) -> np.ndarray:
+    """Grayscale uint8 rows from interleaved 8-bit samples of shape (rows, width * channels)."""
+    if channels == 1:
+        return pixels
+    rows, width = pixels.shape[0], pixels.shape[1] // channels
+    samples = pixels.reshape(rows, width, channels)
+    if channels == 2:  # gray plus alpha
+        return np.ascontiguousarray(samples[:, :, 0])
+    red, green, blue = _LUMA
+    return ((samples[:, :, 0] * red + samples[:, :, 1] * green + samples[:, :, 2] * blue + 128) >> 8).astype(np.uint8)
+
+
+class ScanPage:
+    """
+    One page of a scan, located by its header and decoded on demand.
+
+    ``gray_rows`` returns grayscale rows. PNM pages read just those rows from
+    the source; PNG pages decode their zlib stream on first use and keep the
+    grayscale pixels.
+    """
+
+    def __init__(self, source, image_format: str, offset: int, width: int, height: int, channels: int,
+                 chunks: Sequence[Tuple[int, int]] = ()):
+        self.source = source
+        self.format = image_format
+        self.offset = offset
+        self.width = width
+        self.height = height
+        self.channels = channels
+        self._chunks = list(chunks)
+        self._gray: Optional[np.ndarray] = None
+
+    def gray_rows(self, start: int, stop: int) -> np.ndarray:
+        """Grayscale pixels of rows [start, stop), shape (rows, width)."""
+        if self.format == 'png':
+            if self._gray is None:
+                self._gray = self._decode_png()
+            return self._gray[start:stop]
+        row_bytes = self.width * self.channels
+        data = self.source.read(self.offset + start * row_bytes, self.offset + stop * row_bytes)
+        pixels = np.frombuffer(data, dtype=np.uint8).reshape(stop - start, row_bytes)
+        return _to_gray(pixels, self.channels)
+
+    def _decode_png(self) -> np.ndarray:
+        """Inflate and unfilter the whole image, then convert it to grayscale."""
+        inflate = zlib.decompressobj()
+        try:
+            stream = b''.join(inflate.decompress(self.source.read(start, start + length))
+                              for start, length in self._chunks) + inflate.flush()
+        except zlib.error as e:
+            raise ValueError(f"malformed PNG image data: {e}") from e
+        row_bytes = self.width * self.channels
+        if len(stream) < (row_bytes + 1) * self.height:
+            raise ValueError("malformed PNG image data: fewer rows than the header declares")
+        lines = np.frombuffer(stream, dtype=np.uint8)[:(row_bytes + 1) * self.height]
+        lines = lines.reshape(self.height, row_bytes + 1)
+        pixels = np.empty((self.height, row_bytes), dtype=np.uint8)
+        previous = np.zeros(row_bytes, dtype=np.uint8)
+        for row in range(self.height):
+            previous = pixels[row] = _unfilter(int(lines[row, 0]), lines[row, 1:], previous, self.channels)
+        return _to_gray(pixels, self.channels)
+
+    def difference_hash(self) -> int:
+        """
+        64-bit difference hash of the page.
+
+        HASH_SAMPLE_ROWS evenly spaced rows are averaged into an 8 x 9 grid, and
+        each bit records whether a cell is brighter than its right neighbour.
+        Rescans of the same page differ in only a few bits. Pages narrower than
+        the grid have their columns repeated first, so every cell averages at
+        least one column.
+        """
+        rows = np.linspace(0, self.height - 1, HASH_SAMPLE_ROWS).astype(np.int64)
+        if self.format == 'png':
+            sample = self.gray_rows(0, self.height)[rows]
+        else:
+            sample = np.stack([self.gray_rows(row, row + 1)[0] for row in rows])
+        width = self.width
+        if width < 9:
+            sample, width = sample[:, np.arange(9) * width // 9], 9
+        column_edges = np.linspace(0, width, 10).astype(np.int64)[:-1]
+        grid = np.add.reduceat(sample.reshape(8, -1, width).sum(axis=1, dtype=np.float64),
+                               column_edges, axis=1) / np.diff(np.append(column_edges, width))
+        bits = (grid[:, 1:] > grid[:, :-1]).ravel()
+        return int(np.packbits(bits).view('>u8')[0])
+
+    def render(self, top: float = 0.0, bottom: float = 1.0, max_side: Optional[int] = None,
+               max_width: Optional[int] = None) -> np.ndarray:
+        """
+        Box-downsampled grayscale crop of a horizontal band of the page.
+
+        Args:
+            top: Top of the band, as a fraction of the page height
+            bottom: Bottom of the band, as a fraction of the page height
+            max_side: Longest side of the result, if bounded
+            max_width: Width of the result, if bounded
+
+        Returns:
+            uint8 array; each output pixel is the mean of a square block
+        """
+        start = min(int(self.height * top), self.height - 1)
+        stop = max(int(self.height * bottom), start + 1)
+        factor = 1
+        if max_side:
+            factor = max(factor, -(-max(stop - start, self.width) // max_side))
+        if max_width:
+            factor = max(factor, -(-self.width // max_width))
+        factor = min(factor, stop - start, self.width)
+        width = self.width // factor * factor
+        stop = start + (stop - start) // factor * factor
+        strip_rows = max(RENDER_STRIP_ROWS // factor, 1) * factor
+        strips = []
+        for strip_start in range(start, stop, strip_rows):
+            gray = self.gray_rows(strip_start, min(strip_start + strip_rows, stop))[:, :width]
+            if factor > 1:
+                blocks = gray.reshape(-1, factor, width // factor, factor).sum(axis=(1, 3), dtype=np.uint32)
+                gray = (blocks // (factor * factor)).astype(np.uint8)
+            strips.append(gray)
+        return np.concatenate(strips)
+
+
+def _unfilter(filter_type: int, line: np.ndarray, previous: np.ndarray, bpp: int) -> np.ndarray:
+    """Reconstruct one PNG scanline. Sub and Up are vectorized; Average and Paeth run per byte."""
+    if filter_type == 0:
+        return line
+    if filter_type == 1:
+        return np.cumsum(line.reshape(-1, bpp), axis=0, dtype=np.uint8).ravel()
+    if filter_type == 2:
+        return line + previous
+    # Average and Paeth depend on the reconstructed byte to the left, so they cannot be vectorized
+    out = bytearray(line.tobytes())
+    above = previous.tobytes()
+    if filter_type == 3:
+        for i in range(len(out)):
+            left = out[i - bpp] if i >= bpp else 0
+            out[i] = (out[i] + ((left + above[i]) >> 1)) & 0xFF
+    elif filter_type == 4:
+        for i in range(len(out)):
+            a = out[i - bpp] if i >= bpp else 0
+            b = above[i]
+            c = above[i - bpp] if i >= bpp else 0
+            p = a + b - c
+            pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+            out[i] = (out[i] + (a if pa <= pb and pa <= pc else b if pb <= pc else c)) & 0xFF
+    else:
+        raise ValueError(f"Unknown PNG filter type {filter_type}")
+    return np.frombuffer(bytes(out), dtype=np.uint8)
+
+
+def _read_exact(source, start: int, stop: int) -> bytes:
+    """Bytes [start, stop) of the source, or ValueError if it ends first."""
+    data = bytes(source.read(start, stop))
+    if len(data) != stop - start:
+        raise ValueError(f"malformed PNG: truncated at byte {start + len(data)}")
+    return data
+
+
+def _pnm_pages(source) -> List[ScanPage]:
+    """Locate every page of a concatenated P5/P6 stream from its headers."""
+    pages = []
+    offset = 0
+    while offset < len(source):
+        header = bytes(source.read(offset, offset + 256))
+        if not header.strip():
+            break
+        magic = header[:2]
+        if magic not in _PNM_CHANNELS:
+            raise ValueError(f"Unsupported image page at byte {offset}")
+        # Width, height and maxval, each after whitespace and optional comments
+        fields, position = [], 2
+        while len(fields) < 3:
+            while position < len(header) and header[position:position + 1].isspace():
+                position += 1
+            if header[position:position + 1] == b'#':
+                position = header.index(b'\n', position)
+                continue
+            end = position
+            while end < len(header) and header[end:end + 1].isdigit():
+                end += 1
+            if end == position:
+                raise ValueError(f"Malformed PNM header at byte {offset}")
+            fields.append(int(header[position:end]))
+            position = end
+        width, height, maxval = fields
+        if not width or not height:
+            raise ValueError(f"Empty PNM page at byte {offset}")
+        if maxval > 255:
+            raise ValueError("Only 8-bit PNM images are supported")
+        data_offset = offset + position + 1
+        pages.append(ScanPage(source, 'pnm', data_offset, width, height, _PNM_CHANNELS[magic]))
+        offset = data_offset + width * height * _PNM_CHANNELS[magic]
+    return pages
+
+
+def _png_page(source) -> ScanPage:
+    """
+    Locate the header and data chunks of a PNG without inflating anything.
+
+    Raises:
+        ValueError: If the file is truncated, or is not a supported PNG
+    """
+    offset, chunks, size = len(_PNG_SIGNATURE), [], None
+    while offset + 8 <= len(source):
+        length, kind = struct.unpack('>I4s', _read_exact(source, offset, offset + 8))
+        if kind != b'IEND' and offset + 12 + length > len(source):
+            raise ValueError(f"malformed PNG: {kind!r} chunk at byte {offset} runs past the end of the file")
+        if kind == b'IHDR':
+            if length < 13:
+                raise ValueError("malformed PNG: short IHDR chunk")
+            width, height, depth, color, _, _, interlace = struct.unpack(
+                '>IIBBBBB', _read_exact(source, offset + 8, offset + 21))
+            if depth != 8 or color not in _PNG_CHANNELS or interlace:
+                raise ValueError("Only 8-bit, non-interlaced gray, RGB and alpha PNGs are supported")
+            if not width or not height:
+                raise ValueError("malformed PNG: empty image")
+            size = (width, height, _PNG_CHANNELS[color])
+        elif kind == b'IDAT':
+            chunks.append((offset + 8, length))
+        elif kind == b'IEND':
+            break
+        offset += 12 + length
+    if size is None or not chunks:
+        raise ValueError("PNG has no image header or data")
+    return ScanPage(source, 'png', 0, *size, chunks=chunks)
+
+
+def load_pages(image_data: Union[str, bytes, Sequence[Union[str, bytes]]]) -> List[ScanPage]:
+    """
+    Locate the pages of a scan without decoding their pixels.
+
+    Args:
+        image_data: Base64 text or raw bytes of one image file (a PNG, or
+            one or more concatenated PGM/PPM pages), or a sequence of them
+
+    Returns:
+        Pages in order
+
+    Raises:
+        ValueError: If a file is not a supported format
+    """
+    if isinstance(image_data, (str, bytes, bytearray, memoryview)):
+        image_data = [image_data]
+    pages = []
+    for item in image_data:
+        source = _Base64Source(item) if isinstance(item, str) else _RawSource(item)
+        signature = bytes(source.read(0, len(_PNG_SIGNATURE)))
+        pages.extend([_png_page(source)] if signature == _PNG_SIGNATURE else _pnm_pages(source))
+    return pages
+
+
+def unique_pages(pages: Sequence[ScanPage]) -> Tuple[List[int], List[List[int]]]:
+    """
+    Split pages into first occurrences and near-duplicates.
+
+    Returns:
+        (indexes of unique pages, [duplicate index, index of the page it repeats] pairs)
+    """
+    kept: List[Tuple[int, int]] = []
+    duplicates = []
+    for index, page in enumerate(pages):
+        page_hash = page.difference_hash()
+        match = next((first for first, first_hash in kept
+                      if bin(page_hash ^ first_hash).count('1') <= DUPLICATE_HASH_DISTANCE), None)
+        if match is None:
+            kept.append((index, page_hash))
+        else:
+            duplicates.append([index, match])
+    return [index for index, _ in kept], duplicates
+
+
+def encode_png(gray: np.ndarray) -> bytes:
+    """Encode a 2-D uint8 array as a grayscale PNG, every row Up-filtered."""
+    height, width = gray.shape
+    filtered = np.empty((height, width + 1), dtype=np.uint8)
+    filtered[:, 0] = 2
+    filtered[0, 1:] = gray[0]
+    filtered[1:, 1:] = gray[1:] - gray[:-1]
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    return (_PNG_SIGNATURE
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(filtered.tobytes(), PNG_COMPRESSION_LEVEL))
+            + chunk(b'IEND', b''))
+
+
+class Scan:
+    """
+    The pages of one scan, with duplicates found once and rendered parts kept.
+
+    ``compact`` can be called again as the document type becomes known; only
+    the parts not rendered before are decoded and encoded.
+    """
+
+    def __init__(self, image_data: Union[str, bytes, Sequence[Union[str, bytes]]]):
+        self.pages = load_pages(image_data)
+        self.unique, self.duplicates = unique_pages(self.pages)
+        self._parts: Dict[Tuple[str, int], Dict[str, Any]] = {}
+
+    def _bytes(self) -> Tuple[int, int]:
+        """(input bytes, bytes decoded from them so far) over the distinct sources of the pages."""
+        sources = {id(page.source): page.source for page in self.pages}.values()
+        return sum(len(source) for source in sources), sum(source.decoded_bytes for source in sources)
+
+    def memory_bytes(self) -> int:
+        """Bytes the scan keeps alive: its sources, decoded PNG pixels and rendered parts."""
+        sources = {id(page.source): page.source for page in self.pages}.values()
+        return (sum(len(source) for source in sources)
+                + sum(page._gray.nbytes for page in self.pages if page._gray is not None)
+                + sum(len(part['data']) for part in self._parts.values()))
+
+    def _part(self, region: str, index: int, top: float = 0.0, bottom: float = 1.0, **limits) -> Dict[str, Any]:
+        part = self._parts.get((region, index))
+        if part is None:
+            gray = self.pages[index].render(top, bottom, **limits)
+            part = {'region': region, 'page': index, 'mime_type': 'image/png', 'data': encode_png(gray),
+                    'width': gray.shape[1], 'height': gray.shape[0]}
+            self._parts[(region, index)] = part
+        return part
+
+    def summary(self) -> Dict[str, Any]:
+        """Page count, page sizes, unique and duplicate pages, and input and decoded byte counts."""
+        input_bytes, decoded_bytes = self._bytes()
+        return {
+            'pages': len(self.pages),
+            'page_sizes': [[page.width, page.height] for page in self.pages],
+            'unique_pages': self.unique,
+            'duplicate_pages': self.duplicates,
+            'input_bytes': input_bytes,
+            'decoded_bytes': decoded_bytes,
+        }
+
+    def compact(self, document_type: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Reduce the scan to the few small images a model needs.
+
+        Sends the first unique page downsampled to OVERVIEW_MAX_SIDE, its
+        IMAGE_REGIONS bands for ``document_type`` at up to REGION_MAX_WIDTH,
+        and up to MAX_EXTRA_PAGES further unique pages as thumbnails.
+
+        Args:
+            document_type: Classified type, if known, selecting the regions
+
+        Returns:
+            The summary, plus 'parts' (each with region, page, mime_type,
+            data, width and height) and their total 'output_bytes'
+        """
+        parts = []
+        if self.unique:
+            first = self.unique[0]
+            parts.append(self._part('overview', first, max_side=OVERVIEW_MAX_SIDE))
+            for region, top, bottom in IMAGE_REGIONS.get(document_type, ()):
+                parts.append(self._part(region, first, top, bottom, max_width=REGION_MAX_WIDTH))
+            for index in self.unique[1:1 + MAX_EXTRA_PAGES]:
+                parts.append(self._part('page', index, max_side=THUMBNAIL_MAX_SIDE))
+        result = self.summary()
+        result.update(parts=parts, output_bytes=sum(len(part['data']) for part in parts))
+        return result
+
+
+def scan_summary(image_data: Union[str, bytes, Sequence[Union[str, bytes]]]) -> Dict[str, Any]:
+    """
+    Describe a scan's pages and duplicates, decoding only headers and hash samples.
+
+    Args:
+        image_data: As for load_pages
+
+    Returns:
+        Dictionary with page count, page sizes, unique and duplicate pages,
+        and input and decoded byte counts
+    """
+    return Scan(image_data).summary()
+
+
+def compact_scan(image_data: Union[str, bytes, Sequence[Union[str, bytes]]],
+                 document_type: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Reduce a scan to the few small images a model needs; see Scan.compact.
+
+    Near-duplicate pages are dropped before anything is rendered.
+
+    Args:
+        image_data: As for load_pages
+        document_type: Classified type, if known, selecting the regions
+
+    Returns:
+        Dictionary with 'parts' and page, duplicate and byte counts
+    """
+    return Scan(image_data).compact(document_type)
@@ -0,0 +1,328 @@
+"""
+Precompiled keyword matcher used by the document classifier.
+"""
+
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+
+# Keyword and pattern sets for each supported document type
+CLASSIFICATION_INDICATORS = {
+    'kyc': {
+        'keywords': ['know your customer', 'kyc', 'identity verification', 'customer identification',
+                    'due diligence', 'aml', 'anti-money laundering', 'beneficial owner', 'customer name',
+                    'customer id', 'verification date', 'risk level', 'compliance'],
+        'patterns': ['customer', 'verification', 'identity', 'risk']
+    },
+    'passport': {
+        'keywords': ['passport', 'travel document', 'nationality', 'passport number', 'passport no',
+                    'place of birth', 'issuing authority', 'expiry date', 'given names', 'surname'],
+        'patterns': ['passport', 'nationality', 'travel', 'issued', 'expiry']
+    },
+    'w9': {
+        'keywords': ['w-9', 'form w-9', 'taxpayer identification', 'request for taxpayer',
+                    'backup withholding', 'ein', 'ssn', 'taxpayer identification number',
+                    'tax classification', 'business name'],
+        'patterns': ['taxpayer', 'form', 'tax', 'withholding', 'certification']
+    }
+}
+
+# Weight of a pattern hit relative to a keyword hit
+PATTERN_WEIGHT = 0.5
+
+
+class KeywordMatcher:
+    """
+    Compiled term table over every keyword and pattern of every document type.
+
+    Each distinct term is searched once, shortest first. A term that contains
+    another term (e.g. 'taxpayer identification number' contains 'tax') is only
+    searched when the shorter term was found, so documents that miss a common
+    stem skip every longer term built on it.
+    """
+
+    def __init__(self, indicators: Mapping[str, Mapping[str, Sequence[str]]]):
+        self.doc_types: Tuple[str, ...] = tuple(indicators)
+        terms = {term for groups in indicators.values() for group in groups.values() for term in group}
+        self.terms: Tuple[str, ...] = tuple(sorted(terms, key=lambda term: (len(term), term)))
+        self.max_term_length = len(self.terms[-1]) if self.terms else 0
+        index = {term: i for i, term in enumerate(self.terms)}
+
+        # Indexes of shorter terms each term contains; all must be present for it to be
+        self._requires: Tuple[Tuple[int, ...], ...] = tuple(
+            tuple(index[other] for other in self.terms[:i] if other in term)
+            for i, term in enumerate(self.terms)
+        )
+
+        # Which (doc_type, group) counters each term increments
+        type_index = {doc_type: i for i, doc_type in enumerate(self.doc_types)}
+        hits: List[List[Tuple[int, int]]] = [[] for _ in self.terms]
+        for doc_type, groups in indicators.items():
+            for term in groups.get('keywords', ()):
+                hits[index[term]].append((type_index[doc_type], 0))
+            for term in groups.get('patterns', ()):
+                hits[index[term]].append((type_index[doc_type], 1))
+        self._table: Tuple[Tuple[str, Tuple[int, ...], Tuple[Tuple[int, int], ...]], ...] = tuple(
+            zip(self.terms, self._requires, (tuple(h) for h in hits))
+        )
+
+        # Early-exit tables: weight per type of each term, the longer terms containing it,
+        # and an evaluation order by how much score one lookup can settle
+        self._weights: Tuple[Tuple[Tuple[int, float], ...], ...] = tuple(
+            tuple((type_idx, PATTERN_WEIGHT if group else 1.0) for type_idx, group in h) for h in hits)
+        self._contained_in: Tuple[Tuple[int, ...], ...] = tuple(
+            tuple(j for j in range(len(self.terms)) if i in self._requires[j]) for i in range(len(self.terms)))
+        self._total_weight = [0.0] * len(self.doc_types)
+        for weights in self._weights:
+            for type_idx, weight in weights:
+                self._total_weight[type_idx] += weight
+        power = [
+            sum(weight for j in (i,) + self._requires[i] + self._contained_in[i] for _, weight in self._weights[j])
+            for i in range(len(self.terms))
+        ]
+        self.evaluation_order: Tuple[int, ...] = tuple(sorted(range(len(self.terms)), key=lambda i: (-power[i], i)))
+        # Per type, its terms by how much of its score one missing lookup rules out
+        self._type_orders: Tuple[Tuple[int, ...], ...] = tuple(
+            tuple(sorted(
+                (i for i in range(len(self.terms)) if any(t == type_idx for t, _ in self._weights[i])),
+                key=lambda i: (-sum(w for j in (i,) + self._contained_in[i] for t, w in self._weights[j] if t == type_idx), i)
+            ))
+            for type_idx in range(len(self.doc_types))
+        )
+
+    def find(self, content_lower: str) -> List[bool]:
+        """Return a presence flag for each entry of ``self.terms``."""
+        found = [False] * len(self.terms)
+        for i, (term, requires, _) in enumerate(self._table):
+            for j in requires:
+                if not found[j]:
+                    break
+            else:
+                found[i] = term in content_lower
+        return found
+
+    def counts(self, content_lower: str) -> Dict[str, Tuple[int, int]]:
+        """Return (keyword_hits, pattern_hits) per document type."""
+        totals = [[0, 0] for _ in self.doc_types]
+        found = [False] * len(self.terms)
+        for i, (term, requires, hits) in enumerate(self._table):
+            for j in requires:
+                if not found[j]:
+                    break
+            else:
+                if term in content_lower:
+                    found[i] = True
+                    for type_idx, group in hits:
+                        totals[type_idx][group] += 1
+        return {doc_type: (totals[i][0], totals[i][1]) for i, doc_type in enumerate(self.doc_types)}
+
+    def score(self, content_lower: str) -> Dict[str, float]:
+        """Return the weighted score per document type for lowercased content."""
+        return {
+            doc_type: keyword_hits + (pattern_hits * PATTERN_WEIGHT)
+            for doc_type, (keyword_hits, pattern_hits) in self.counts(content_lower).items()
+        }
+
+    def score_early_exit(self, content_lower: str, first_page_lower: Optional[str] = None,
+                         confidence_bands: Sequence[float] = (),
+                         margin_bands: Sequence[float] = ()) -> Tuple[Dict[str, float], int, bool]:
+        """
+        Score only as many terms as it takes to fix the winning type.
+
+        Terms are looked up in ``evaluation_order``, strongest first. Each lookup
+        also settles related terms for free: a found term implies every shorter
+        term it contains, and a missing term rules out every longer term built
+        on it. After each lookup, each type's score is bounded by the weight
+        found so far and the weight still unresolved. Scanning stops once the
+        leader's found score exceeds every other type's upper bound, and the
+        confidence and runner-up margin can no longer cross any of the given
+        band thresholds.
+
+        Args:
+            content_lower: Lowercased document text
+            first_page_lower: Optional lowercased opening of the document. Every
+                term is first looked up in this short prefix. A hit there is a hit
+                in the whole text, so only the remaining terms scan the full document.
+            confidence_bands: Confidence thresholds the result must not straddle
+            margin_bands: Runner-up margin thresholds the result must not straddle
+
+        Returns:
+            (scores, full-text lookups, exact). The scores count only terms found
+            before stopping, so the winning type, and which side of each band it
+            falls on, match ``score``. ``exact`` is True when every term was
+            resolved and the scores equal ``score``.
+        """
+        state: List[Optional[bool]] = [None] * len(self.terms)
+        low = [0.0] * len(self.doc_types)
+        remaining = list(self._total_weight)
+        evaluated = 0
+
+        def resolve(i: int, present: bool) -> None:
+            for j in (i,) + (self._requires[i] if present else self._contained_in[i]):
+                if state[j] is None:
+                    state[j] = present
+                    for type_idx, weight in self._weights[j]:
+                        remaining[type_idx] -= weight
+                        if present:
+                            low[type_idx] += weight
+
+        if first_page_lower is not None:
+            if len(first_page_lower) == len(content_lower):
+                # The page is the whole document: one pruned pass gives the exact scores
+                scores = [0.0] * len(self.doc_types)
+                found = [False] * len(self.terms)
+                lookups = 0
+                for i, (term, requires, _) in enumerate(self._table):
+                    for j in requires:
+                        if not found[j]:
+                            break
+                    else:
+                        lookups += 1
+                        if term in content_lower:
+                            found[i] = True
+                            for type_idx, weight in self._weights[i]:
+                                scores[type_idx] += weight
+                return dict(zip(self.doc_types, scores)), lookups, True
+            for i, (term, requires, _) in enumerate(self._table):
+                if state[i] is None and all(state[j] for j in requires) and term in first_page_lower:
+                    resolve(i, True)
+
+        while True:
+            target = self._next_target(low, remaining, confidence_bands, margin_bands)
+            if target is None:
+                break
+            # Rule out the type blocking the decision first; otherwise take the strongest open term
+            order = self._type_orders[target] if target >= 0 else self.evaluation_order
+            i = next((i for i in order if state[i] is None), None)
+            if i is None:
+                i = next((i for i in self.evaluation_order if state[i] is None), None)
+                if i is None:
+                    break
+            evaluated += 1
+            resolve(i, self.terms[i] in content_lower)
+        exact = all(value is not None for value in state)
+        return dict(zip(self.doc_types, low)), evaluated, exact
+
+    def _next_target(self, low: List[float], remaining: List[float],
+                     confidence_bands: Sequence[float], margin_bands: Sequence[float]) -> Optional[int]:
+        """
+        None when the unresolved terms can no longer change the winner or its bands.
+
+        Otherwise the index of the non-leading type with the highest reachable
+        score if it can still catch the leader, or -1 when only a band is open.
+        """
+        leader = max(range(len(low)), key=low.__getitem__)
+        lead = low[leader]
+        blocking = -1
+        blocking_high = lead
+        others_low = others_high = max_low = max_high = 0.0
+        for i, (score, rest) in enumerate(zip(low, remaining)):
+            if i == leader:
+                continue
+            high = score + rest
+            if high >= blocking_high and rest > 0:
+                blocking, blocking_high = i, high
+            others_low += score
+            others_high += high
+            max_low = max(max_low, score)
+            max_high = max(max_high, high)
+        if lead == 0:
+            # Settled as 'unknown' only once nothing can score
+            return None if max_high == 0 and remaining[leader] == 0 else blocking
+        if blocking >= 0:
+            return blocking
+        lead_high = lead + remaining[leader]
+        if confidence_bands:
+            confidence_low = lead / (lead + others_high)
+            confidence_high = lead_high / (lead_high + others_low)
+            if any((confidence_low >= t) != (confidence_high >= t) for t in confidence_bands):
+                return -1
+        if margin_bands:
+            margin_low, margin_high = lead - max_high, lead_high - max_low
+            if any((margin_low >= t) != (margin_high >= t) for t in margin_bands):
+                return -1
+        return None
+
+    def stream(self) -> 'StreamingMatch':
+        """Start an incremental match for a document fed in chunks."""
+        return StreamingMatch(self)
+
+
+class StreamingMatch:
+    """
+    Presence flags for one document, updated chunk by chunk.
+
+    Each lowercased chunk is searched together with the last
+    ``max_term_length - 1`` characters of the previous one, so a term split
+    across a chunk boundary is still found. Found flags only ever turn on, so
+    the scores after the last chunk equal ``KeywordMatcher.score`` over the
+    whole text, while memory stays bounded by the chunk size. Chunks may be
+    str or, for a matcher built from byte-string terms, bytes.
+    """
+
+    def __init__(self, matcher: KeywordMatcher):
+        self.matcher = matcher
+        self.found = [False] * len(matcher.terms)
+        self.characters = 0
+        self._tail = None
+        # Weight each type can still gain from terms not yet found
+        self._remaining = [0.0] * len(matcher.doc_types)
+        self._scores = [0.0] * len(matcher.doc_types)
+        for _, _, hits in matcher._table:
+            for type_idx, group in hits:
+                self._remaining[type_idx] += PATTERN_WEIGHT if group else 1.0
+
+    def feed(self, chunk_lower: str) -> None:
+        """Search one more lowercased chunk of the document."""
+        self.characters += len(chunk_lower)
+        window = self._tail + chunk_lower if self._tail else chunk_lower
+        found = self.found
+        for i, (term, requires, hits) in enumerate(self.matcher._table):
+            if found[i]:
+                continue
+            # A term present in this window brings the shorter terms it contains, found just before it
+            for j in requires:
+                if not found[j]:
+                    break
+            else:
+                if term in window:
+                    found[i] = True
+                    for type_idx, group in hits:
+                        weight = PATTERN_WEIGHT if group else 1.0
+                        self._scores[type_idx] += weight
+                        self._remaining[type_idx] -= weight
+        keep = self.matcher.max_term_length - 1
+        self._tail = window[-keep:] if keep > 0 else None
+
+    @property
+    def complete(self) -> bool:
+        """True once every term has been found, so no further text can change the scores."""
+        return all(self.found)
+
+    def score(self) -> Dict[str, float]:
+        """Weighted score per document type over the text fed so far."""
+        return dict(zip(self.matcher.doc_types, self._scores))
+
+    def upper_bounds(self) -> Dict[str, float]:
+        """Highest score each type could still reach, whatever text follows."""
+        return {doc_type: score + remaining for doc_type, score, remaining
+                in zip(self.matcher.doc_types, self._scores, self._remaining)}
+
+    def decided(self) -> Optional[str]:
+        """
+        The winning type once no other type can catch up, else None.
+
+        The leader must be strictly ahead of every other type's upper bound,
+        so the type picked by ``max(scores)`` over the full text is the same.
+        """
+        leader = max(range(len(self._scores)), key=self._scores.__getitem__)
+        lead = self._scores[leader]
+        if lead == 0:
+            return None
+        for i, (score, remaining) in enumerate(zip(self._scores, self._remaining)):
+            if i != leader and score + remaining >= lead:
+                return None
+        return self.matcher.doc_types[leader]
+
+
+# Shared matcher compiled once at import time
+DEFAULT_MATCHER = KeywordMatcher(CLASSIFICATION_INDICATORS)
@@ -0,0 +1,158 @@
+"""
+Parser for the TD3 (passport) machine-readable zone defined by ICAO Doc 9303.
+"""
+
+import mmap
+import re
+from datetime import date
+from typing import Any, Dict, Optional, Tuple, Union
+
+
+TD3_LINE_LENGTH = 44
+
+# Two consecutive 44-character MRZ lines, the first starting with document code 'P'
+_TD3_RE = re.compile(r'^[ \t]*(P[A-Z0-9<]{43})[ \t]*\r?\n[ \t]*([A-Z0-9<]{44})[ \t]*\r?$', re.MULTILINE)
+_TD3_BYTES_RE = re.compile(_TD3_RE.pattern.encode('ascii'), re.MULTILINE)
+
+_CHECK_WEIGHTS = (7, 3, 1)
+
+
+def check_digit(value: str) -> str:
+    """Return the ICAO 9303 check digit for an MRZ field."""
+    total = 0
+    for i, char in enumerate(value):
+        if char.isdigit():
+            digit = ord(char) - 48
+        elif 'A' <= char <= 'Z':
+            digit = ord(char) - 55
+        else:  # filler '<'
+            digit = 0
+        total += digit * _CHECK_WEIGHTS[i % 3]
+    return str(total % 10)
+
+
+def _mrz_date(value: str, future: bool) -> Optional[str]:
+    """Convert YYMMDD to ISO format, picking the century relative to today."""
+    if not value.isdigit():
+        return None
+    year, month, day = int(value[:2]), int(value[2:4]), int(value[4:])
+    pivot = date.today().year % 100
+    # Expiry dates are near-future, birth dates are never in the future
+    century = 2000 if (year <= pivot + 20 if future else year <= pivot) else 1900
+    try:
+        return date(century + year, month, day).isoformat()
+    except ValueError:
+        return None
+
+
+def parse_td3(line1: str, line2: str) -> Optional[Dict[str, Any]]:
+    """
+    Parse a TD3 machine-readable zone and validate every check digit.
+
+    Args:
+        line1: First MRZ line (document code, issuing state, names)
+        line2: Second MRZ line (number, nationality, dates, sex)
+
+    Returns:
+        Dictionary of passport fields, or None if the lines are malformed or a
+        check digit does not validate
+    """
+    if len(line1) != TD3_LINE_LENGTH or len(line2) != TD3_LINE_LENGTH:
+        return None
+    number, nationality, birth, sex, expiry, personal = (
+        line2[0:9], line2[10:13], line2[13:19], line2[20], line2[21:27], line2[28:42])
+    checks = (
+        (number, line2[9]),
+        (birth, line2[19]),
+        (expiry, line2[27]),
+        (line2[0:10] + line2[13:20] + line2[21:43], line2[43]),
+    )
+    if any(check_digit(field) != digit for field, digit in checks):
+        return None
+    # An all-filler personal number may carry '<' instead of a check digit
+    if line2[42] != '<' or personal.strip('<'):
+        if check_digit(personal) != line2[42]:
+            return None
+
+    date_of_birth = _mrz_date(birth, future=False)
+    date_of_expiry = _mrz_date(expiry, future=True)
+    if date_of_birth is None or date_of_expiry is None:
+        return None
+    surname, _, given = line1[5:].partition('<<')
+    return {
+        'document_code': line1[0:2].rstrip('<'),
+        'issuing_state': line1[2:5].rstrip('<'),
+        'passport_number': number.rstrip('<'),
+        'surname': surname.replace('<', ' ').strip(),
+        'given_names': given.replace('<', ' ').strip(),
+        'nationality': nationality.rstrip('<'),
+        'date_of_birth': date_of_birth,
+        'sex': sex if sex in 'MF' else 'X',
+        'date_of_expiry': date_of_expiry,
+        'personal_number': personal.rstrip('<'),
+    }
+
+
+def _first_valid_td3(document_content: Union[str, bytes, mmap.mmap]) -> Optional[Tuple[Any, Dict[str, Any]]]:
+    """The first TD3 match whose check digits validate, with its parsed fields."""
+    if isinstance(document_content, str):
+        if '<<' not in document_content:
+            return None
+        for match in _TD3_RE.finditer(document_content):
+            parsed = parse_td3(match.group(1), match.group(2))
+            if parsed is not None:
+                return match, parsed
+        return None
+    if document_content.find(b'<<') < 0:
+        return None
+    for match in _TD3_BYTES_RE.finditer(document_content):
+        parsed = parse_td3(match.group(1).decode('ascii'), match.group(2).decode('ascii'))
+        if parsed is not None:
+            return match, parsed
+    return None
+
+
+def find_td3(document_content: Union[str, bytes, mmap.mmap]) -> Optional[Dict[str, Any]]:
+    """
+    Return the first TD3 zone in a document whose check digits validate.
+
+    The document may also be bytes or a memory map; only the MRZ lines are
+    then decoded.
+    """
+    found = _first_valid_td3(document_content)
+    return found[1] if found else None
+
+
+def find_td3_span(document_content: str) -> Optional[Tuple[int, int]]:
+    """Return the (start, end) offsets of the zone find_td3 would parse, if any."""
+    found = _first_valid_td3(document_content)
+    return found[0].span() if found else None
+
+
+def format_td3(passport_number: str, surname: str, given_names: str, nationality: str,
+               date_of_birth: str, sex: str, date_of_expiry: str,
+               issuing_state: Optional[str] = None, personal_number: str = '') -> str:
+    """
+    Build a TD3 machine-readable zone with correct check digits.
+
+    Dates are YYMMDD strings. Used to generate synthetic passports for
+    benchmarks.
+
+    Returns:
+        The two MRZ lines joined by a newline
+    """
+    def fill(value: str) -> str:
+        return re.sub(r'[^A-Z0-9]+', '<', value.upper().strip())
+
+    def field(value: str, width: int) -> str:
+        return fill(value)[:width].ljust(width, '<')
+
+    names = (fill(surname) + '<<' + fill(given_names))[:39].ljust(39, '<')
+    line1 = 'P<' + field(issuing_state or nationality, 3) + names
+    number = field(passport_number, 9)
+    personal = field(personal_number, 14)
+    personal_check = check_digit(personal) if personal_number else '<'
+    line2 = (number + check_digit(number) + field(nationality, 3) + date_of_birth + check_digit(date_of_birth)
+             + sex + date_of_expiry + check_digit(date_of_expiry) + personal + personal_check)
+    composite = line2[0:10] + line2[13:20] + line2[21:43]
+    return line1 + '\n' + line2 + check_digit(composite)
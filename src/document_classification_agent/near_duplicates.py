@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate document index over MinHash signatures with LSH banding.
+
+Documents become sets of hashed word 3-shingles over their normalized text,
+summarized by a MinHash signature of NUM_PERMUTATIONS 32-bit minima. The
+signature is cut into LSH_BANDS bands; documents that agree on every row of
+at least one band are candidates, and a candidate whose signature agrees on
+at least NEAR_DUPLICATE_THRESHOLD of all rows is a near-duplicate. The index
+lives in SQLite (one row per entry plus one bucket row per band), so it
+persists across processes and scales to millions of entries on disk.
+
+On a hit, the earlier document's classification is reused and only the
+fields whose labelled lines changed are extracted again (``reuse_result``).
+
+Requires numpy (optional for the rest of the package).
+
+Print index statistics from the ``src`` directory:
+    python -m document_classification_agent.near_duplicates index.db
+"""
+
+import argparse
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .document_store import as_extraction, content_ref
+from .field_extractor import FIELD_EXTRACTORS, extract_fields
+from .mrz import find_td3
+from .result_cache import agent_fingerprint, normalize_content
+
+
+NUM_PERMUTATIONS = 128
+# 16 bands of 8 rows: pairs above ~0.7 similarity usually share a band, pairs below ~0.5 rarely do
+LSH_BANDS = 16
+SHINGLE_WORDS = 3
+# Minimum share of agreeing signature rows (estimated Jaccard similarity) for a near-duplicate
+NEAR_DUPLICATE_THRESHOLD = 0.8
+# Candidates verified per lookup, most shared bands first
+MAX_CANDIDATES = 8
+MINHASH_SEED = 20240601
+INDEX_FORMAT_VERSION = 2
+# Shingles hashed per MinHash block, bounding the temporary array to NUM_PERMUTATIONS x this
+_MINHASH_BLOCK = 4096
+
+_rng = np.random.default_rng(MINHASH_SEED)
+# Multiply-shift hash family: h(x) = (a * x + b) mod 2**64 >> 32, with odd a
+_PERM_A = _rng.integers(1, 2 ** 63, NUM_PERMUTATIONS, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_PERM_B = _rng.integers(0, 2 ** 63, NUM_PERMUTATIONS, dtype=np.uint64)
+_SHINGLE_MIX = _rng.integers(1, 2 ** 63, SHINGLE_WORDS, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_BAND_MIX = _rng.integers(1, 2 ** 63, NUM_PERMUTATIONS // LSH_BANDS + 1, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_SHIFT = np.uint64(32)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    content_hash TEXT,
+    signature BLOB NOT NULL,
+    line_hashes BLOB NOT NULL,
+    field_lines TEXT NOT NULL,
+    classification TEXT NOT NULL,
+    extraction TEXT,
+    stored_at REAL NOT NULL,
+    UNIQUE (fingerprint, content_hash)
+);
+CREATE TABLE IF NOT EXISTS buckets (key INTEGER NOT NULL, entry INTEGER NOT NULL, PRIMARY KEY (key, entry)) WITHOUT ROWID;
+"""
+
+@functools.lru_cache(maxsize=1 << 16)
+def _word_hash(word: str) -> int:
+    return zlib.crc32(word.encode('utf-8'))
+
+
+def _line_hash(line: str) -> int:
+    return zlib.crc32(normalize_content(line).encode('utf-8'))
+
+
+def shingle_hashes(document_content: str) -> np.ndarray:
+    """Distinct 32-bit hashes of the document's word SHINGLE_WORDS-grams, after normalize_content."""
+    words = np.array([_word_hash(word) for word in normalize_content(document_content).split(' ') if word],
+                     dtype=np.uint64)
+    if len(words) < SHINGLE_WORDS:
+        return np.unique(words)
+    combined = np.zeros(len(words) - SHINGLE_WORDS + 1, dtype=np.uint64)
+    for offset in range(SHINGLE_WORDS):
+        combined += words[offset:offset + len(combined)] * _SHINGLE_MIX[offset]
+    return np.unique((combined ^ (combined >> _SHIFT)) & np.uint64(0xFFFFFFFF))
+
+
+def minhash_signature(document_content: str) -> np.ndarray:
+    """MinHash signature of a document: NUM_PERMUTATIONS uint32 minima over its shingle hashes."""
+    shingles = shingle_hashes(document_content)
+    signature = np.full(NUM_PERMUTATIONS, 0xFFFFFFFF, dtype=np.uint64)
+    for start in range(0, len(shingles), _MINHASH_BLOCK):
+        block = shingles[start:start + _MINHASH_BLOCK]
+        hashed = (_PERM_A[:, None] * block[None, :] + _PERM_B[:, None]) >> _SHIFT
+        np.minimum(signature, hashed.min(axis=1), out=signature)
+    return signature.astype(np.uint32)
+
+
+def band_keys(signature: np.ndarray) -> List[int]:
+    """One signed 64-bit bucket key per LSH band (band index mixed in, so bands never collide)."""
+    rows = signature.astype(np.uint64).reshape(LSH_BANDS, -1)
+    keys = (rows * _BAND_MIX[:-1]).sum(axis=1) + np.arange(LSH_BANDS, dtype=np.uint64) * _BAND_MIX[-1]
+    return keys.view(np.int64).tolist()
+
+
+def similarity(signature: np.ndarray, other: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two documents: the share of agreeing signature rows."""
+    return float(np.count_nonzero(signature == other)) / len(signature)
+
+
+def content_hash(document_content: str) -> str:
+    """Key of a document's exact (normalized) text; one entry is kept per key and fingerprint."""
+    return hashlib.sha256(normalize_content(document_content).encode('utf-8')).hexdigest()
+
+
+def field_line_hashes(document_type: str, document_content: str) -> Dict[str, int]:
+    """Hash of the labelled line each locally extracted field was read from."""
+    extractor = FIELD_EXTRACTORS.get(document_type)
+    if extractor is None:
+        return {}
+    return {field: _line_hash(line) for field, line in extractor.labelled_lines(document_content).items()}
+
+
+def reuse_result(match: Dict[str, Any], document_content: str) -> Dict[str, Any]:
+    """
+    Build a near-duplicate's result from the matched entry, re-extracting only what changed.
+
+    A field keeps its earlier value while the labelled line it was read from
+    is still in the document. Lines that are new are scanned for labels, and
+    any field found there takes the new value. A passport whose changed
+    lines touch the MRZ has the MRZ read again. A field with no labelled
+    line behind it (one the model filled in from unlabelled text) is only
+    known to hold for the earlier document, so it is dropped and reported
+    unresolved, and the document runs through the agents.
+
+    Args:
+        match: Entry returned by NearDuplicateIndex.lookup
+        document_content: Text of the new document
+
+    Returns:
+        Dictionary with the reused 'classification', the updated
+        'extraction' (None for types without extraction), the fields whose
+        value changed, and 'unresolved' fields that could not be read
+        locally: their line changed, or no labelled line supported them
+    """
+    classification = dict(match['classification'], classification_method='near_duplicate',
+                          near_duplicate={'entry': match['entry'], 'similarity': match['similarity']})
+    document_type = classification.get('document_type')
+    prior = as_extraction(match['extraction'])
+    extractor = FIELD_EXTRACTORS.get(document_type)
+    if extractor is None:
+        return {'classification': classification, 'extraction': None, 'reextracted': [], 'unresolved': []}
+    if prior is None:  # the earlier extraction was free text that cannot be updated field by field
+        return {'classification': classification, 'extraction': None, 'reextracted': [], 'unresolved': ['extraction']}
+
+    lines = [(line, _line_hash(line)) for line in document_content.splitlines() if line.strip()]
+    current = {line_hash for _, line_hash in lines}
+    changed = '\n'.join(line for line, line_hash in lines if line_hash not in match['line_hashes'])
+    found = extractor.scan(changed) if changed else {}
+
+    extracted = dict(prior['extracted_fields'])
+    field_confidence = dict(prior.get('field_confidence') or {})
+    prior_mrz = prior.get('mrz') or {}
+    unresolved = []
+    for field in list(extracted):
+        if field in found:
+            continue
+        line_hash = match['field_lines'].get(field)
+        if line_hash is None and prior_mrz.get(field):
+            continue  # read from the MRZ, which is checked below
+        if line_hash is None or line_hash not in current:  # no line it was read from is in this document
+            extracted.pop(field)
+            field_confidence.pop(field, None)
+            unresolved.append(field)
+    for field, (value, confidence) in found.items():
+        extracted[field] = value
+        field_confidence[field] = confidence
+    extraction = dict(prior, extracted_fields=extracted, field_confidence=field_confidence,
+                      extraction_method='near_duplicate')
+    if prior_mrz and ('<' in changed or any(prior_mrz.get(field) for field in found)):
+        # Merge the MRZ with the labels again, as extract_fields does, so the verified MRZ still wins
+        local = extract_fields(document_type, document_content)
+        if not local.get('mrz_verified'):
+            unresolved.append('mrz')
+        else:
+            for field in extractor.expected_fields:
+                if local['mrz'].get(field):
+                    extracted[field] = local['extracted_fields'][field]
+                    field_confidence[field] = local['field_confidence'][field]
+            extraction.update(mrz=local['mrz'], mrz_conflicts=local['mrz_conflicts'])
+    extraction['missing_fields'] = [field for field in extractor.expected_fields if field not in extracted]
+    if 'document_ref' in extraction:
+        extraction.update(document_ref=content_ref(document_content), document_length=len(document_content))
+    reextracted = [field for field, value in extracted.items() if prior['extracted_fields'].get(field) != value]
+    return {'classification': classification, 'extraction': extraction,
+            'reextracted': sorted(reextracted), 'unresolved': unresolved}
+
+
+class NearDuplicateIndex:
+    """
+    Persistent MinHash/LSH index of processed documents and their results.
+
+    Each entry stores the signature (NUM_PERMUTATIONS * 4 bytes), the hashes
+    of the document's lines and of the line each field came from, the
+    classification and extraction, and the fingerprint of the agents that
+    produced them (as in ResultCache, so a prompt or model change retires old
+    entries). Entries are unique per fingerprint and normalized content, so
+    indexing a document again replaces its entry instead of adding one.
+    Buckets are a WITHOUT ROWID table keyed by band hash, so a lookup is one
+    indexed IN query over LSH_BANDS keys plus a read of at most
+    MAX_CANDIDATES signatures.
+
+    Args:
+        path: SQLite file (':memory:' for a private in-process index)
+        agents: Callable returning the agents whose fingerprint results are
+            tied to; None stores and matches every entry
+        threshold: Minimum estimated similarity of a near-duplicate
+    """
+
+    def __init__(self, path: str, agents: Optional[Callable[[], Iterable[Any]]] = None,
+                 threshold: float = NEAR_DUPLICATE_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self._agents = agents
+        self.lookups = 0
+        self.hits = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+        layout = json.dumps([INDEX_FORMAT_VERSION, NUM_PERMUTATIONS, LSH_BANDS, SHINGLE_WORDS, MINHASH_SEED])
+        stored = self._conn.execute("SELECT value FROM meta WHERE key = 'layout'").fetchone()
+        if stored is None:
+            self._conn.execute("INSERT INTO meta VALUES ('layout', ?)", (layout,))
+        elif stored[0] != layout:
+            raise ValueError(f"{path} was built with a different signature layout ({stored[0]})")
+
+    def fingerprint(self) -> str:
+        return agent_fingerprint(self._agents())[:16] if self._agents is not None else ''
+
+    def add(self, document_content: str, classification: Dict[str, Any], extraction: Any = None) -> int:
+        """
+        Index a processed document with its results, replacing any entry for the same text.
+
+        Args:
+            document_content: Document text
+            classification: Classification result, with 'document_type'
+            extraction: Extraction result (a dict, or the agent's JSON reply), or None
+
+        Returns:
+            The entry id, the same one on every add of the same text
+        """
+        document_type = classification.get('document_type')
+        lines = sorted({_line_hash(line) for line in document_content.splitlines() if line.strip()})
+        return self.add_signature(minhash_signature(document_content), classification, as_extraction(extraction),
+                                  np.array(lines, dtype=np.uint32), field_line_hashes(document_type, document_content),
+                                  content_hash(document_content))
+
+    def add_signature(self, signature: np.ndarray, classification: Dict[str, Any],
+                      extraction: Optional[Dict[str, Any]] = None, line_hashes: Optional[np.ndarray] = None,
+                      field_lines: Optional[Dict[str, int]] = None, content_key: Optional[str] = None) -> int:
+        """Index a precomputed signature; see ``add``. Without a content_key the entry is always new."""
+        return self.add_signatures([(signature, classification, extraction, line_hashes, field_lines, content_key)])[0]
+
+    def add_signatures(self, items: Iterable[tuple]) -> List[int]:
+        """
+        Index many precomputed signatures in one transaction, e.g. for a bulk load.
+
+        Args:
+            items: (signature, classification, extraction, line_hashes,
+                field_lines, content_key) tuples, as taken by ``add_signature``
+
+        Returns:
+            The entry ids, in input order
+        """
+        fingerprint = self.fingerprint()
+        entries = []
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                for signature, classification, extraction, line_hashes, field_lines, content_key in items:
+                    lines = b'' if line_hashes is None else line_hashes.astype(np.uint32).tobytes()
+                    stored = None if content_key is None else self._conn.execute(
+                        'SELECT id, signature FROM entries WHERE fingerprint = ? AND content_hash = ?',
+                        (fingerprint, content_key)).fetchone()
+                    # NULL keys never conflict; a repeated key keeps its id and takes the newer results
+                    entry, = self._conn.execute(
+                        'INSERT INTO entries (fingerprint, content_hash, signature, line_hashes, field_lines, '
+                        'classification, extraction, stored_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?) '
+                        'ON CONFLICT (fingerprint, content_hash) DO UPDATE SET signature = excluded.signature, '
+                        'line_hashes = excluded.line_hashes, field_lines = excluded.field_lines, '
+                        'classification = excluded.classification, extraction = excluded.extraction, '
+                        'stored_at = excluded.stored_at RETURNING id',
+                        (fingerprint, content_key, signature.astype(np.uint32).tobytes(), lines,
+                         json.dumps(field_lines or {}), json.dumps(classification),
+                         json.dumps(extraction) if extraction is not None else None, time.time())).fetchone()
+                    if stored is not None:  # the buckets of a replaced signature would name this entry
+                        self._conn.executemany('DELETE FROM buckets WHERE key = ? AND entry = ?',
+                                               [(key, entry) for key in band_keys(np.frombuffer(stored[1], np.uint32))])
+                    self._conn.executemany('INSERT OR IGNORE INTO buckets VALUES (?, ?)',
+                                           [(key, entry) for key in band_keys(signature)])
+                    entries.append(entry)
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+        return entries
+
+    def lookup(self, document_content: str, signature: Optional[np.ndarray] = None) -> Optional[Dict[str, Any]]:
+        """
+        Find the most similar indexed document at or above the threshold.
+
+        Returns:
+            The matched entry (entry id, similarity, classification,
+            extraction, line hashes as a set, field line hashes), or None
+        """
+        if signature is None:
+            signature = minhash_signature(document_content)
+        keys = band_keys(signature)
+        fingerprint = self.fingerprint()
+        with self._lock:
+            self.lookups += 1
+            # Entries of other fingerprints are skipped before the limit, so retired ones never crowd out a match.
+            # CROSS JOIN keeps buckets as the outer loop; otherwise the (fingerprint, content_hash) index tempts
+            # the planner into scanning every entry of the fingerprint
+            candidates = self._conn.execute(
+                f"SELECT e.id, e.signature FROM entries e JOIN (SELECT b.entry, COUNT(*) AS shared FROM buckets b "
+                f"CROSS JOIN entries f ON f.id = b.entry WHERE b.key IN ({','.join('?' * len(keys))}) AND f.fingerprint = ? "
+                f"GROUP BY b.entry ORDER BY shared DESC LIMIT ?) c ON e.id = c.entry",
+                (*keys, fingerprint, MAX_CANDIDATES)).fetchall()
+            best, best_similarity = None, self.threshold
+            for entry, stored in candidates:
+                score = similarity(signature, np.frombuffer(stored, dtype=np.uint32))
+                if score >= best_similarity:
+                    best, best_similarity = entry, score
+            if best is None:
+                return None
+            line_hashes, field_lines, classification, extraction = self._conn.execute(
+                'SELECT line_hashes, field_lines, classification, extraction FROM entries WHERE id = ?',
+                (best,)).fetchone()
+            self.hits += 1
+        return {
+            'entry': best,
+            'similarity': best_similarity,
+            'classification': json.loads(classification),
+            'extraction': json.loads(extraction) if extraction else None,
+            'line_hashes': set(np.frombuffer(line_hashes, dtype=np.uint32).tolist()),
+            'field_lines': json.loads(field_lines),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        size = sum(os.path.getsize(path) for path in (self.path, self.path + '-wal') if os.path.exists(path)) or None
+        return {'entries': entries, 'lookups': self.lookups, 'hits': self.hits, 'file_bytes': size,
+                'bytes_per_entry': size / entries if size and entries else None}
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+
+def main():
+    """Print the size of a near-duplicate index."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('path', help='index database')
+    args = parser.parse_args()
+    index = NearDuplicateIndex(args.path)
+    for key, value in index.stats().items():
+        print(f"{key}: {value}")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
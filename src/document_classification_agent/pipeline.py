@@ -0,0 +1,267 @@
+"""
+Asyncio driver that runs many documents through root_agent concurrently.
+"""
+
+import asyncio
+import random
+import time
+from contextlib import contextmanager
+from typing import Any, AsyncGenerator, AsyncIterable, Dict, Iterable, Iterator, List, Optional, Union
+
+from google.adk.agents import BaseAgent, LlmAgent
+from google.adk.apps import App
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.adk.plugins import BasePlugin
+from google.adk.runners import Runner
+from google.adk.sessions import BaseSessionService, InMemorySessionService
+from google.adk.sessions.base_session_service import GetSessionConfig
+from google.genai import errors, types
+from pydantic import PrivateAttr
+
+from .result_cache import walk_agents
+from .routing import CLASSIFICATION_STATE_KEY, EXTRACTION_STATE_KEY
+from .session_pool import SESSION_MAX_DOCUMENTS, SessionPool
+
+
+_DONE = object()
+
+# Model-call retries: attempts per call and the exponential backoff between them, in seconds
+MODEL_RETRY_ATTEMPTS = 4
+MODEL_RETRY_BASE_DELAY = 0.5
+MODEL_RETRY_MAX_DELAY = 20.0
+# HTTP status codes of model errors worth retrying; other 4xx errors would fail again
+RETRYABLE_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+class ConcurrencyLimitedLlm(BaseLlm):
+    """Wraps a model so at most ``semaphore``'s worth of requests are in flight at once."""
+
+    inner: BaseLlm
+    _semaphore: asyncio.Semaphore = PrivateAttr()
+
+    def __init__(self, inner: BaseLlm, semaphore: asyncio.Semaphore):
+        super().__init__(model=inner.model, inner=inner)
+        self._semaphore = semaphore
+
+    async def generate_content_async(self, llm_request: LlmRequest,
+                                     stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        async with self._semaphore:
+            async for response in self.inner.generate_content_async(llm_request, stream):
+                yield response
+
+
+def is_retryable_model_error(error: BaseException) -> bool:
+    """Whether a failed model call may succeed if sent again (rate limits, server and network errors)."""
+    if isinstance(error, errors.APIError):
+        return error.code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (ConnectionError, TimeoutError, asyncio.TimeoutError))
+
+
+class RetryingLlm(BaseLlm):
+    """
+    Wraps a model so retryable failures are sent again with exponential backoff.
+
+    A call is only retried if it failed before yielding anything; once a
+    response has reached the agent the error is passed on. Each delay is drawn
+    uniformly up to ``base_delay * 2**attempt`` (capped at ``max_delay``) so
+    callers that failed together do not retry together.
+    """
+
+    inner: BaseLlm
+    max_attempts: int = MODEL_RETRY_ATTEMPTS
+    base_delay: float = MODEL_RETRY_BASE_DELAY
+    max_delay: float = MODEL_RETRY_MAX_DELAY
+    retries: int = 0
+    _random: random.Random = PrivateAttr(default_factory=random.Random)
+
+    def __init__(self, inner: BaseLlm, **settings: Any):
+        super().__init__(model=inner.model, inner=inner, **settings)
+
+    async def generate_content_async(self, llm_request: LlmRequest,
+                                     stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        attempt = 0
+        while True:
+            yielded = False
+            try:
+                async for response in self.inner.generate_content_async(llm_request, stream):
+                    yielded = True
+                    yield response
+                return
+            except Exception as e:
+                attempt += 1
+                if yielded or attempt >= self.max_attempts or not is_retryable_model_error(e):
+                    raise
+            self.retries += 1
+            await asyncio.sleep(self._random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1))))
+
+
+@contextmanager
+def retry_model_calls(root_agent: BaseAgent, **settings: Any) -> Iterator[List[RetryingLlm]]:
+    """
+    Temporarily wrap every LLM agent's model in the tree with RetryingLlm.
+
+    Args:
+        root_agent: Root of the agent tree
+        **settings: RetryingLlm fields (max_attempts, base_delay, max_delay)
+
+    Yields:
+        The installed wrappers, whose ``retries`` count the calls sent again
+    """
+    agents = [a for a in walk_agents(root_agent) if isinstance(a, LlmAgent)]
+    saved = [a.model for a in agents]
+    wrappers = []
+    for a in agents:
+        wrappers.append(RetryingLlm(a.canonical_model, **settings))
+        a.model = wrappers[-1]
+    try:
+        yield wrappers
+    finally:
+        for a, model in zip(agents, saved):
+            a.model = model
+
+
+@contextmanager
+def limit_model_concurrency(root_agent: BaseAgent, semaphore: asyncio.Semaphore) -> Iterator[None]:
+    """Temporarily route every LLM agent in the tree through a shared semaphore."""
+    agents = [a for a in walk_agents(root_agent) if isinstance(a, LlmAgent)]
+    saved = [a.model for a in agents]
+    for a in agents:
+        a.model = ConcurrencyLimitedLlm(a.canonical_model, semaphore)
+    try:
+        yield
+    finally:
+        for a, model in zip(agents, saved):
+            a.model = model
+
+
+class DocumentPipeline:
+    """
+    Concurrent document pipeline around an agent tree.
+
+    Documents flow through two bounded queues: an intake queue that the
+    producer blocks on when workers fall behind, and a results queue that
+    workers block on when the consumer falls behind. Up to
+    ``max_concurrent_documents`` workers each run one document at a time
+    through the ADK runner (classification and extraction happen inside that
+    run, via the agent tree). Model requests across all workers are capped at
+    ``max_in_flight_model_calls``, so local work such as keyword routing and
+    tool calls keeps going while the model is saturated.
+
+    Results are yielded as they finish, not in input order; each carries the
+    document's input ``index``.
+
+    By default every document runs in a fresh session. With
+    ``reuse_sessions=True`` sessions come from a SessionPool instead: each
+    worker keeps a warm session that is rewound after every document, so
+    per-document context stays that of a fresh session, and it is replaced
+    after ``max_documents_per_session`` documents.
+
+    The semaphore is installed by swapping each agent's model for the duration
+    of a run, so two pipelines must not run over the same agent tree at once.
+    """
+
+    def __init__(self, root_agent: BaseAgent, max_concurrent_documents: int = 8,
+                 max_in_flight_model_calls: int = 4, queue_size: int = 32,
+                 session_service: Optional[BaseSessionService] = None,
+                 app_name: str = 'document_pipeline', user_id: str = 'pipeline',
+                 plugins: Optional[List[BasePlugin]] = None, reuse_sessions: bool = False,
+                 max_documents_per_session: int = SESSION_MAX_DOCUMENTS):
+        self.root_agent = root_agent
+        self.max_concurrent_documents = max_concurrent_documents
+        self.max_in_flight_model_calls = max_in_flight_model_calls
+        self.queue_size = queue_size
+        self.session_service = session_service or InMemorySessionService()
+        self.app_name = app_name
+        self.user_id = user_id
+        # Plugins such as tracing.StageTracer see every agent, model and tool call of every document
+        self.runner = Runner(app=App(name=app_name, root_agent=root_agent, plugins=plugins or []),
+                             session_service=self.session_service)
+        self.sessions = SessionPool(self.runner, user_id, max_documents_per_session if reuse_sessions else 1)
+
+    async def process(self, index: int, document_content: str) -> Dict[str, Any]:
+        """Run one document in a session from the pool and collect its results."""
+        start = time.perf_counter()
+        session_id = await self.sessions.acquire()
+        message = types.Content(role='user', parts=[types.Part(text=document_content)])
+        response_text = ''
+        classification = extraction = error = invocation_id = None
+        try:
+            async for event in self.runner.run_async(user_id=self.user_id, session_id=session_id, new_message=message,
+                                                     run_config=self.sessions.run_config(session_id)):
+                invocation_id = invocation_id or event.invocation_id
+                if event.content and event.content.parts and not event.partial:
+                    text = ''.join(part.text for part in event.content.parts if part.text)
+                    if text:
+                        response_text = text
+            session = await self.session_service.get_session(
+                app_name=self.app_name, user_id=self.user_id, session_id=session_id,
+                config=GetSessionConfig(num_recent_events=0))
+            classification = session.state.get(CLASSIFICATION_STATE_KEY)
+            extraction = session.state.get(EXTRACTION_STATE_KEY)
+        except Exception as e:  # one bad document must not stop the stream
+            error = f'{type(e).__name__}: {e}'
+        finally:
+            await self.sessions.release(session_id, invocation_id)
+        return {
+            'index': index,
+            'classification': classification,
+            'extraction': extraction,
+            'response': response_text,
+            'latency': time.perf_counter() - start,
+            'error': error,
+        }
+
+    async def run(self, documents: Union[Iterable[str], AsyncIterable[str]]) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Process documents concurrently, yielding each result as it completes.
+
+        Args:
+            documents: Sync or async iterable of document text contents
+
+        Yields:
+            Result dictionaries with index, classification, extraction,
+            final response text, latency and error (None on success)
+        """
+        intake: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        results: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        workers = self.max_concurrent_documents
+
+        async def produce():
+            index = 0
+            try:
+                if isinstance(documents, AsyncIterable):
+                    async for document in documents:
+                        await intake.put((index, document))
+                        index += 1
+                else:
+                    for document in documents:
+                        await intake.put((index, document))
+                        index += 1
+            finally:
+                # Always release the workers; gather() below re-raises a producer error
+                for _ in range(workers):
+                    await intake.put(_DONE)
+
+        async def work():
+            while True:
+                item = await intake.get()
+                if item is _DONE:
+                    await results.put(_DONE)
+                    return
+                await results.put(await self.process(*item))
+
+        with limit_model_concurrency(self.root_agent, asyncio.Semaphore(self.max_in_flight_model_calls)):
+            tasks = [asyncio.create_task(produce())] + [asyncio.create_task(work()) for _ in range(workers)]
+            try:
+                finished = 0
+                while finished < workers:
+                    result = await results.get()
+                    if result is _DONE:
+                        finished += 1
+                    else:
+                        yield result
+                await asyncio.gather(*tasks)
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await self.sessions.close()
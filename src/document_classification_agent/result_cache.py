@@ -0,0 +1,191 @@
+"""
+Content-addressed cache for classification and extraction results.
+"""
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Iterable, Optional, Tuple
+
+
+# Bump when the shape of cached results changes
+CACHE_FORMAT_VERSION = 1
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_content(document_content: str) -> str:
+    """Collapse whitespace and case so trivially different resubmissions share a key."""
+    return _WHITESPACE_RE.sub(' ', document_content).strip().lower()
+
+
+def agent_fingerprint(agents: Iterable[Any]) -> str:
+    """
+    Hash the name, model and instruction of each agent.
+
+    Any change to an agent's prompt or model yields a new fingerprint, so
+    results cached under the old one are never returned again.
+    """
+    digest = hashlib.sha256(str(CACHE_FORMAT_VERSION).encode())
+    for agent in agents:
+        model = getattr(agent, 'model', '')
+        model = getattr(model, 'model', model)  # BaseLlm instances carry the name in .model
+        instruction = getattr(agent, 'instruction', '')
+        for part in (agent.name, str(model), instruction if isinstance(instruction, str) else repr(instruction)):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def walk_agents(root_agent: Any) -> Iterable[Any]:
+    """Yield an agent and all of its sub-agents, depth first."""
+    yield root_agent
+    for sub_agent in getattr(root_agent, 'sub_agents', None) or []:
+        yield from walk_agents(sub_agent)
+
+
+class InMemoryLRUBackend:
+    """Thread-safe LRU store with optional size and TTL limits."""
+
+    def __init__(self, max_entries: int = 10000, ttl: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evictions = 0
+        self._clock = clock
+        self._entries: 'OrderedDict[str, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if self.ttl is not None and self._clock() - stored_at > self.ttl:
+                del self._entries[key]
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (self._clock(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """
+    On-disk store in a single SQLite table, shared across processes.
+
+    Values are stored as JSON. Entries past the TTL are dropped on read, and
+    the least recently used rows are trimmed once ``max_entries`` is exceeded.
+    """
+
+    def __init__(self, path: str, max_entries: Optional[int] = None, ttl: Optional[float] = None,
+                 clock: Callable[[], float] = time.time):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evictions = 0
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS results '
+                           '(key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL, used_at REAL NOT NULL)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS results_used_at ON results (used_at)')
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute('SELECT value, stored_at FROM results WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            now = self._clock()
+            if self.ttl is not None and now - row[1] > self.ttl:
+                self._conn.execute('DELETE FROM results WHERE key = ?', (key,))
+                self.evictions += 1
+                return None
+            self._conn.execute('UPDATE results SET used_at = ? WHERE key = ?', (now, key))
+            return json.loads(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            now = self._clock()
+            self._conn.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)', (key, json.dumps(value), now, now))
+            if self.max_entries is not None:
+                excess = self._conn.execute('SELECT COUNT(*) FROM results').fetchone()[0] - self.max_entries
+                if excess > 0:
+                    self._conn.execute('DELETE FROM results WHERE key IN '
+                                       '(SELECT key FROM results ORDER BY used_at LIMIT ?)', (excess,))
+                    self.evictions += excess
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute('DELETE FROM results')
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+
+class ResultCache:
+    """
+    Classification and extraction results keyed by normalized content and agent version.
+
+    Keys combine a result kind ('classification' or 'extraction'), the
+    fingerprint of the agents that produce it, and a hash of the normalized
+    document text. The fingerprint is recomputed on every lookup, so editing an
+    agent's instruction or model invalidates its cached results immediately.
+
+    ``agents`` gives the agents to fingerprint by default. A cache shared by
+    several agent trees should be passed the calling tree's agents on each
+    lookup and store instead, so one tree's results are never served to another.
+    """
+
+    def __init__(self, backend: Any, agents: Callable[[], Iterable[Any]]):
+        self.backend = backend
+        self._agents = agents
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def evictions(self) -> int:
+        return self.backend.evictions
+
+    def key(self, kind: str, document_content: str, agents: Optional[Iterable[Any]] = None) -> str:
+        content_hash = hashlib.sha256(normalize_content(document_content).encode('utf-8')).hexdigest()
+        fingerprint = agent_fingerprint(self._agents() if agents is None else agents)
+        return f'{kind}:{fingerprint[:16]}:{content_hash}'
+
+    def get(self, kind: str, document_content: str, agents: Optional[Iterable[Any]] = None) -> Optional[Any]:
+        value = self.backend.get(self.key(kind, document_content, agents))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, kind: str, document_content: str, value: Any, agents: Optional[Iterable[Any]] = None) -> None:
+        self.backend.set(self.key(kind, document_content, agents), value)
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'entries': len(self.backend)}
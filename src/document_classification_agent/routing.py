@@ -0,0 +1,477 @@
+"""
+Callbacks that route documents around LLM calls when local logic is decisive.
+"""
+
+import asyncio
+import contextvars
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.plugins.plugin_manager import PluginManager
+from google.adk.models import LlmRequest, LlmResponse
+from google.genai import types
+
+from .classification import classify_text
+from .document_store import CLASSIFICATION_STATE_KEY, EXTRACTION_REPLY_STATE_KEY, EXTRACTION_STATE_KEY, as_extraction
+from .field_extractor import extract_fields
+from .result_cache import ResultCache, walk_agents
+
+
+# Minimum share of the total keyword score held by the winning type
+FAST_PATH_MIN_CONFIDENCE = 0.85
+# Minimum score lead of the winning type over the runner-up
+FAST_PATH_MIN_MARGIN = 4.0
+# Invocation ids the fast path remembers having decided, so later model calls of one are left alone
+FAST_PATH_INVOCATIONS_KEPT = 1024
+# Which local shortcut answered in place of an agent: 'result_cache' or 'local_extraction'
+RESULT_SOURCE_STATE_KEY = 'result_source'
+# Set in the copied session state of a speculative extraction run
+SPECULATIVE_STATE_KEY = 'temp:speculative_extraction'
+# Wasted speculative model calls allowed per document, averaged over all documents seen
+SPECULATION_MAX_WASTED_CALLS_PER_DOCUMENT = 1.0
+# Seconds after which a speculation whose run never reached an extractor is cancelled and dropped
+SPECULATION_TTL = 300.0
+
+
+def decisive_document_type(classification: Dict[str, Any],
+                           min_confidence: float = FAST_PATH_MIN_CONFIDENCE,
+                           min_margin: float = FAST_PATH_MIN_MARGIN) -> Optional[str]:
+    """
+    Return the classified type when the keyword scores clear both thresholds.
+
+    Args:
+        classification: Result of the local keyword classifier
+        min_confidence: Minimum confidence of the winning type
+        min_margin: Minimum score lead over the runner-up type
+
+    Returns:
+        The decisive document type, or None when the LLM should decide
+    """
+    if classification['document_type'] == 'unknown':
+        return None
+    top, runner_up = sorted(classification['scores'].values(), reverse=True)[:2]
+    if classification['confidence'] < min_confidence or top - runner_up < min_margin:
+        return None
+    return classification['document_type']
+
+
+class KeywordFastPathRouter:
+    """
+    before_model_callback for the root agent that routes decisive documents directly.
+
+    On the root agent's first model call of an invocation, the local keyword
+    classifier scores the invocation's user message. Later calls of the same
+    invocation, e.g. after another agent hands back with its transcript
+    rewritten as user-role context, are left to the model and not counted.
+
+    If the result clears the confidence and margin thresholds, the callback
+    answers in place of the model with a transfer_to_agent call to the
+    matching extraction specialist, skipping both the root routing turn and
+    the classification specialist. Ambiguous documents fall through to the
+    normal LLM flow.
+    """
+
+    def __init__(self, extraction_agents: Mapping[str, str],
+                 min_confidence: float = FAST_PATH_MIN_CONFIDENCE,
+                 min_margin: float = FAST_PATH_MIN_MARGIN,
+                 enabled: bool = True):
+        self.extraction_agents = dict(extraction_agents)
+        self.min_confidence = min_confidence
+        self.min_margin = min_margin
+        self.enabled = enabled
+        self.fast_path_count = 0
+        self.llm_path_count = 0
+        self._invocations: 'OrderedDict[str, None]' = OrderedDict()
+
+    def __call__(self, callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+        if not self.enabled or callback_context.invocation_id in self._invocations:
+            return None
+        self._invocations[callback_context.invocation_id] = None
+        if len(self._invocations) > FAST_PATH_INVOCATIONS_KEPT:
+            self._invocations.popitem(last=False)
+        document_content = _user_text(callback_context.user_content)
+        if not document_content:
+            return None
+
+        classification = classify_text(document_content)
+        document_type = decisive_document_type(classification, self.min_confidence, self.min_margin)
+        target = self.extraction_agents.get(document_type) if document_type else None
+        if target is None:
+            self.llm_path_count += 1
+            return None
+
+        self.fast_path_count += 1
+        callback_context.state[CLASSIFICATION_STATE_KEY] = dict(classification, classification_method='keyword_fast_path')
+        return LlmResponse(content=types.Content(role='model', parts=[
+            types.Part(function_call=types.FunctionCall(name='transfer_to_agent', args={'agent_name': target}))
+        ]))
+
+
+def _agent_tree(callback_context: CallbackContext) -> List[Any]:
+    """Every agent of the tree the calling agent belongs to, so callbacks shared by two trees keep them apart."""
+    return list(walk_agents(callback_context._invocation_context.agent.root_agent))
+
+
+def _user_text(content: Optional[types.Content]) -> str:
+    """Concatenated text parts of a user message."""
+    if content is None:
+        return ''
+    return ''.join(part.text for part in content.parts or [] if part.text)
+
+
+class LocalExtractionCallback:
+    """
+    before_agent_callback for an extraction specialist that skips it for well-formed documents.
+
+    The local extractors run over the user's document first. When every
+    expected field is filled, or a passport's MRZ check digits validate, the
+    result is returned as the agent's reply and the specialist's model is
+    never called. Otherwise the specialist runs as
+    usual, and its tool reports which fields are still missing.
+    """
+
+    def __init__(self, document_type: str, enabled: bool = True,
+                 on_result: Optional[Callable[[CallbackContext], None]] = None):
+        self.document_type = document_type
+        self.enabled = enabled
+        # Replying from before_agent skips after_agent callbacks, so they can be chained here
+        self.on_result = on_result
+        self.local_count = 0
+        self.llm_count = 0
+
+    def __call__(self, callback_context: CallbackContext) -> Optional[types.Content]:
+        if not self.enabled:
+            return None
+        document_content = _user_text(callback_context.user_content)
+        extraction = extract_fields(self.document_type, document_content) if document_content else None
+        if extraction is None or (extraction['missing_fields'] and not extraction.get('mrz_verified')):
+            self.llm_count += 1
+            return None
+
+        self.local_count += 1
+        callback_context.state[EXTRACTION_STATE_KEY] = extraction
+        callback_context.state[RESULT_SOURCE_STATE_KEY] = 'local_extraction'
+        if self.on_result is not None:
+            self.on_result(callback_context)
+        return types.Content(role='model', parts=[types.Part(text=json.dumps(extraction))])
+
+
+def record_extraction_reply(callback_context: CallbackContext) -> None:
+    """
+    after_agent_callback for an extraction specialist that leaves its result in state as a dict.
+
+    The specialist's final reply is kept as text under
+    EXTRACTION_REPLY_STATE_KEY. EXTRACTION_STATE_KEY gets the reply parsed as
+    JSON when it carries extracted_fields, and otherwise the result of the
+    specialist's last extraction tool call, so the local shortcuts and the
+    model path leave the same type there.
+    """
+    reply, tool_result = None, None
+    for event in callback_context._invocation_context.session.events:
+        if event.invocation_id != callback_context.invocation_id or event.author != callback_context.agent_name:
+            continue
+        for response in event.get_function_responses():
+            if response.name.startswith('extract_'):
+                tool_result = response.response
+        if event.is_final_response() and event.content:
+            reply = _user_text(event.content) or reply
+    if reply is not None:
+        callback_context.state[EXTRACTION_REPLY_STATE_KEY] = reply
+    extraction = as_extraction(reply) or as_extraction(tool_result)
+    if extraction is not None:
+        callback_context.state[EXTRACTION_STATE_KEY] = extraction
+    return None
+
+
+class ResultCacheCallbacks:
+    """
+    Callbacks that serve repeated documents from a ResultCache.
+
+    ``before_agent`` goes on the root agent and answers from the cache when an
+    extraction result is stored for the document, skipping every sub-agent. On
+    a miss it clears any results left in state by an earlier document.
+    ``after_agent`` goes on the extraction specialists, which end the run, and
+    stores the classification and extraction results left in state. Results
+    are keyed by the fingerprint of the calling agent's tree, so one instance
+    can serve several trees (the multi-agent and single-shot roots).
+    """
+
+    def __init__(self, cache: ResultCache, enabled: bool = True):
+        self.cache = cache
+        self.enabled = enabled
+
+    def before_agent(self, callback_context: CallbackContext) -> Optional[types.Content]:
+        if not self.enabled:
+            return None
+        document_content = _user_text(callback_context.user_content)
+        agents = _agent_tree(callback_context)
+        extraction = self.cache.get('extraction', document_content, agents) if document_content else None
+        if extraction is None:
+            for key in (CLASSIFICATION_STATE_KEY, EXTRACTION_STATE_KEY, EXTRACTION_REPLY_STATE_KEY,
+                        RESULT_SOURCE_STATE_KEY):
+                if callback_context.state.get(key) is not None:
+                    callback_context.state[key] = None
+            return None
+
+        classification = self.cache.get('classification', document_content, agents)
+        callback_context.state[CLASSIFICATION_STATE_KEY] = classification
+        callback_context.state[EXTRACTION_STATE_KEY] = extraction
+        callback_context.state[RESULT_SOURCE_STATE_KEY] = 'result_cache'
+        return types.Content(role='model', parts=[types.Part(text=json.dumps(
+            {'classification': classification, 'extraction': extraction, 'cached': True}))])
+
+    def after_agent(self, callback_context: CallbackContext) -> None:
+        if not self.enabled or callback_context.state.get(SPECULATIVE_STATE_KEY):
+            return None
+        document_content = _user_text(callback_context.user_content)
+        if not document_content:
+            return None
+        agents = _agent_tree(callback_context)
+        for kind in (CLASSIFICATION_STATE_KEY, EXTRACTION_STATE_KEY):
+            value = callback_context.state.get(kind)
+            if value is not None:
+                self.cache.put(kind, document_content, value, agents)
+        return None
+
+
+class NearDuplicateCallbacks:
+    """
+    Callbacks that serve near-duplicates of processed documents from a NearDuplicateIndex.
+
+    ``before_agent`` goes on the root agent after the result cache's. When
+    the index holds a document similar enough, the earlier classification is
+    reused and only fields whose labelled lines changed are extracted again,
+    locally; the result is returned without running any sub-agent. If a
+    changed field cannot be read locally, the document runs normally.
+    ``after_agent`` goes on the agents that end a run and indexes the
+    document with the classification and extraction left in state.
+
+    ``index`` is None until one is configured, which disables both callbacks.
+    """
+
+    def __init__(self, index: Optional[Any] = None, enabled: bool = True):
+        self.index = index
+        self.enabled = enabled
+        self.hits = 0
+        self.partial_hits = 0
+
+    def before_agent(self, callback_context: CallbackContext) -> Optional[types.Content]:
+        if not self.enabled or self.index is None:
+            return None
+        document_content = _user_text(callback_context.user_content)
+        match = self.index.lookup(document_content) if document_content else None
+        if match is None:
+            return None
+        from .near_duplicates import reuse_result
+
+        result = reuse_result(match, document_content)
+        if result['unresolved']:
+            self.partial_hits += 1
+            return None
+
+        self.hits += 1
+        callback_context.state[CLASSIFICATION_STATE_KEY] = result['classification']
+        callback_context.state[EXTRACTION_STATE_KEY] = result['extraction']
+        callback_context.state[RESULT_SOURCE_STATE_KEY] = 'near_duplicate'
+        return types.Content(role='model', parts=[types.Part(text=json.dumps(
+            {'classification': result['classification'], 'extraction': result['extraction'],
+             'reextracted_fields': result['reextracted']}))])
+
+    def after_agent(self, callback_context: CallbackContext) -> None:
+        if not self.enabled or self.index is None or callback_context.state.get(SPECULATIVE_STATE_KEY):
+            return None
+        document_content = _user_text(callback_context.user_content)
+        classification = callback_context.state.get(CLASSIFICATION_STATE_KEY)
+        if document_content and isinstance(classification, dict) and classification.get('document_type'):
+            self.index.add(document_content, classification, callback_context.state.get(EXTRACTION_STATE_KEY))
+        return None
+
+
+class _Speculation:
+    """One speculative extraction run and the model calls it has sent."""
+
+    __slots__ = ('agent_name', 'task', 'calls', 'started')
+
+    def __init__(self, agent_name: str):
+        self.agent_name = agent_name
+        self.task: Optional[asyncio.Task] = None
+        self.calls = 0
+        self.started = time.monotonic()
+
+
+# The speculation whose run the current task belongs to, if any
+_CURRENT_SPECULATION: contextvars.ContextVar[Optional[_Speculation]] = contextvars.ContextVar(
+    'current_speculation', default=None)
+
+
+class SpeculativeExtraction:
+    """
+    Callbacks that run extraction specialists while the LLM is still classifying.
+
+    ``start`` goes on the root agent's before_model_callback list after the
+    keyword fast path. When a document falls through to the LLM flow, it
+    scores the document locally and starts the extraction specialists of the
+    ``top_k`` highest-scoring types as background tasks. Each runs the real
+    agent, callbacks and tools included, against a copy of the session, so
+    nothing it does reaches the session unless it is kept.
+
+    ``before_extraction`` goes first in each extraction specialist's
+    before_agent_callback list. When the LLM flow transfers to a specialist,
+    the speculations for the other types are cancelled; if this type was
+    speculated, its result is awaited, its state changes are applied and its
+    reply is returned in place of running the specialist again. ``finish``
+    cancels whatever the run did not use, e.g. for documents classified as
+    unknown. It goes on the after_agent_callback of the root agent and of the
+    classification specialist: after a transfer, the agent that ends the run
+    is the only one whose after_agent callbacks run.
+
+    Model calls sent by cancelled or unused speculations count as wasted.
+    While wasted calls exceed ``max_wasted_calls_per_document`` times the
+    documents seen, new documents are not speculated on. ``count_model_call``
+    must be on each specialist's before_model_callback list (after any
+    callback that can answer in place of the model) for calls to be counted.
+
+    Speculative runs do not go through the runner's plugins, so tracers do not
+    see them.
+    """
+
+    def __init__(self, extraction_agents: Mapping[str, str], top_k: int = 1,
+                 max_wasted_calls_per_document: float = SPECULATION_MAX_WASTED_CALLS_PER_DOCUMENT,
+                 enabled: bool = True, on_result: Optional[Callable[[CallbackContext], None]] = None):
+        self.extraction_agents = dict(extraction_agents)
+        self.top_k = top_k
+        self.max_wasted_calls_per_document = max_wasted_calls_per_document
+        self.enabled = enabled
+        # Replying from before_agent skips after_agent callbacks, so they can be chained here
+        self.on_result = on_result
+        self.documents = 0
+        self.launched = 0
+        self.used = 0
+        self.wasted = 0
+        self.wasted_calls = 0
+        self.over_budget = 0
+        self._pending: Dict[str, Dict[str, _Speculation]] = {}
+
+    def reset_stats(self) -> None:
+        self.documents = self.launched = self.used = self.wasted = self.wasted_calls = self.over_budget = 0
+
+    def start(self, callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+        if not self.enabled or self.top_k < 1 or _CURRENT_SPECULATION.get() is not None:
+            return None
+        if callback_context.invocation_id in self._pending or not llm_request.contents:
+            return None
+        last = llm_request.contents[-1]
+        if last.role != 'user' or any(part.function_response for part in last.parts or []):
+            return None
+        document_content = _user_text(callback_context.user_content)
+        if not document_content:
+            return None
+
+        self._expire()
+        self.documents += 1
+        if self.wasted_calls > self.max_wasted_calls_per_document * self.documents:
+            self.over_budget += 1
+            return None
+        scores = classify_text(document_content)['scores']
+        candidates = [document_type for document_type in sorted(scores, key=scores.get, reverse=True)
+                      if scores[document_type] > 0 and document_type in self.extraction_agents][:self.top_k]
+        # The runner's context carries the session and services the specialists need
+        invocation_context = callback_context._invocation_context
+        speculations = {}
+        for document_type in candidates:
+            agent = invocation_context.agent.find_agent(self.extraction_agents[document_type])
+            if agent is None:
+                continue
+            speculation = _Speculation(agent.name)
+            speculation.task = asyncio.get_running_loop().create_task(
+                self._run(speculation, invocation_context, agent))
+            speculation.task.add_done_callback(_consume_result)
+            speculations[document_type] = speculation
+            self.launched += 1
+        if speculations:
+            self._pending[callback_context.invocation_id] = speculations
+        return None
+
+    async def before_extraction(self, callback_context: CallbackContext) -> Optional[types.Content]:
+        if _CURRENT_SPECULATION.get() is not None:
+            return None
+        speculations = self._pending.pop(callback_context.invocation_id, None)
+        if not speculations:
+            return None
+        chosen = None
+        for speculation in speculations.values():
+            if speculation.agent_name == callback_context.agent_name:
+                chosen = speculation
+            else:
+                self._cancel(speculation)
+        if chosen is None:
+            return None
+        try:
+            state_delta, reply = await chosen.task
+        except Exception:  # the specialist runs for real instead
+            self._cancel(chosen)
+            return None
+        if reply is None:
+            self._cancel(chosen)
+            return None
+
+        self.used += 1
+        for key, value in state_delta.items():
+            callback_context.state[key] = value
+        if self.on_result is not None:
+            self.on_result(callback_context)
+        return reply
+
+    def finish(self, callback_context: CallbackContext) -> None:
+        for speculation in self._pending.pop(callback_context.invocation_id, {}).values():
+            self._cancel(speculation)
+        return None
+
+    def count_model_call(self, callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+        speculation = _CURRENT_SPECULATION.get()
+        if speculation is not None:
+            speculation.calls += 1
+        return None
+
+    async def _run(self, speculation: _Speculation, invocation_context: Any, agent: Any) -> tuple:
+        """Run a specialist on a session copy; returns (state changes, final reply or None)."""
+        _CURRENT_SPECULATION.set(speculation)
+        session = invocation_context.session.model_copy(update={
+            'events': list(invocation_context.session.events),
+            'state': dict(invocation_context.session.state, **{SPECULATIVE_STATE_KEY: True}),
+        })
+        context = invocation_context.model_copy(update={'session': session, 'plugin_manager': PluginManager()})
+        state_delta: Dict[str, Any] = {}
+        reply = None
+        async for event in agent.run_async(context):
+            if event.partial:
+                continue
+            # What the runner does between turns: the next model request is built from these
+            session.events.append(event)
+            for key, value in (event.actions.state_delta if event.actions else {}).items():
+                if not key.startswith('temp:'):
+                    session.state[key] = state_delta[key] = value
+            if event.author == agent.name and event.is_final_response() and event.content:
+                reply = event.content
+        return state_delta, reply
+
+    def _cancel(self, speculation: _Speculation) -> None:
+        speculation.task.cancel()
+        self.wasted += 1
+        self.wasted_calls += speculation.calls
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - SPECULATION_TTL
+        for invocation_id in [invocation_id for invocation_id, speculations in self._pending.items()
+                              if all(s.started < cutoff for s in speculations.values())]:
+            for speculation in self._pending.pop(invocation_id).values():
+                self._cancel(speculation)
+
+
+def _consume_result(task: asyncio.Task) -> None:
+    """Retrieve a speculation's outcome so an unused failure is not reported as never retrieved."""
+    if not task.cancelled():
+        task.exception()
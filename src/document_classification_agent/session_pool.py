@@ -0,0 +1,102 @@
+"""
+Warm runner sessions reused across documents.
+"""
+
+import time
+from typing import Dict, List, Optional
+
+from google.adk.agents.run_config import RunConfig
+from google.adk.runners import Runner
+from google.adk.sessions.base_session_service import GetSessionConfig
+
+
+# Documents run through one session before it is replaced; bounds the events kept in storage
+SESSION_MAX_DOCUMENTS = 10
+
+
+class SessionPool:
+    """
+    Sessions of one runner, handed out one document at a time and reused.
+
+    Runs made with ``run_config(session_id)`` load only the events since the
+    session was acquired, so a document's prompts never carry earlier
+    documents and the session read does not grow with them where the
+    service filters in storage (SQLite and database services). When a
+    document is released, its session is rewound to before that document's
+    invocation (``Runner.rewind_async``), which resets the session state the
+    document wrote to None; ``app:`` and ``user:`` state is untouched.
+
+    Old events stay in the session's storage, and the in-memory service
+    copies all of them on every read, so a session is deleted and replaced
+    after ``max_documents_per_session`` documents. With
+    ``max_documents_per_session=1`` every document gets a fresh session and
+    nothing is rewound.
+
+    Idle sessions are reused last-in first-out, so a worker that releases
+    and acquires in turn keeps getting the same warm session.
+    """
+
+    def __init__(self, runner: Runner, user_id: str, max_documents_per_session: int = SESSION_MAX_DOCUMENTS):
+        if max_documents_per_session < 1:
+            raise ValueError("max_documents_per_session must be at least 1")
+        self.runner = runner
+        self.user_id = user_id
+        self.max_documents_per_session = max_documents_per_session
+        self.created = 0
+        self.rewound = 0
+        self.deleted = 0
+        self._idle: List[str] = []
+        self._documents: Dict[str, int] = {}
+        self._acquired_at: Dict[str, float] = {}
+
+    async def acquire(self) -> str:
+        """Return the id of an idle session, creating one if none is idle."""
+        if self._idle:
+            session_id = self._idle.pop()
+        else:
+            session = await self.runner.session_service.create_session(
+                app_name=self.runner.app_name, user_id=self.user_id)
+            self.created += 1
+            session_id = session.id
+            self._documents[session_id] = 0
+        self._acquired_at[session_id] = time.time()
+        return session_id
+
+    def run_config(self, session_id: str) -> RunConfig:
+        """Run config for an acquired session that loads only the events of the current document."""
+        return RunConfig(get_session_config=GetSessionConfig(after_timestamp=self._acquired_at[session_id]))
+
+    async def release(self, session_id: str, invocation_id: Optional[str]) -> None:
+        """
+        Return a session after one document.
+
+        Args:
+            session_id: Id from acquire
+            invocation_id: Invocation of the document's run, or None if the run
+                produced no events; the session is rewound to before it
+        """
+        self._documents[session_id] += 1
+        if self._documents[session_id] < self.max_documents_per_session and invocation_id is not None:
+            try:
+                await self.runner.rewind_async(user_id=self.user_id, session_id=session_id,
+                                               rewind_before_invocation_id=invocation_id,
+                                               run_config=self.run_config(session_id))
+            except Exception:  # a session that cannot be rewound is not reused
+                pass
+            else:
+                self.rewound += 1
+                self._idle.append(session_id)
+                return
+        await self._delete(session_id)
+
+    async def close(self) -> None:
+        """Delete every idle session."""
+        while self._idle:
+            await self._delete(self._idle.pop())
+
+    async def _delete(self, session_id: str) -> None:
+        del self._documents[session_id]
+        self._acquired_at.pop(session_id, None)
+        await self.runner.session_service.delete_session(
+            app_name=self.runner.app_name, user_id=self.user_id, session_id=session_id)
+        self.deleted += 1
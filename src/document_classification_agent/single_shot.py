@@ -0,0 +1,167 @@
+"""
+Combined response schema and local validation for the single-shot agent mode.
+
+In single-shot mode one model call returns the document type, its
+confidence and every field of that type as one JSON object, in place of the
+root, classifier and extractor turns of the multi-agent flow.
+"""
+
+import re
+from typing import Any, Dict, Literal, Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmResponse
+from google.genai import types
+from pydantic import Field, create_model
+
+from .classification import classify_text
+from .field_extractor import EXPECTED_FIELDS, FIELD_VALIDATORS, UNVALIDATED_CONFIDENCE, VALIDATED_CONFIDENCE, extract_fields
+from .routing import CLASSIFICATION_STATE_KEY, EXTRACTION_STATE_KEY, _user_text
+
+
+DOCUMENT_TYPES = ('kyc', 'passport', 'w9', 'unknown')
+# Every field of every type, in EXPECTED_FIELDS order; shared names such as 'address' appear once
+SINGLE_SHOT_FIELDS = list(dict.fromkeys(field for fields in EXPECTED_FIELDS.values() for field in fields))
+
+SingleShotResult = create_model(
+    'SingleShotResult',
+    __doc__='Document type, confidence and extracted fields from one model call.',
+    document_type=(Literal[DOCUMENT_TYPES], ...),
+    confidence=(float, Field(ge=0.0, le=1.0)),
+    reasoning=(str, ''),
+    **{field: (Optional[str], None) for field in SINGLE_SHOT_FIELDS},
+)
+
+_VALIDATORS = {field: re.compile(pattern) for field, pattern in FIELD_VALIDATORS.items()}
+
+
+def parse_single_shot(response_text: str) -> Dict[str, Any]:
+    """
+    Validate a single-shot model reply and split it into the multi-agent results.
+
+    The reply must parse as SingleShotResult. Values for fields that do not
+    belong to the returned type, or that fail their FIELD_VALIDATORS shape,
+    are dropped and listed under ``rejected_fields``.
+
+    Args:
+        response_text: JSON text of the model reply
+
+    Returns:
+        Dictionary with 'classification' and 'extraction' (None for unknown
+        documents) shaped like the multi-agent results
+
+    Raises:
+        ValueError: If the reply is not valid JSON for SingleShotResult
+    """
+    result = SingleShotResult.model_validate_json(response_text)
+    document_type = result.document_type
+    classification = {
+        'document_type': document_type,
+        'confidence': result.confidence,
+        'reasoning': result.reasoning,
+        'classification_method': 'single_shot',
+        'description': f'Document classified as {document_type} with confidence {result.confidence:.2%}'
+    }
+    if document_type == 'unknown':
+        return {'classification': classification, 'extraction': None}
+
+    expected_fields = EXPECTED_FIELDS[document_type]
+    extracted = {}
+    field_confidence = {}
+    rejected = {}
+    for field in SINGLE_SHOT_FIELDS:
+        value = getattr(result, field)
+        if value is None or not value.strip():
+            continue
+        value = value.strip()
+        validator = _VALIDATORS.get(field)
+        if field not in expected_fields:
+            rejected[field] = 'not a field of this document type'
+        elif validator is not None and not validator.fullmatch(value):
+            rejected[field] = 'value does not have the expected format'
+        else:
+            extracted[field] = value
+            field_confidence[field] = UNVALIDATED_CONFIDENCE if validator is None else VALIDATED_CONFIDENCE
+    extraction = {
+        'document_type': document_type,
+        'extracted_fields': extracted,
+        'field_confidence': field_confidence,
+        'missing_fields': [field for field in expected_fields if field not in extracted],
+        'rejected_fields': rejected,
+        'extraction_confidence': sum(field_confidence.values()) / len(expected_fields),
+        'extraction_method': 'single_shot',
+        'description': f'Extracted {len(extracted)} of {len(expected_fields)} {document_type} fields in one call'
+    }
+    return {'classification': classification, 'extraction': extraction}
+
+
+def local_single_shot(document_content: str) -> Dict[str, Any]:
+    """Classification and extraction from the local keyword scorer and label scanner."""
+    classification = classify_text(document_content)
+    document_type = classification['document_type']
+    extraction = extract_fields(document_type, document_content) if document_type != 'unknown' else None
+    return {'classification': classification, 'extraction': extraction}
+
+
+def format_single_shot(classification: Dict[str, Any], extraction: Optional[Dict[str, Any]]) -> str:
+    """
+    JSON text of the SingleShotResult that carries a classification and extraction.
+
+    Args:
+        classification: Classification result with document_type and confidence
+        extraction: Extraction result with extracted_fields, or None
+
+    Returns:
+        Reply JSON with fields outside the combined schema left out
+    """
+    fields = extraction['extracted_fields'] if extraction else {}
+    return SingleShotResult(
+        document_type=classification['document_type'],
+        confidence=classification['confidence'],
+        reasoning=classification.get('reasoning', ''),
+        **{field: value for field, value in fields.items() if field in SINGLE_SHOT_FIELDS},
+    ).model_dump_json(exclude_none=True)
+
+
+class SingleShotValidator:
+    """
+    after_model_callback for the single-shot agent that validates its reply locally.
+
+    A valid reply is split into classification and extraction results in
+    session state, under the same keys the multi-agent flow uses. A reply
+    that does not parse is replaced by the local keyword and label results,
+    recorded with the validation error, so a malformed model response never
+    fails the run. Either way the reply is rewritten as clean schema JSON.
+    """
+
+    def __init__(self):
+        self.valid_count = 0
+        self.invalid_count = 0
+        self.rejected_field_count = 0
+
+    def __call__(self, callback_context: CallbackContext, llm_response: LlmResponse) -> Optional[LlmResponse]:
+        if llm_response.partial or llm_response.content is None:
+            return None
+        response_text = ''.join(part.text for part in llm_response.content.parts or []
+                                if part.text and not part.thought)
+        if not response_text.strip():
+            return None
+
+        try:
+            result = parse_single_shot(response_text)
+        except ValueError as error:
+            self.invalid_count += 1
+            result = local_single_shot(_user_text(callback_context.user_content))
+            result['classification'] = dict(result['classification'], classification_method='local_fallback',
+                                            validation_error=str(error))
+        else:
+            self.valid_count += 1
+            if result['extraction'] is not None:
+                self.rejected_field_count += len(result['extraction']['rejected_fields'])
+
+        callback_context.state[CLASSIFICATION_STATE_KEY] = result['classification']
+        callback_context.state[EXTRACTION_STATE_KEY] = result['extraction']
+        reply = format_single_shot(result['classification'], result['extraction'])
+        return llm_response.model_copy(update={
+            'content': types.Content(role='model', parts=[types.Part(text=reply)])
+        })
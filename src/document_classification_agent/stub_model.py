@@ -0,0 +1,79 @@
+"""
+Scripted local model that drives the agent tree offline, for benchmarks, the worker demo and tests.
+"""
+
+import random
+from typing import Callable, Dict, Optional
+
+from google.adk.models import LlmRequest, LlmResponse
+from google.genai import errors
+from local_llm import LatencyModel, LocalLlm, function_call_response, text_response
+
+from . import agent
+from .single_shot import format_single_shot, local_single_shot
+
+
+# Median seconds before the routing model replies, and the log-normal sigma around it
+MODEL_LATENCY_MEDIAN = 0.02
+MODEL_LATENCY_SIGMA = 0.5
+
+
+class RoutingResponder:
+    """
+    Responder that walks the agent tree the way the instructions ask.
+
+    The root agent transfers to the classifier, the classifier calls its tool
+    and transfers to the matching extractor, and the extractor calls its tool
+    and replies. Requests with a response schema (the single-shot agent) get
+    the local classification and extraction as schema JSON.
+    """
+
+    def __init__(self, extraction_agents: Dict[str, str]):
+        self.extraction_agents = extraction_agents
+
+    def __call__(self, llm_request: LlmRequest) -> LlmResponse:
+        tools = llm_request.tools_dict
+        document = next(part.text for content in llm_request.contents if content.role == 'user'
+                        for part in content.parts or [] if part.text)
+        if llm_request.config and llm_request.config.response_schema:
+            result = local_single_shot(document)
+            return text_response(format_single_shot(result['classification'], result['extraction']))
+        responses = {part.function_response.name: part.function_response.response
+                     for part in llm_request.contents[-1].parts or [] if part.function_response}
+        tool_names = [name for name in tools if name != 'transfer_to_agent']
+
+        if 'classify_document_with_llm' in tools:
+            if 'classify_document_with_llm' not in responses:
+                return function_call_response('classify_document_with_llm', document_content=document)
+            target = self.extraction_agents.get(responses['classify_document_with_llm']['document_type'])
+            if target is None:
+                return text_response('Unsupported document')
+            return function_call_response('transfer_to_agent', agent_name=target)
+        if tool_names:
+            if responses:
+                return text_response('Extraction complete')
+            return function_call_response(tool_names[0], document_content=document)
+        return function_call_response('transfer_to_agent', agent_name=agent.classification_specialist_agent.name)
+
+
+def routing_model(latency: Optional[LatencyModel] = None) -> LocalLlm:
+    """Local model that follows the routing script with seeded log-normal latency."""
+    if latency is None:
+        latency = LatencyModel(MODEL_LATENCY_MEDIAN, 'lognormal', MODEL_LATENCY_SIGMA)
+    return LocalLlm(model='local-routing', responder=RoutingResponder(agent.keyword_fast_path.extraction_agents),
+                    latency=latency)
+
+
+class FlakyResponder:
+    """Responder wrapper that fails a share of model calls with 503s, as an overloaded endpoint would."""
+
+    def __init__(self, responder: Callable[[LlmRequest], LlmResponse], failure_rate: float, seed: int):
+        self.responder = responder
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+
+    def __call__(self, llm_request: LlmRequest) -> LlmResponse:
+        if self._random.random() < self.failure_rate:
+            raise errors.ServerError(503, {'error': {'code': 503, 'message': 'stub model overloaded',
+                                                     'status': 'UNAVAILABLE'}})
+        return self.responder(llm_request)
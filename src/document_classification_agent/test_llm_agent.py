@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
 """
 Test script for the LLM-based document classification agent.
+
+Run from the ``src`` directory:
+    python -m document_classification_agent.test_llm_agent
 """
 
 import sys
-from agent import (
+from .agent import (
     classify_document_with_llm,
     extract_kyc_with_llm,
     extract_passport_with_llm,
@@ -15,7 +18,7 @@ from agent import (
     w9_extraction_agent,
     root_agent
 )
-from sample_data import SAMPLE_DOCUMENTS
+from .sample_data import SAMPLE_DOCUMENTS
 
 
 def test_llm_classification():
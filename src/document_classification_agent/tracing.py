@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+Per-stage tracing for the agent hierarchy.
+
+``StageTracer`` is an ADK plugin that records a span for every run, agent,
+model call and tool call, with durations, token counts, tool payload sizes
+and result-cache hits. Finished spans go to a sink (JSON lines in the
+OpenTelemetry span layout, or memory) and into per-stage latency histograms.
+
+Summarize a trace file from the ``src`` directory:
+    python -m document_classification_agent.tracing trace.jsonl
+"""
+
+import argparse
+import bisect
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event
+from google.adk.models import LlmRequest, LlmResponse
+from google.adk.plugins import BasePlugin
+from google.adk.tools import BaseTool, ToolContext
+
+from .routing import RESULT_SOURCE_STATE_KEY
+
+
+# Upper bounds of the latency histogram buckets, in milliseconds (the last bucket is open)
+BUCKET_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+# Durations sampled per stage for the percentiles; counts, totals, max and buckets cover every span
+RESERVOIR_SIZE = 2048
+
+
+def _payload_size(value: Any) -> int:
+    """Approximate serialized size of a tool payload: string lengths plus scalars' reprs."""
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(str(key)) + _payload_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(_payload_size(item) for item in value)
+    return len(repr(value))
+
+
+class JsonlSpanSink:
+    """
+    Appends finished spans to a file, one JSON object per line.
+
+    Each line follows the OpenTelemetry span layout (hex trace and span ids,
+    start and end times in Unix nanoseconds, attributes, status), so it can be
+    converted to OTLP or loaded with ``load_spans``. The tracer exports each
+    run's spans when the run ends, and they are appended in one write then,
+    so a process that is killed loses only the runs still in progress.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans: Iterable[Dict[str, Any]]) -> None:
+        lines = ''.join(json.dumps(span, default=str) + '\n' for span in spans)
+        if lines:
+            with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+
+    def flush(self) -> None:
+        pass
+
+
+class MemorySpanSink:
+    """Keeps finished spans in a list, for tests and benchmarks."""
+
+    def __init__(self):
+        self.spans: List[Dict[str, Any]] = []
+
+    def export(self, spans: Iterable[Dict[str, Any]]) -> None:
+        self.spans.extend(spans)
+
+    def flush(self) -> None:
+        pass
+
+
+def load_spans(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield the spans written to ``path`` by a JsonlSpanSink."""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class StageHistograms:
+    """
+    Latency histograms and totals per stage, where a stage is a span kind plus name.
+
+    For example 'model document_classification_specialist' or
+    'tool classify_document_with_llm'.
+
+    Memory per stage is fixed, however long the tracer runs. Count, total,
+    max and bucket counts are exact. Percentiles come from a uniform
+    reservoir of ``reservoir_size`` durations, so they are exact until a
+    stage has seen that many spans and sampled estimates after.
+    """
+
+    def __init__(self, bounds_ms: Iterable[float] = BUCKET_BOUNDS_MS, reservoir_size: int = RESERVOIR_SIZE):
+        self.bounds_ms = tuple(bounds_ms)
+        self.reservoir_size = reservoir_size
+        self._counts: Dict[str, int] = defaultdict(int)
+        self._total_ms: Dict[str, float] = defaultdict(float)
+        self._max_ms: Dict[str, float] = {}
+        self._buckets: Dict[str, List[int]] = defaultdict(lambda: [0] * (len(self.bounds_ms) + 1))
+        self._samples: Dict[str, List[float]] = defaultdict(list)
+        self._totals: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._random = random.Random(0)
+
+    def add(self, span: Dict[str, Any]) -> None:
+        stage = f"{span['kind']} {span['stage']}"
+        duration = (span['end_time_unix_nano'] - span['start_time_unix_nano']) / 1e6
+        self._counts[stage] += 1
+        self._total_ms[stage] += duration
+        self._max_ms[stage] = max(duration, self._max_ms.get(stage, duration))
+        # Bucket i holds durations up to bounds_ms[i]; the last one everything above
+        self._buckets[stage][bisect.bisect_left(self.bounds_ms, duration)] += 1
+        samples = self._samples[stage]
+        if len(samples) < self.reservoir_size:
+            samples.append(duration)
+        else:
+            # Algorithm R: every span seen so far stays in the reservoir with equal probability
+            slot = self._random.randrange(self._counts[stage])
+            if slot < self.reservoir_size:
+                samples[slot] = duration
+        totals = self._totals[stage]
+        attributes = span['attributes']
+        for key in ('prompt_tokens', 'output_tokens', 'cached_tokens', 'request_chars', 'response_chars'):
+            totals[key] += attributes.get(key, 0)
+        totals['cache_hits'] += attributes.get('result_source') == 'result_cache'
+        totals['local_replies'] += bool(attributes.get('answered_by_callback'))
+        totals['errors'] += span['status'] == 'ERROR'
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Per stage: count, p50/p95/p99/max in ms, bucket counts and attribute totals."""
+        result = {}
+        for stage, count in sorted(self._counts.items()):
+            samples = self._samples[stage]
+            result[stage] = {
+                'count': count,
+                'total_ms': self._total_ms[stage],
+                'p50_ms': _percentile(samples, 50),
+                'p95_ms': _percentile(samples, 95),
+                'p99_ms': _percentile(samples, 99),
+                'max_ms': self._max_ms[stage],
+                'buckets': list(self._buckets[stage]),
+                **self._totals[stage],
+            }
+        return result
+
+    def format(self) -> str:
+        """Text table of the summary with one bucket-count bar per stage."""
+        summary = self.summary()
+        lines = [f"  {'stage':<48}{'count':>7}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}{'tokens':>9}{'payload':>10}"
+                 f"{'local':>7}{'cached':>8}"]
+        for stage, stats in summary.items():
+            lines.append(f"  {stage:<48}{stats['count']:>7}{stats['p50_ms']:>9.2f}{stats['p95_ms']:>9.2f}"
+                         f"{stats['max_ms']:>9.2f}{stats['prompt_tokens'] + stats['output_tokens']:>9}"
+                         f"{stats['request_chars'] + stats['response_chars']:>10}{stats['local_replies']:>7}"
+                         f"{stats['cache_hits']:>8}")
+        lines.append('')
+        labels = [f'<={bound:g}' for bound in self.bounds_ms] + [f'>{self.bounds_ms[-1]:g}']
+        lines.append(f"  {'ms buckets':<48}" + ''.join(f'{label:>8}' for label in labels))
+        for stage, stats in summary.items():
+            lines.append(f"  {stage:<48}" + ''.join(f'{count or "":>8}' for count in stats['buckets']))
+        return '\n'.join(lines)
+
+
+class _Run:
+    """Open spans of one invocation (one document)."""
+
+    __slots__ = ('trace_id', 'root', 'agents', 'models', 'tools', 'finished', 'last_event_ns')
+
+    def __init__(self, trace_id: str, root: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.root = root
+        self.agents: List[Dict[str, Any]] = []
+        self.models: Dict[str, Dict[str, Any]] = {}
+        self.tools: Dict[str, Dict[str, Any]] = {}
+        self.finished: List[Dict[str, Any]] = [root]
+        self.last_event_ns: Dict[str, int] = {}
+
+
+class StageTracer(BasePlugin):
+    """
+    ADK plugin that traces every agent, model and tool invocation of a run.
+
+    Register it on the runner or App (``plugins=[StageTracer(sink)]``); it
+    never changes requests or responses. Spans nest as run > agent > model or
+    tool, with a transferred-to agent under the agent that transferred.
+    Model spans carry prompt, output and cached token counts. Tool spans
+    carry request and response sizes in characters. A model call answered by
+    an agent's own before_model_callback (the keyword fast path) and an agent
+    answered by its before_agent_callback (result cache, local extraction)
+    are marked ``answered_by_callback``, with the ``result_source`` the
+    callback recorded in state.
+
+    Spans are exported when their run finishes, and added to ``histograms``.
+    """
+
+    def __init__(self, sink: Optional[Any] = None, name: str = 'stage_tracer', enabled: bool = True):
+        super().__init__(name=name)
+        self.sink = sink
+        self.enabled = enabled
+        self.histograms = StageHistograms()
+        self._runs: Dict[str, _Run] = {}
+        self._random = random.Random()
+
+    def _span(self, run: Optional[_Run], kind: str, stage: str, parent: Optional[Dict[str, Any]],
+              trace_id: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            'name': f'{kind} {stage}',
+            'trace_id': trace_id or run.trace_id,
+            'span_id': f'{self._random.getrandbits(64):016x}',
+            'parent_span_id': parent['span_id'] if parent else None,
+            'kind': kind,
+            'stage': stage,
+            'start_time_unix_nano': time.time_ns(),
+            'end_time_unix_nano': None,
+            'status': 'OK',
+            'attributes': {},
+        }
+
+    def _end(self, run: _Run, span: Dict[str, Any], end_ns: Optional[int] = None) -> None:
+        span['end_time_unix_nano'] = end_ns or time.time_ns()
+        run.finished.append(span)
+
+    def _agent_span(self, run: _Run, agent_name: str) -> Optional[Dict[str, Any]]:
+        for span in reversed(run.agents):
+            if span['stage'] == agent_name:
+                return span
+        return None
+
+    async def before_run_callback(self, *, invocation_context: InvocationContext) -> None:
+        if not self.enabled:
+            return None
+        root = self._span(None, 'run', invocation_context.app_name, None,
+                          trace_id=f'{self._random.getrandbits(128):032x}')
+        root['attributes']['invocation_id'] = invocation_context.invocation_id
+        self._runs[invocation_context.invocation_id] = _Run(root['trace_id'], root)
+        return None
+
+    async def before_agent_callback(self, *, agent: BaseAgent, callback_context: CallbackContext) -> None:
+        run = self._runs.get(callback_context.invocation_id)
+        if run is not None:
+            parent = run.agents[-1] if run.agents else run.root
+            span = self._span(run, 'agent', agent.name, parent)
+            span['attributes']['model_calls'] = 0
+            run.agents.append(span)
+        return None
+
+    async def after_agent_callback(self, *, agent: BaseAgent, callback_context: CallbackContext) -> None:
+        run = self._runs.get(callback_context.invocation_id)
+        span = self._agent_span(run, agent.name) if run is not None else None
+        if span is not None:
+            run.agents.remove(span)
+            self._end(run, span)
+        return None
+
+    async def before_model_callback(self, *, callback_context: CallbackContext,
+                                    llm_request: LlmRequest) -> None:
+        run = self._runs.get(callback_context.invocation_id)
+        if run is not None:
+            agent_span = self._agent_span(run, callback_context.agent_name)
+            if agent_span is not None:
+                agent_span['attributes']['model_calls'] += 1
+            run.models[callback_context.agent_name] = self._span(
+                run, 'model', callback_context.agent_name, agent_span or run.root)
+        return None
+
+    async def after_model_callback(self, *, callback_context: CallbackContext,
+                                   llm_response: LlmResponse) -> None:
+        run = self._runs.get(callback_context.invocation_id)
+        if run is None or llm_response.partial:
+            return None
+        span = run.models.pop(callback_context.agent_name, None)
+        if span is not None:
+            usage = llm_response.usage_metadata
+            if usage is not None:
+                span['attributes']['prompt_tokens'] = usage.prompt_token_count or 0
+                span['attributes']['output_tokens'] = usage.candidates_token_count or 0
+                span['attributes']['cached_tokens'] = usage.cached_content_token_count or 0
+            self._end(run, span)
+        return None
+
+    async def on_model_error_callback(self, *, callback_context: CallbackContext, llm_request: LlmRequest,
+                                      error: Exception) -> None:
+        run = self._runs.get(callback_context.invocation_id)
+        span = run.models.pop(callback_context.agent_name, None) if run is not None else None
+        if span is not None:
+            span['status'] = 'ERROR'
+            span['attributes']['error'] = f'{type(error).__name__}: {error}'
+            self._end(run, span)
+        return None
+
+    async def before_tool_callback(self, *, tool: BaseTool, tool_args: Dict[str, Any],
+                                   tool_context: ToolContext) -> None:
+        run = self._runs.get(tool_context.invocation_id)
+        if run is not None:
+            span = self._span(run, 'tool', tool.name, self._agent_span(run, tool_context.agent_name) or run.root)
+            span['attributes']['request_chars'] = _payload_size(tool_args)
+            run.tools[tool_context.function_call_id or tool.name] = span
+        return None
+
+    async def after_tool_callback(self, *, tool: BaseTool, tool_args: Dict[str, Any], tool_context: ToolContext,
+                                  result: Dict[str, Any]) -> None:
+        run = self._runs.get(tool_context.invocation_id)
+        span = run.tools.pop(tool_context.function_call_id or tool.name, None) if run is not None else None
+        if span is not None:
+            span['attributes']['response_chars'] = _payload_size(result)
+            self._end(run, span)
+        return None
+
+    async def on_tool_error_callback(self, *, tool: BaseTool, tool_args: Dict[str, Any], tool_context: ToolContext,
+                                     error: Exception) -> None:
+        run = self._runs.get(tool_context.invocation_id)
+        span = run.tools.pop(tool_context.function_call_id or tool.name, None) if run is not None else None
+        if span is not None:
+            span['status'] = 'ERROR'
+            span['attributes']['error'] = f'{type(error).__name__}: {error}'
+            self._end(run, span)
+        return None
+
+    async def on_event_callback(self, *, invocation_context: InvocationContext, event: Event) -> None:
+        run = self._runs.get(invocation_context.invocation_id)
+        if run is None or event.partial:
+            return None
+        now = time.time_ns()
+        run.last_event_ns[event.author] = now
+        # The agent's own before_model_callback answered, so after_model never ran
+        span = run.models.pop(event.author, None)
+        if span is not None:
+            span['attributes']['answered_by_callback'] = True
+            self._end(run, span, now)
+        source = event.actions.state_delta.get(RESULT_SOURCE_STATE_KEY) if event.actions else None
+        agent_span = self._agent_span(run, event.author)
+        if agent_span is not None:
+            if source:
+                agent_span['attributes']['result_source'] = source
+            if not agent_span['attributes']['model_calls'] and event.is_final_response():
+                agent_span['attributes']['answered_by_callback'] = True
+        return None
+
+    async def after_run_callback(self, *, invocation_context: InvocationContext) -> None:
+        run = self._runs.pop(invocation_context.invocation_id, None)
+        if run is None:
+            return None
+        now = time.time_ns()
+        # Agents answered by a before_agent_callback, or that transferred away, get no after_agent
+        for span in reversed(run.agents):
+            answered = span['attributes'].get('answered_by_callback')
+            self._end(run, span, run.last_event_ns.get(span['stage'], now) if answered else now)
+        for span in [*run.models.values(), *run.tools.values()]:
+            span['status'] = 'ERROR'
+            span['attributes']['error'] = 'unfinished'
+            self._end(run, span, now)
+        run.root['end_time_unix_nano'] = now
+        for span in run.finished:
+            self.histograms.add(span)
+        if self.sink is not None:
+            self.sink.export(run.finished)
+        return None
+
+    async def close(self) -> None:
+        if self.sink is not None:
+            self.sink.flush()
+
+
+def main():
+    """Print per-stage histograms for a trace file written by JsonlSpanSink."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('path', help='JSON lines trace file')
+    args = parser.parse_args()
+    histograms = StageHistograms()
+    for span in load_spans(args.path):
+        histograms.add(span)
+    print(histograms.format())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,518 @@
+#!/usr/bin/env python3
+"""
+Multi-process worker service that classifies documents from a local job queue.
+
+Jobs live in a SQLite database (``JobQueue``). ``serve`` starts worker
+processes; each imports the agent package once (agents and the compiled
+keyword matcher stay warm) and runs several documents at a time through a
+DocumentPipeline. Queue calls run on a thread of their own, off the event
+loop. A running job's lease is renewed until its result is acked, in a
+committed transaction, before the next job is claimed. Failed model calls
+are retried with backoff inside the run; a job whose run still fails is
+requeued with backoff and marked failed after MAX_JOB_ATTEMPTS. SIGINT or
+SIGTERM stops claiming, lets in-flight documents finish and returns
+anything unfinished to the queue.
+
+Run from the ``src`` directory:
+    python -m document_classification_agent.worker_service enqueue jobs.db path/to/documents
+    python -m document_classification_agent.worker_service serve jobs.db --workers 4
+    python -m document_classification_agent.worker_service report jobs.db
+    python -m document_classification_agent.worker_service demo --documents 500 --workers 4
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import sqlite3
+import tempfile
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from .document_intake import iter_document_files
+from .pipeline import DocumentPipeline, limit_model_concurrency, retry_model_calls
+
+
+# A running job whose worker has not acked within this many seconds is handed out again
+LEASE_SECONDS = 300.0
+# Share of the lease after which a worker still processing a job extends it
+LEASE_RENEW_FRACTION = 1 / 3
+# Runs of one job before it is marked failed, and the backoff between them, in seconds
+MAX_JOB_ATTEMPTS = 3
+JOB_RETRY_BASE_DELAY = 2.0
+JOB_RETRY_MAX_DELAY = 60.0
+DEFAULT_WORKERS = os.cpu_count() or 1
+# Documents in flight per worker process, and model calls in flight across them
+DEFAULT_CONCURRENCY = 8
+DEFAULT_MODEL_CALLS = 4
+# Seconds an idle worker waits before polling the queue again
+POLL_INTERVAL = 0.05
+# Seconds in-flight documents get to finish after a shutdown signal before they are requeued
+SHUTDOWN_GRACE_SECONDS = 30.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source TEXT,
+    document TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    leased_until REAL,
+    worker TEXT,
+    result TEXT,
+    error TEXT,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, available_at);
+CREATE TABLE IF NOT EXISTS workers (
+    name TEXT PRIMARY KEY,
+    pid INTEGER,
+    started_at REAL,
+    stopped_at REAL,
+    documents INTEGER,
+    failures INTEGER,
+    model_retries INTEGER
+);
+"""
+
+Job = namedtuple('Job', 'id document attempts')
+
+
+class JobQueue:
+    """
+    Durable document queue in one SQLite file, shared by the worker processes.
+
+    Every write commits on its own with ``synchronous=FULL`` in WAL mode, so
+    an acked result survives a crash or power loss. A claimed job is leased
+    to its worker; if the worker dies, the job is claimed again once the
+    lease expires. Each claim increments ``attempts``, which acts as a fencing
+    token: ack, retry, fail and release only apply to the attempt that was
+    claimed, so a worker that outlived its lease cannot overwrite the result
+    of the worker that took the job over. A worker that is still processing
+    a job renews its lease, so a long job is not handed out a second time.
+
+    Open one JobQueue per process; the connection is not shared. It may be
+    used from any thread, one thread at a time; the worker service makes
+    every call from one queue thread, so waiting on SQLite's locks never
+    blocks its event loop.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = sqlite3.connect(path, timeout=30.0, isolation_level=None, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=FULL')
+        self._connection.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def enqueue(self, documents: Iterable[str], sources: Optional[Iterable[Optional[str]]] = None) -> List[int]:
+        """
+        Add documents to the queue in one transaction.
+
+        Args:
+            documents: Document text contents
+            sources: Optional label of each document, such as its file path
+
+        Returns:
+            The job ids, in input order
+        """
+        documents = list(documents)
+        sources = list(sources) if sources is not None else [None] * len(documents)
+        now = time.time()
+        ids = []
+        with self._transaction():
+            for source, document in zip(sources, documents):
+                cursor = self._connection.execute(
+                    'INSERT INTO jobs (source, document, available_at, enqueued_at) VALUES (?, ?, ?, ?)',
+                    (source, document, now, now))
+                ids.append(cursor.lastrowid)
+        return ids
+
+    def claim(self, worker: str, lease: float = LEASE_SECONDS) -> Optional[Job]:
+        """Lease the oldest available job to ``worker``, or return None if there is none."""
+        now = time.time()
+        rows = self._connection.execute(
+            "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?, leased_until = ?,"
+            " started_at = ? WHERE id = (SELECT id FROM jobs WHERE (status = 'queued' AND available_at <= ?)"
+            " OR (status = 'running' AND leased_until < ?) ORDER BY available_at, id LIMIT 1)"
+            " RETURNING id, document, attempts",
+            (worker, now + lease, now, now, now)).fetchall()
+        return Job(*rows[0]) if rows else None
+
+    def renew(self, job: Job, lease: float = LEASE_SECONDS) -> bool:
+        """Extend a running job's lease to ``lease`` seconds from now; False if the attempt no longer holds the job."""
+        cursor = self._connection.execute(
+            "UPDATE jobs SET leased_until = ? WHERE id = ? AND attempts = ? AND status = 'running'",
+            (time.time() + lease, job.id, job.attempts))
+        return cursor.rowcount == 1
+
+    def ack(self, job: Job, result: Dict[str, Any]) -> bool:
+        """Store a job's result and mark it done; False if the attempt no longer holds the job."""
+        return self._finish(job, "status = 'done', result = ?, error = NULL, finished_at = ?",
+                            (json.dumps(result, default=str), time.time()))
+
+    def retry(self, job: Job, error: str, delay: float) -> bool:
+        """Return a failed job to the queue, available again after ``delay`` seconds."""
+        return self._finish(job, "status = 'queued', error = ?, available_at = ?, worker = NULL",
+                            (error, time.time() + delay))
+
+    def fail(self, job: Job, error: str) -> bool:
+        """Mark a job failed for good."""
+        return self._finish(job, "status = 'failed', error = ?, finished_at = ?", (error, time.time()))
+
+    def release(self, job: Job) -> bool:
+        """Return an unfinished job to the queue without counting the attempt (used on shutdown)."""
+        return self._finish(job, "status = 'queued', attempts = attempts - 1, available_at = ?, worker = NULL",
+                            (time.time(),))
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs in each status."""
+        return dict(self._connection.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status'))
+
+    def outstanding(self) -> int:
+        """Jobs that are queued or running."""
+        return self._connection.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+
+    def results(self) -> Dict[int, Dict[str, Any]]:
+        """Results of the finished jobs by id, with status, source, attempts and error."""
+        rows = self._connection.execute(
+            "SELECT id, source, status, attempts, result, error FROM jobs WHERE status IN ('done', 'failed')")
+        return {job_id: {'source': source, 'status': status, 'attempts': attempts,
+                         'result': json.loads(result) if result else None, 'error': error}
+                for job_id, source, status, attempts, result, error in rows}
+
+    def record_worker(self, name: str, started_at: float, documents: int, failures: int, model_retries: int) -> None:
+        """Store a worker process's totals when it stops."""
+        self._connection.execute(
+            'INSERT OR REPLACE INTO workers VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (name, os.getpid(), started_at, time.time(), documents, failures, model_retries))
+
+    def _finish(self, job: Job, assignments: str, values: tuple) -> bool:
+        cursor = self._connection.execute(
+            f"UPDATE jobs SET {assignments}, leased_until = NULL WHERE id = ? AND attempts = ? AND status = 'running'",
+            values + (job.id, job.attempts))
+        return cursor.rowcount == 1
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        self._connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self._connection.execute('ROLLBACK')
+            raise
+        self._connection.execute('COMMIT')
+
+
+def job_retry_delay(attempts: int) -> float:
+    """Backoff before a job's next run after ``attempts`` failed runs."""
+    return min(JOB_RETRY_MAX_DELAY, JOB_RETRY_BASE_DELAY * 2 ** (attempts - 1))
+
+
+def _install_stub_model(root_agent: Any, failure_rate: float, seed: int) -> None:
+    """Point the agent tree at the scripted local model, failing ``failure_rate`` of its calls."""
+    from local_llm import install_local_model
+
+    from .stub_model import FlakyResponder, routing_model
+
+    model = routing_model()
+    model.responder = FlakyResponder(model.responder, failure_rate, seed)
+    install_local_model(root_agent, model)
+
+
+async def _serve(queue: JobQueue, name: str, root_agent: Any, concurrency: int, model_calls: int,
+                 should_stop: Callable[[], bool], exit_when_empty: bool, grace: float,
+                 lease: float = LEASE_SECONDS) -> Dict[str, int]:
+    """Run ``concurrency`` claim-process-ack loops until stopped (or the queue drains); returns totals."""
+    pipeline = DocumentPipeline(root_agent, max_concurrent_documents=concurrency,
+                                max_in_flight_model_calls=model_calls, app_name='worker_service', user_id=name)
+    totals = {'documents': 0, 'failures': 0, 'lost_leases': 0}
+    # One thread makes every queue call, so the connection is never shared and the loop never waits on SQLite
+    queue_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix='job-queue')
+    loop = asyncio.get_running_loop()
+
+    def call(method: Callable[..., Any], *args: Any) -> 'asyncio.Future[Any]':
+        return loop.run_in_executor(queue_thread, method, *args)
+
+    async def keep_leased(job: Job) -> None:
+        """Renew the job's lease until cancelled; returns once another attempt holds the job."""
+        while True:
+            await asyncio.sleep(lease * LEASE_RENEW_FRACTION)
+            if not await call(queue.renew, job, lease):
+                return
+
+    async def process(job: Job) -> Optional[Dict[str, Any]]:
+        """Process a job's document while holding its lease; None if the lease was lost first."""
+        processing = asyncio.ensure_future(pipeline.process(job.id, job.document))
+        renewing = asyncio.ensure_future(keep_leased(job))
+        try:
+            await asyncio.wait((processing, renewing), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            renewing.cancel()
+            if not processing.done():
+                processing.cancel()
+                await asyncio.gather(processing, return_exceptions=True)
+        if renewing.done() and not renewing.cancelled() and renewing.exception():
+            raise renewing.exception()
+        return processing.result() if not processing.cancelled() else None
+
+    async def work():
+        while not should_stop():
+            job = await call(queue.claim, name, lease)
+            if job is None:
+                if exit_when_empty and await call(queue.outstanding) == 0:
+                    return
+                await asyncio.sleep(POLL_INTERVAL)
+                continue
+            if job.attempts > MAX_JOB_ATTEMPTS:  # its workers kept dying before the lease ran out
+                await call(queue.fail, job, 'lease expired on every attempt')
+                continue
+            try:
+                result = await process(job)
+            except asyncio.CancelledError:
+                await call(queue.release, job)
+                raise
+            except Exception as e:
+                # A queue call failed mid-run, e.g. renewing the lease; the pipeline reports its own errors
+                result = {'error': f'{type(e).__name__}: {e}'}
+            if result is None:
+                finished = False
+            elif result['error'] is None:
+                finished = await call(queue.ack, job, {key: result[key] for key in ('classification', 'extraction',
+                                                                                    'response', 'latency')})
+                totals['documents'] += finished
+            elif job.attempts < MAX_JOB_ATTEMPTS:
+                finished = await call(queue.retry, job, result['error'], job_retry_delay(job.attempts))
+            else:
+                finished = await call(queue.fail, job, result['error'])
+                totals['failures'] += finished
+            if not finished:
+                # The lease ran out first: another worker holds the job now and will finish and count it
+                totals['lost_leases'] += 1
+
+    try:
+        with limit_model_concurrency(root_agent, asyncio.Semaphore(model_calls)), \
+                retry_model_calls(root_agent) as retriers:
+            tasks = [asyncio.create_task(work()) for _ in range(concurrency)]
+            pending = set(tasks)
+            while pending and not should_stop():
+                _, pending = await asyncio.wait(pending, timeout=POLL_INTERVAL)
+            if pending:
+                # Stopping: the loops claim nothing more; give in-flight documents the grace period
+                _, pending = await asyncio.wait(pending, timeout=grace)
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+            for task in tasks:
+                if not task.cancelled() and task.exception():
+                    raise task.exception()
+    finally:
+        queue_thread.shutdown()
+    totals['model_retries'] = sum(wrapper.retries for wrapper in retriers)
+    return totals
+
+
+def _worker_main(path: str, name: str, concurrency: int, model_calls: int, stop_event: Any,
+                 exit_when_empty: bool, grace: float, stub_model: bool, stub_failure_rate: float, seed: int) -> None:
+    """Entry point of one worker process."""
+    # Ctrl-C reaches the whole process group; the parent turns it into stop_event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    terminated = []
+    signal.signal(signal.SIGTERM, lambda *_: terminated.append(True))
+
+    from . import agent
+    root_agent = agent.root_agent  # builds the agent tree in this process before the first claim
+
+    if stub_model:
+        _install_stub_model(root_agent, stub_failure_rate, seed)
+    queue = JobQueue(path)
+    started_at = time.time()
+    try:
+        totals = asyncio.run(_serve(queue, name, root_agent, concurrency, model_calls,
+                                    lambda: bool(terminated) or stop_event.is_set(), exit_when_empty, grace))
+        queue.record_worker(name, started_at, totals['documents'], totals['failures'], totals['model_retries'])
+    finally:
+        queue.close()
+
+
+def run_service(path: str, workers: int = DEFAULT_WORKERS, concurrency: int = DEFAULT_CONCURRENCY,
+                model_calls: int = DEFAULT_MODEL_CALLS, exit_when_empty: bool = False,
+                grace: float = SHUTDOWN_GRACE_SECONDS, stub_model: bool = False,
+                stub_failure_rate: float = 0.0) -> float:
+    """
+    Run worker processes over a queue until a shutdown signal (or until it drains).
+
+    Args:
+        path: Queue database
+        workers: Worker processes
+        concurrency: Documents in flight per worker
+        model_calls: Model calls in flight per worker
+        exit_when_empty: Stop once no job is queued or running
+        grace: Seconds in-flight documents get to finish after SIGINT/SIGTERM
+        stub_model: Run against the scripted local model instead of the configured one
+        stub_failure_rate: Share of stub model calls that fail with a 503
+
+    Returns:
+        Seconds the service ran
+    """
+    JobQueue(path).close()  # create the schema before the workers race to
+    context = multiprocessing.get_context('spawn')
+    stop_event = context.Event()
+    processes = [context.Process(target=_worker_main, name=f'worker-{i}',
+                                 args=(path, f'worker-{i}-{os.getpid()}', concurrency, model_calls, stop_event,
+                                       exit_when_empty, grace, stub_model, stub_failure_rate, i))
+                 for i in range(workers)]
+    previous = {sig: signal.signal(sig, lambda *_: stop_event.set()) for sig in (signal.SIGINT, signal.SIGTERM)}
+    start = time.perf_counter()
+    try:
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+    finally:
+        stop_event.set()
+        for process in processes:
+            process.join(grace + 5)
+            if process.is_alive():
+                process.terminate()
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+    return time.perf_counter() - start
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def service_report(path: str) -> Dict[str, Any]:
+    """
+    Throughput and latency of the jobs in a queue database.
+
+    Returns:
+        Dictionary with job counts by status, docs/sec over the span of the
+        finished jobs, p50/p95/p99 of processing time (last attempt) and of
+        time since enqueue, job and model-call retries, and per-worker totals
+    """
+    connection = sqlite3.connect(path)
+    try:
+        counts = dict(connection.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status'))
+        rows = connection.execute(
+            "SELECT enqueued_at, started_at, finished_at, attempts FROM jobs WHERE status = 'done'").fetchall()
+        span = connection.execute(
+            "SELECT MIN(started_at), MAX(finished_at) FROM jobs WHERE status IN ('done', 'failed')").fetchone()
+        job_retries = connection.execute('SELECT COALESCE(SUM(MAX(attempts - 1, 0)), 0) FROM jobs').fetchone()[0]
+        workers = [dict(zip(('name', 'documents', 'failures', 'model_retries', 'seconds'), row)) for row in
+                   connection.execute('SELECT name, documents, failures, model_retries, stopped_at - started_at '
+                                      'FROM workers ORDER BY name')]
+    finally:
+        connection.close()
+    report: Dict[str, Any] = {'counts': counts, 'job_retries': job_retries,
+                              'model_retries': sum(w['model_retries'] for w in workers), 'workers': workers}
+    if rows:
+        elapsed = span[1] - span[0]
+        report['docs_per_sec'] = len(rows) / elapsed if elapsed > 0 else None
+        for label, values in (('processing', [finished - started for _, started, finished, _ in rows]),
+                              ('end_to_end', [finished - enqueued for enqueued, _, finished, _ in rows])):
+            report[label] = {f'p{pct}_ms': _percentile(values, pct) * 1e3 for pct in (50, 95, 99)}
+    return report
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    """Print a service_report."""
+    counts = report['counts']
+    print(f"jobs: {', '.join(f'{status} {count}' for status, count in sorted(counts.items())) or 'none'}")
+    if report.get('docs_per_sec'):
+        print(f"throughput: {report['docs_per_sec']:.1f} docs/sec")
+    for label in ('processing', 'end_to_end'):
+        if label in report:
+            latency = report[label]
+            print(f"{label.replace('_', ' ')} ms: p50 {latency['p50_ms']:.1f}  p95 {latency['p95_ms']:.1f}"
+                  f"  p99 {latency['p99_ms']:.1f}")
+    print(f"retries: {report['job_retries']} job, {report['model_retries']} model call")
+    for worker in report['workers']:
+        print(f"  {worker['name']}: {worker['documents']} done, {worker['failures']} failed, "
+              f"{worker['model_retries']} model retries")
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    enqueue = commands.add_parser('enqueue', help='add document files to a queue')
+    enqueue.add_argument('queue', help='queue database path')
+    enqueue.add_argument('paths', nargs='+', help='document files or directories')
+
+    def add_service_options(command):
+        command.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='worker processes')
+        command.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                             help='documents in flight per worker')
+        command.add_argument('--model-calls', type=int, default=DEFAULT_MODEL_CALLS,
+                             help='model calls in flight per worker')
+        command.add_argument('--grace', type=float, default=SHUTDOWN_GRACE_SECONDS,
+                             help='seconds in-flight documents get to finish on shutdown')
+        command.add_argument('--stub-model', action='store_true',
+                             help='run against the scripted local model instead of the configured one')
+        command.add_argument('--stub-failure-rate', type=float, default=0.0,
+                             help='share of stub model calls that fail with a 503')
+
+    serve = commands.add_parser('serve', help='run workers until SIGINT/SIGTERM')
+    serve.add_argument('queue', help='queue database path')
+    serve.add_argument('--exit-when-empty', action='store_true', help='stop once every job has finished')
+    add_service_options(serve)
+
+    report = commands.add_parser('report', help='print throughput and latency of a queue')
+    report.add_argument('queue', help='queue database path')
+
+    demo = commands.add_parser('demo', help='enqueue a generated corpus and drain it against the stub model')
+    demo.add_argument('--documents', type=int, default=500)
+    demo.add_argument('--max-bytes', type=int, default=16 * 1024, help='largest generated document')
+    add_service_options(demo)
+    demo.set_defaults(stub_model=True, stub_failure_rate=0.05)
+
+    args = parser.parse_args()
+    if args.command == 'enqueue':
+        paths = [found for path in args.paths
+                 for found in (iter_document_files(path) if os.path.isdir(path) else [path])]
+        documents = []
+        for path in paths:
+            with open(path, encoding='utf-8', errors='replace') as f:
+                documents.append(f.read())
+        queue = JobQueue(args.queue)
+        queue.enqueue(documents, paths)
+        queue.close()
+        print(f"enqueued {len(documents)} documents")
+    elif args.command == 'serve':
+        run_service(args.queue, args.workers, args.concurrency, args.model_calls, args.exit_when_empty,
+                    args.grace, args.stub_model, args.stub_failure_rate)
+        print_report(service_report(args.queue))
+    elif args.command == 'report':
+        print_report(service_report(args.queue))
+    else:
+        from .benchmark_suite import generate_corpus
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'jobs.db')
+            corpus = generate_corpus(args.documents, max_bytes=args.max_bytes)
+            queue = JobQueue(path)
+            queue.enqueue([item['content'] for item in corpus], [item['label'] for item in corpus])
+            queue.close()
+            run_service(path, args.workers, args.concurrency, args.model_calls, True, args.grace,
+                        args.stub_model, args.stub_failure_rate)
+            print_report(service_report(path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Module attributes built on first access instead of at import time.
+
+An agent module registers a builder for each expensive attribute (agents,
+their callbacks, anything that needs ``google.adk``) and hands unknown
+attribute lookups to the registry through a module-level ``__getattr__``
+(PEP 562). Importing the module then runs none of the builders; the first
+``module.root_agent`` or ``from module import root_agent`` builds the
+object, along with whatever its builder asks the registry for, and stores
+it as an ordinary module attribute so later lookups never reach the
+registry again.
+"""
+
+import threading
+from typing import Any, Callable, Dict, Iterable, List, MutableMapping
+
+
+class LazyRegistry:
+    """
+    Builders for the lazily built attributes of one module.
+
+    Usage in a module::
+
+        _lazy = LazyRegistry(globals())
+        __getattr__ = _lazy.module_getattr
+        __dir__ = _lazy.module_dir
+
+        @_lazy.register('root_agent')
+        def _build_root_agent():
+            return Agent(..., sub_agents=[_lazy.get('helper_agent')])
+
+    Builders run at most once, under a lock, so threads that touch an
+    attribute at the same time all get the same object. A builder that
+    raises leaves the attribute unbuilt; the next access tries again.
+    """
+
+    def __init__(self, namespace: MutableMapping[str, Any]):
+        self._namespace = namespace
+        self._builders: Dict[str, Callable[[], Any]] = {}
+        self._building: List[str] = []
+        self._lock = threading.RLock()
+
+    def register(self, name: str) -> Callable[[Callable[[], Any]], Callable[[], Any]]:
+        """
+        Decorator registering a zero-argument builder for a module attribute.
+
+        Args:
+            name: Attribute the builder's return value is stored under; must
+                not already be defined in the module
+
+        Returns:
+            Decorator that returns the builder unchanged
+        """
+        if name in self._namespace:
+            raise ValueError(f"{name!r} is already defined in {self._namespace.get('__name__')}")
+
+        def decorator(builder: Callable[[], Any]) -> Callable[[], Any]:
+            self._builders[name] = builder
+            return builder
+        return decorator
+
+    @property
+    def names(self) -> Iterable[str]:
+        """Names of every registered attribute, built or not."""
+        return self._builders.keys()
+
+    def is_built(self, name: str) -> bool:
+        """Whether a registered attribute has been built."""
+        return name in self._builders and name in self._namespace
+
+    def get(self, name: str) -> Any:
+        """
+        Return a registered attribute, building it on first use.
+
+        Args:
+            name: Registered attribute name
+
+        Returns:
+            The object its builder returned
+        """
+        if name in self._namespace:
+            return self._namespace[name]
+        if name not in self._builders:
+            raise KeyError(name)
+        with self._lock:
+            if name in self._namespace:  # built by another thread while this one waited
+                return self._namespace[name]
+            if name in self._building:
+                raise RuntimeError("lazy attributes built from each other: "
+                                   + ' -> '.join(self._building[self._building.index(name):] + [name]))
+            self._building.append(name)
+            try:
+                value = self._builders[name]()
+            finally:
+                self._building.pop()
+            self._namespace[name] = value
+            return value
+
+    def module_getattr(self, name: str) -> Any:
+        """Module ``__getattr__``: builds registered names, raises AttributeError for the rest."""
+        if name not in self._builders:
+            raise AttributeError(f"module {self._namespace.get('__name__')!r} has no attribute {name!r}")
+        return self.get(name)
+
+    def module_dir(self) -> List[str]:
+        """Module ``__dir__``: defined names plus registered names not built yet."""
+        return sorted(set(self._namespace) | set(self._builders))
@@ -0,0 +1,270 @@
+"""
+Deterministic local model backend for running the agents offline.
+
+``LocalLlm`` stands in for Gemini anywhere ADK accepts a model: assign an
+instance to an agent's ``model`` (or use ``install_local_model`` for a whole
+agent tree), or set ``ADK_MODEL=local-mock`` so the agent packages, which
+take their model name from ``resolve_model``, use the registered ``local-*``
+model name.
+
+This is a module beside the agent packages, not a package, so ADK does not
+list it as an agent.
+"""
+
+import asyncio
+import os
+import random
+from typing import Any, AsyncGenerator, Callable, Dict, Iterable, List, Optional, Tuple
+
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.adk.models.registry import LLMRegistry
+from google.adk.tools.google_search_tool import GoogleSearchTool
+from google.genai import types
+from pydantic import PrivateAttr
+
+
+# Model the agent packages use when ADK_MODEL is unset
+DEFAULT_MODEL = 'gemini-2.0-flash'
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough Gemini token count (about four characters per token)."""
+    return max(1, len(text) // 4)
+
+
+def request_tokens(llm_request: LlmRequest) -> int:
+    """Estimated prompt tokens of a model request: system instruction plus contents."""
+    config = llm_request.config
+    text = str(config.system_instruction or '') if config else ''
+    for content in llm_request.contents:
+        for part in content.parts or []:
+            if part.text:
+                text += part.text
+            elif part.function_call:
+                text += str(part.function_call.args)
+            elif part.function_response:
+                text += str(part.function_response.response)
+    return estimate_tokens(text)
+
+
+def text_response(text: str) -> LlmResponse:
+    """Model turn that replies with text."""
+    return LlmResponse(content=types.Content(role='model', parts=[types.Part(text=text)]))
+
+
+def function_call_response(*calls: Tuple[str, Dict[str, Any]], **args) -> LlmResponse:
+    """
+    Model turn that calls one or more tools.
+
+    Either ``function_call_response('tool', arg=1)`` for a single call or
+    ``function_call_response(('a', {...}), ('b', {...}))`` for parallel calls.
+    """
+    if calls and isinstance(calls[0], str):
+        calls = ((calls[0], args),)
+    return LlmResponse(content=types.Content(role='model', parts=[
+        types.Part(function_call=types.FunctionCall(name=name, args=call_args)) for name, call_args in calls
+    ]))
+
+
+def _user_text(llm_request: LlmRequest) -> str:
+    """Text of the most recent user message that is not a tool response."""
+    for content in reversed(llm_request.contents):
+        if content.role == 'user':
+            text = ''.join(part.text for part in content.parts or [] if part.text)
+            if text:
+                return text
+    return ''
+
+
+def follow_tools(llm_request: LlmRequest) -> LlmResponse:
+    """
+    Default responder: call each offered tool once, then summarize.
+
+    Tools (other than transfer_to_agent) that have not been called since the
+    last user message are called in declaration order, with every required
+    string parameter set to the user's message. Once all have answered, the
+    model replies with a short text summary.
+    """
+    called = set()
+    for content in reversed(llm_request.contents):
+        if content.role == 'user' and any(part.text for part in content.parts or []):
+            break
+        for part in content.parts or []:
+            if part.function_call:
+                called.add(part.function_call.name)
+
+    user_text = _user_text(llm_request)
+    for name, tool in llm_request.tools_dict.items():
+        if name == 'transfer_to_agent' or name in called:
+            continue
+        declaration = tool._get_declaration()
+        schema = (declaration.parameters_json_schema if declaration else None) or {}
+        properties = schema.get('properties', {}) if isinstance(schema, dict) else {}
+        args = {param: user_text for param in schema.get('required', []) if
+                properties.get(param, {}).get('type') == 'string'} if isinstance(schema, dict) else {}
+        return function_call_response(name, **args)
+    return text_response(f'Done: {len(called)} tool call(s) for a {len(user_text)}-character request.')
+
+
+class ScriptedResponder:
+    """Replays a fixed list of responses in order, optionally cycling."""
+
+    def __init__(self, responses: Iterable[LlmResponse], cycle: bool = False):
+        self.responses: List[LlmResponse] = list(responses)
+        self.cycle = cycle
+        self._next = 0
+
+    def __call__(self, llm_request: LlmRequest) -> LlmResponse:
+        if self._next >= len(self.responses):
+            if not self.cycle:
+                raise IndexError('ScriptedResponder ran out of responses')
+            self._next = 0
+        response = self.responses[self._next]
+        self._next += 1
+        return response.model_copy(deep=True)
+
+
+class LatencyModel:
+    """
+    Simulated model latency: time to first token plus output time at a token rate.
+
+    ``distribution`` shapes the time to first token around ``first_token``
+    seconds: 'constant', 'uniform' (+/- ``spread`` fraction), 'lognormal'
+    (median ``first_token``, sigma ``spread``) or 'pareto' (minimum
+    ``first_token``, shape 1 / ``spread``) for heavy tails.
+    """
+
+    def __init__(self, first_token: float = 0.0, distribution: str = 'constant',
+                 spread: float = 0.5, tokens_per_second: Optional[float] = None):
+        if distribution not in ('constant', 'uniform', 'lognormal', 'pareto'):
+            raise ValueError(f'Unknown latency distribution: {distribution}')
+        self.first_token = first_token
+        self.distribution = distribution
+        self.spread = spread
+        self.tokens_per_second = tokens_per_second
+
+    def time_to_first_token(self, rng: random.Random) -> float:
+        if self.distribution == 'uniform':
+            return self.first_token * rng.uniform(1 - self.spread, 1 + self.spread)
+        if self.distribution == 'lognormal':
+            return self.first_token * rng.lognormvariate(0, self.spread)
+        if self.distribution == 'pareto':
+            return self.first_token * rng.paretovariate(1 / self.spread)
+        return self.first_token
+
+    def output_time(self, tokens: int) -> float:
+        return tokens / self.tokens_per_second if self.tokens_per_second else 0.0
+
+
+class LocalLlm(BaseLlm):
+    """
+    Offline model that answers with a responder function after a simulated delay.
+
+    Responses carry estimated usage metadata, and the instance counts calls and
+    tokens so benchmarks can separate orchestration cost from model time.
+    Streaming requests yield the text in partial chunks paced by the token rate.
+    """
+
+    model: str = 'local-mock'
+    responder: Callable[[LlmRequest], LlmResponse] = follow_tools
+    latency: LatencyModel = LatencyModel()
+    seed: int = 0
+
+    calls: int = 0
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+
+    _random: random.Random = PrivateAttr()
+
+    def model_post_init(self, __context: Any) -> None:
+        self._random = random.Random(self.seed)
+
+    @classmethod
+    def supported_models(cls) -> List[str]:
+        return [r'local-.*']
+
+    def reset_stats(self) -> None:
+        self.calls = self.prompt_tokens = self.output_tokens = 0
+
+    async def generate_content_async(self, llm_request: LlmRequest,
+                                     stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        self.calls += 1
+        prompt_tokens = request_tokens(llm_request)
+        response = self.responder(llm_request)
+        output_tokens = estimate_tokens(str(response.content))
+        self.prompt_tokens += prompt_tokens
+        self.output_tokens += output_tokens
+        response.usage_metadata = types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=prompt_tokens, candidates_token_count=output_tokens,
+            total_token_count=prompt_tokens + output_tokens)
+
+        delay = self.latency.time_to_first_token(self._random)
+        if delay:
+            await asyncio.sleep(delay)
+        text = ''.join(part.text for part in response.content.parts if part.text) if response.content else ''
+        if stream and text:
+            words = text.split(' ')
+            for i, word in enumerate(words):
+                chunk_delay = self.latency.output_time(estimate_tokens(word))
+                if chunk_delay:
+                    await asyncio.sleep(chunk_delay)
+                yield LlmResponse(content=types.Content(role='model', parts=[
+                    types.Part(text=word if i == len(words) - 1 else word + ' ')]), partial=True)
+        else:
+            output_delay = self.latency.output_time(output_tokens)
+            if output_delay:
+                await asyncio.sleep(output_delay)
+        yield response
+
+
+def install_local_model(root_agent: Any, llm: BaseLlm) -> Dict[str, Any]:
+    """
+    Point every agent in a tree at ``llm``.
+
+    Returns:
+        The previous model of each agent by name, for restoring afterwards
+    """
+    previous = {}
+    pending = [root_agent]
+    while pending:
+        agent = pending.pop()
+        if hasattr(agent, 'model'):
+            previous[agent.name] = agent.model
+            agent.model = llm
+        pending.extend(getattr(agent, 'sub_agents', None) or [])
+    return previous
+
+
+def resolve_model(default: str = DEFAULT_MODEL) -> str:
+    """
+    Model name for the agents of a package: ``ADK_MODEL`` when set, else ``default``.
+
+    ``local-*`` names resolve to ``LocalLlm`` through ADK's model registry,
+    which this module registers on import.
+    """
+    return os.environ.get('ADK_MODEL', default)
+
+
+class LocalGoogleSearchTool(GoogleSearchTool):
+    """
+    ADK's built-in Google Search tool, accepted by the ``local-*`` models as well.
+
+    ADK attaches the built-in search only to Gemini model ids unless the
+    process-wide ``ADK_DISABLE_GEMINI_MODEL_ID_CHECK`` is set. This tool
+    attaches it to local model names explicitly, where it is ignored, and
+    leaves every other model to ADK's own check.
+    """
+
+    async def process_llm_request(self, *, tool_context: Any, llm_request: LlmRequest) -> None:
+        if not (self.model or llm_request.model or '').startswith('local-'):
+            return await super().process_llm_request(tool_context=tool_context, llm_request=llm_request)
+        llm_request.config = llm_request.config or types.GenerateContentConfig()
+        llm_request.config.tools = llm_request.config.tools or []
+        llm_request.config.tools.append(types.Tool(google_search=types.GoogleSearch()))
+
+
+# Drop-in for google.adk.tools.google_search
+google_search = LocalGoogleSearchTool()
+
+
+LLMRegistry.register(LocalLlm)
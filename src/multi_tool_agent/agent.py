@@ -1,21 +1,20 @@
 from datetime import datetime
 from typing import Any, Dict
-from google.adk.agents import Agent
 
+from lazy_registry import LazyRegistry
 
-def get_weather(location: str) -> Dict[str, Any]:
+
+# The agent is built on first access, so importing the tools needs no google.adk
+_lazy = LazyRegistry(globals())
+__getattr__ = _lazy.module_getattr
+__dir__ = _lazy.module_dir
+
+
+async def get_weather(location: str) -> Dict[str, Any]:
     """Get current weather for a location."""
-    # Mock weather data for demonstration
-    # In a real implementation, you would call a weather API
-    mock_weather = {
-        "location": location,
-        "temperature": "22°C",
-        "condition": "Partly Cloudy",
-        "humidity": "65%",
-        "wind": "10 km/h NW",
-        "description": f"Current weather in {location} is partly cloudy with a temperature of 22°C"
-    }
-    return mock_weather
+    # Cached and coalesced across sessions by the shared provider; mock data unless WEATHER_API_URL is set
+    from weather_provider import default_provider  # imported on first call, keeping this module's import light
+    return await default_provider.get_weather(location)
 
 
 def get_current_time() -> Dict[str, Any]:
@@ -30,14 +29,20 @@ def get_current_time() -> Dict[str, Any]:
 
 
 # Create the Weather Agent using Google ADK
-root_agent = Agent(
-    name="weather_time_agent",
-    model="gemini-2.0-flash",
-    description=(
-        "Agent to answer questions about the time and weather in a city."
-    ),
-    instruction=(
-        "You are a helpful agent who can answer user questions about the time and weather in a city."
-    ),
-    tools=[get_weather, get_current_time],
-)
\ No newline at end of file
+@_lazy.register('root_agent')
+def _build_root_agent():
+    from google.adk.agents import Agent
+    from local_llm import resolve_model
+    from parallel_tools import threaded_tool
+    return Agent(
+        name="weather_time_agent",
+        model=resolve_model(),
+        description=(
+            "Agent to answer questions about the time and weather in a city."
+        ),
+        instruction=(
+            "You are a helpful agent who can answer user questions about the time and weather in a city."
+        ),
+        # Both tools of a "time and weather" turn run at once: get_weather on the event loop, get_current_time on a thread
+        tools=[get_weather, threaded_tool(get_current_time)],
+    )
@@ -0,0 +1,64 @@
+"""
+Synchronous agent tools run on a bounded thread pool, so the calls of one model turn overlap.
+
+ADK runs the function calls of a model turn as concurrent tasks and returns
+their responses in call order, but a synchronous function tool runs on the
+event loop itself, blocking every other call of the turn, unless the run's
+``RunConfig`` sets ``tool_thread_pool_config`` (``adk web`` and ``adk run``
+do not). ``threaded_tool`` wraps a synchronous tool in an async function
+with the same name, signature and docstring that runs it on a shared pool,
+so the tool overlaps with the turn's other calls under any runner. Async
+tools already run concurrently on the event loop and need no wrapper.
+"""
+
+import asyncio
+import contextvars
+import functools
+import inspect
+import os
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+
+# Threads shared by every threaded tool in the process; calls beyond this wait for a free thread
+TOOL_THREAD_POOL_WORKERS = int(os.environ.get('AGENT_TOOL_THREADS', '8'))
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def tool_thread_pool() -> ThreadPoolExecutor:
+    """The process-wide tool thread pool, created on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=TOOL_THREAD_POOL_WORKERS, thread_name_prefix='agent-tool')
+    return _pool
+
+
+def threaded_tool(func: Callable[..., Any], executor: Optional[Executor] = None) -> Callable[..., Any]:
+    """
+    Wrap a synchronous tool so each call runs on a thread pool instead of the event loop.
+
+    The wrapper keeps the tool's name, docstring and signature (ADK reads
+    them through ``__wrapped__``), so the declaration the model sees and the
+    ``tool_context`` injection are unchanged. Each call runs in a copy of the
+    caller's context variables. A call that is cancelled stops waiting, but
+    a thread that has already started runs the tool to completion.
+
+    Args:
+        func: Synchronous tool function
+        executor: Pool to run calls on; defaults to the shared tool_thread_pool()
+
+    Returns:
+        Async tool function
+    """
+    if inspect.iscoroutinefunction(func):
+        raise TypeError(f"{func.__name__} is already async; pass it to the agent as is")
+
+    @functools.wraps(func)
+    async def run_in_pool(*args, **kwargs):
+        call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(executor or tool_thread_pool(), call)
+    return run_in_pool
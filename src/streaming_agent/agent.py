@@ -1,12 +1,21 @@
-from google.adk.agents import Agent
-from google.adk.tools import google_search
+from lazy_registry import LazyRegistry
+
+
+# The agent is built on first access, so importing this module needs no google.adk
+_lazy = LazyRegistry(globals())
+__getattr__ = _lazy.module_getattr
+__dir__ = _lazy.module_dir
 
 
 # Create the streaming agent with Google Search tool
-root_agent = Agent(
-    name="basic_search_agent",
-    model="gemini-2.0-flash",  # Using supported streaming-capable Gemini model
-    description="Agent to answer questions using Google Search.",
-    instruction="You are an expert researcher. You always stick to the facts.",
-    tools=[google_search]
-)
\ No newline at end of file
+@_lazy.register('root_agent')
+def _build_root_agent():
+    from google.adk.agents import Agent
+    from local_llm import google_search, resolve_model  # ADK's google_search, also accepted by the local-* models
+    return Agent(
+        name="basic_search_agent",
+        model=resolve_model(),  # ADK_MODEL if set (e.g. a local-* model), otherwise gemini-2.0-flash
+        description="Agent to answer questions using Google Search.",
+        instruction="You are an expert researcher. You always stick to the facts.",
+        tools=[google_search]
+    )
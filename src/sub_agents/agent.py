@@ -1,20 +1,19 @@
 from typing import Any, Dict
-from google.adk.agents import Agent
 
+from lazy_registry import LazyRegistry
 
-def get_weather(location: str) -> Dict[str, Any]:
+
+# Agents are built on first access, so importing the tools needs no google.adk
+_lazy = LazyRegistry(globals())
+__getattr__ = _lazy.module_getattr
+__dir__ = _lazy.module_dir
+
+
+async def get_weather(location: str) -> Dict[str, Any]:
     """Get current weather for a location."""
-    # Mock weather data for demonstration
-    # In a real implementation, you would call a weather API
-    mock_weather = {
-        "location": location,
-        "temperature": "22°C",
-        "condition": "Partly Cloudy",
-        "humidity": "65%",
-        "wind": "10 km/h NW",
-        "description": f"Current weather in {location} is partly cloudy with a temperature of 22°C"
-    }
-    return mock_weather
+    # Cached and coalesced across sessions by the shared provider; mock data unless WEATHER_API_URL is set
+    from weather_provider import default_provider  # imported on first call, keeping this module's import light
+    return await default_provider.get_weather(location)
 
 
 def say_hello(name: str = "there") -> Dict[str, Any]:
@@ -40,36 +39,49 @@ def say_goodbye(name: str = "there") -> Dict[str, Any]:
 
 
 # Create specialized sub-agents
-greeting_agent = Agent(
-    name="greeting_specialist",
-    model="gemini-2.0-flash",
-    description="Specialist agent for greetings and welcoming users.",
-    instruction="You are a friendly greeting specialist. Always be warm and welcoming when greeting users.",
-    tools=[say_hello]
-)
+@_lazy.register('greeting_agent')
+def _build_greeting_agent():
+    from google.adk.agents import Agent
+    from local_llm import resolve_model
+    return Agent(
+        name="greeting_specialist",
+        model=resolve_model(),
+        description="Specialist agent for greetings and welcoming users.",
+        instruction="You are a friendly greeting specialist. Always be warm and welcoming when greeting users.",
+        tools=[say_hello]
+    )
+
 
-farewell_agent = Agent(
-    name="farewell_specialist",
-    model="gemini-2.0-flash",
-    description="Specialist agent for farewells and goodbyes.",
-    instruction="You are a farewell specialist. Always be kind and thankful when saying goodbye to users.",
-    tools=[say_goodbye]
-)
+@_lazy.register('farewell_agent')
+def _build_farewell_agent():
+    from google.adk.agents import Agent
+    from local_llm import resolve_model
+    return Agent(
+        name="farewell_specialist",
+        model=resolve_model(),
+        description="Specialist agent for farewells and goodbyes.",
+        instruction="You are a farewell specialist. Always be kind and thankful when saying goodbye to users.",
+        tools=[say_goodbye]
+    )
 
 
 # Create the root agent with weather tool and sub-agent invocation capabilities
-root_agent = Agent(
-    name="weather_greeting_root_agent",
-    model="gemini-2.0-flash",
-    description=(
-        "Root agent that can handle weather queries and has access to greeting and farewell specialist sub-agents."
-    ),
-    instruction=(
-        "You are a helpful assistant that can provide weather information and handle greetings/farewells. "
-        "Use the weather tool for weather queries. "
-        "You have access to greeting and farewell specialist agents for handling social interactions. "
-        "Always provide helpful and friendly responses."
-    ),
-    tools=[get_weather],
-    sub_agents=[greeting_agent, farewell_agent]
-)
\ No newline at end of file
+@_lazy.register('root_agent')
+def _build_root_agent():
+    from google.adk.agents import Agent
+    from local_llm import resolve_model
+    return Agent(
+        name="weather_greeting_root_agent",
+        model=resolve_model(),
+        description=(
+            "Root agent that can handle weather queries and has access to greeting and farewell specialist sub-agents."
+        ),
+        instruction=(
+            "You are a helpful assistant that can provide weather information and handle greetings/farewells. "
+            "Use the weather tool for weather queries. "
+            "You have access to greeting and farewell specialist agents for handling social interactions. "
+            "Always provide helpful and friendly responses."
+        ),
+        tools=[get_weather],
+        sub_agents=[_lazy.get('greeting_agent'), _lazy.get('farewell_agent')]
+    )
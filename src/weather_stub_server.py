@@ -0,0 +1,168 @@
+"""
+Local stand-in for the weather API, for tests and benchmarks.
+
+Serves ``GET /weather?location=...`` after a simulated latency, with
+keep-alive HTTP/1.1 connections, and ``GET /stats`` with the number of
+weather requests and connections seen. Run it on its own:
+    python weather_stub_server.py --port 8765 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import random
+import zlib
+from typing import Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+
+# Median seconds before a weather reply is sent
+STUB_LATENCY = 0.05
+# Log-normal sigma of the latency; 0 makes every reply take exactly STUB_LATENCY
+STUB_JITTER = 0.3
+_CONDITIONS = ['Sunny', 'Partly Cloudy', 'Overcast', 'Light Rain', 'Thunderstorms', 'Snow', 'Fog']
+_WINDS = ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW']
+
+
+def stub_conditions(location: str) -> dict:
+    """Deterministic conditions for a location, so repeated lookups agree."""
+    seed = zlib.crc32(location.encode('utf-8'))
+    return {
+        'temperature': f"{seed % 45 - 10}°C",
+        'condition': _CONDITIONS[seed % len(_CONDITIONS)],
+        'humidity': f"{30 + seed % 65}%",
+        'wind': f"{seed % 40} km/h {_WINDS[seed % len(_WINDS)]}",
+    }
+
+
+class WeatherStubServer:
+    """
+    Asyncio HTTP server answering like the weather API.
+
+    Usage::
+
+        async with WeatherStubServer(latency=0.01) as server:
+            provider = WeatherProvider(server.url)
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0,
+                 latency: float = STUB_LATENCY, jitter: float = STUB_JITTER, seed: Optional[int] = None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+        self.connections = 0
+        self._random = random.Random(seed)
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.host}:{self.port}'
+
+    async def start(self) -> str:
+        """Start listening and return the base URL."""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, backlog=4096)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.url
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self) -> 'WeatherStubServer':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                keep_alive = True
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = header.decode('latin-1').partition(':')
+                    if name.strip().lower() == 'connection' and value.strip().lower() == 'close':
+                        keep_alive = False
+                status, body = await self._respond(request_line.decode('latin-1').split())
+                writer.write(b'HTTP/1.1 %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n%s\r\n'
+                             % (status.encode(), len(body), b'' if keep_alive else b'Connection: close\r\n') + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, request: list) -> Tuple[str, bytes]:
+        if len(request) < 2 or request[0] != 'GET':
+            return '405 Method Not Allowed', b'{}'
+        url = urlsplit(request[1])
+        if url.path == '/stats':
+            return '200 OK', json.dumps({'requests': self.requests, 'connections': self.connections}).encode()
+        if url.path != '/weather':
+            return '404 Not Found', b'{}'
+        location = parse_qs(url.query).get('location', [''])[0]
+        if not location:
+            return '400 Bad Request', json.dumps({'error': 'location is required'}).encode()
+        self.requests += 1
+        delay = self.latency * (self._random.lognormvariate(0, self.jitter) if self.jitter else 1.0)
+        await asyncio.sleep(delay)
+        return '200 OK', json.dumps({'location': location, **stub_conditions(location)}).encode('utf-8')
+
+
+def _serve_process(ready, host: str, latency: float, jitter: float) -> None:
+    async def serve():
+        server = WeatherStubServer(host, 0, latency, jitter)
+        ready.put(await server.start())
+        await asyncio.Event().wait()
+    asyncio.run(serve())
+
+
+def start_in_process(latency: float = STUB_LATENCY, jitter: float = STUB_JITTER,
+                     host: str = '127.0.0.1') -> Tuple[str, multiprocessing.Process]:
+    """
+    Run a stub server in a child process, so it does not share the caller's CPU time or event loop.
+
+    Returns:
+        The server's base URL and its process; terminate the process when done
+    """
+    context = multiprocessing.get_context('spawn')
+    ready = context.Queue()
+    process = context.Process(target=_serve_process, args=(ready, host, latency, jitter), daemon=True)
+    process.start()
+    return ready.get(timeout=30), process
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=STUB_LATENCY, help="median reply delay in seconds")
+    parser.add_argument('--jitter', type=float, default=STUB_JITTER, help="log-normal sigma of the delay")
+    args = parser.parse_args()
+
+    async def serve():
+        server = WeatherStubServer(args.host, args.port, args.latency, args.jitter)
+        print(f"Weather stub serving {await server.start()}/weather?location=...")
+        await asyncio.Event().wait()
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
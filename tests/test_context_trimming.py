@@ -0,0 +1,131 @@
+"""
+Tests for the document excerpts sent to the classification and extraction specialists.
+"""
+
+import functools
+from types import SimpleNamespace
+
+import numpy as np
+from google.adk.models import LlmRequest
+from google.genai import types
+
+from document_classification_agent.context_trimming import (
+    ContextTrimmer,
+    ImageCompactor,
+    classification_excerpt,
+    extraction_excerpt,
+    single_shot_excerpt,
+)
+from document_classification_agent.field_extractor import extract_fields
+from document_classification_agent.image_intake import encode_png
+from document_classification_agent.keyword_matcher import DEFAULT_MATCHER
+from document_classification_agent.sample_data import SAMPLE_DOCUMENTS
+
+FILLER = 'Page scanned at 300 dpi. Lorem ipsum dolor sit amet, consectetur adipiscing elit.\n' * 200
+
+
+def test_classification_excerpt_keeps_keyword_scores():
+    for content in SAMPLE_DOCUMENTS.values():
+        padded = content + FILLER + content
+        excerpt = classification_excerpt(padded)
+        assert len(excerpt) < len(padded)
+        assert DEFAULT_MATCHER.score(excerpt.lower()) == DEFAULT_MATCHER.score(padded.lower())
+
+
+def test_extraction_excerpt_trims_fully_labelled_documents():
+    content = SAMPLE_DOCUMENTS['kyc'] + FILLER
+    excerpt = extraction_excerpt('kyc', content)
+    assert len(excerpt) < len(content) // 10
+    assert extract_fields('kyc', excerpt)['extracted_fields'] == extract_fields('kyc', content)['extracted_fields']
+
+
+def test_extraction_excerpt_keeps_likely_regions_of_missing_fields():
+    rewrites = [
+        ('kyc', 'Phone: (555) 123-4567\n', 'Reach the customer on (555) 123-4567 in office hours.', '(555) 123-4567'),
+        ('passport', 'Place of Birth: CHICAGO, IL, USA\n', 'The bearer was born in CHICAGO, IL, USA.', 'CHICAGO'),
+        ('w9', 'Zip Code: 90210\n', 'Mail to 456 Business Ave, Los Angeles, CA 90210.', '90210'),
+    ]
+    for document_type, line, prose, value in rewrites:
+        content = SAMPLE_DOCUMENTS[document_type].replace(line, '') + FILLER + prose + '\n' + FILLER
+        assert extract_fields(document_type, content)['missing_fields']
+        excerpt = extraction_excerpt(document_type, content)
+        assert len(excerpt) < len(content) // 10
+        assert prose in excerpt
+
+
+def test_extraction_excerpt_leaves_unsupported_types_alone():
+    content = SAMPLE_DOCUMENTS['unknown'] + FILLER
+    assert extraction_excerpt('unknown', content) == content
+
+
+def test_single_shot_excerpt_follows_the_top_scoring_type():
+    complete = SAMPLE_DOCUMENTS['w9'] + FILLER
+    excerpt = single_shot_excerpt(complete)
+    assert len(excerpt) < len(complete)
+    assert extract_fields('w9', excerpt)['extracted_fields'] == extract_fields('w9', complete)['extracted_fields']
+
+    incomplete = SAMPLE_DOCUMENTS['w9'].replace('Zip Code: 90210\n', '') + FILLER + 'Mail to CA 90210.\n'
+    excerpt = single_shot_excerpt(incomplete)
+    assert len(excerpt) < len(incomplete) and 'Mail to CA 90210.' in excerpt
+
+
+def test_trimmer_keeps_excerpts_by_hash_without_the_documents():
+    calls = []
+
+    def excerpt(content):
+        calls.append(content)
+        return extraction_excerpt('kyc', content)
+
+    trimmer = ContextTrimmer(excerpt, cache_size=2)
+    trimmed = SAMPLE_DOCUMENTS['kyc'] + FILLER
+    whole = 'Handwritten note with nothing to extract.'
+    for _ in range(2):
+        assert trimmer._excerpt_for(trimmed) == extraction_excerpt('kyc', trimmed)
+        assert trimmer._excerpt_for(whole) is None
+    assert len(calls) == 2
+    assert all(value is None or len(value) < len(trimmed) // 10 for value in trimmer._excerpts.values())
+    assert not any(isinstance(key, str) for key in trimmer._excerpts)
+
+
+def test_trimmer_leaves_the_session_event_args_untouched():
+    content = SAMPLE_DOCUMENTS['kyc'] + FILLER
+    call = types.Part(function_call=types.FunctionCall(name='extract_kyc_with_llm',
+                                                       args={'document_content': content}))
+    event_content = types.Content(role='model', parts=[call])
+    # ADK copies the contents and parts of session events into the request, but not the args within them
+    request_content = event_content.model_copy(update={'parts': [part.model_copy() for part in event_content.parts]})
+    request = LlmRequest(contents=[request_content])
+    trimmer = ContextTrimmer(functools.partial(extraction_excerpt, 'kyc'))
+    trimmer(SimpleNamespace(user_content=types.Content(role='user', parts=[types.Part(text=content)])), request)
+
+    assert request.contents[0].parts[0].function_call.args['document_content'] == extraction_excerpt('kyc', content)
+    assert event_content.parts[0].function_call.args == {'document_content': content}
+    assert trimmer.characters_saved == len(content) - len(extraction_excerpt('kyc', content))
+
+
+def _scan_pages(seed, count=2):
+    rng = np.random.default_rng(seed)
+    return tuple(encode_png(rng.integers(0, 256, size=(400, 300), dtype=np.uint8)) for _ in range(count))
+
+
+def test_image_compactor_keeps_scans_by_digest_within_a_byte_budget():
+    compactor = ImageCompactor()
+    first = _scan_pages(0)
+    compactor._compact(first, None)
+    (key, (scan, size, _)), = compactor._scans.items()
+    compactor._compact(first, 'passport')
+    assert list(compactor._scans) == [key] and compactor._scans[key][0] is scan
+    assert len(key) == 32 and compactor._cached_bytes == compactor._scans[key][1] > size
+    # The same pages in new objects, as after a copy of the request, are found by their digest
+    compactor._compact(tuple(bytes(bytearray(page)) for page in first), 'passport')
+    assert list(compactor._scans) == [key] and compactor._scans[key][0] is scan
+
+    # Room for one scan: the older one is dropped, and one larger than the budget is not kept
+    budget = compactor._cached_bytes + 1000
+    compactor = ImageCompactor(cache_bytes=budget)
+    compactor._compact(first, 'passport')
+    compactor._compact(_scan_pages(1), 'passport')
+    kept = list(compactor._scans)
+    assert len(kept) == 1 and key not in kept and compactor._cached_bytes <= budget
+    compactor._compact(_scan_pages(2, count=4), 'passport')
+    assert list(compactor._scans) == kept
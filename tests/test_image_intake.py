@@ -0,0 +1,46 @@
+"""
+Tests for locating, hashing and decoding scan pages.
+"""
+
+import base64
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+from document_classification_agent.image_intake import compact_scan, encode_png, load_pages, scan_summary
+
+
+def _page(seed, shape=(120, 90)):
+    return np.random.default_rng(seed).integers(0, 256, size=shape, dtype=np.uint8)
+
+
+def _with_idat(png, data):
+    """The PNG with its IDAT payload replaced, CRC recomputed."""
+    start = png.index(b'IDAT') - 4
+    length = struct.unpack('>I', png[start:start + 4])[0]
+    chunk = struct.pack('>I', len(data)) + b'IDAT' + data + struct.pack('>I', zlib.crc32(b'IDAT' + data))
+    return png[:start] + chunk + png[start + 12 + length:]
+
+
+def test_corrupt_and_truncated_pngs_raise_value_error():
+    png = encode_png(_page(0))
+    corrupt = _with_idat(png, b'not a zlib stream at all')
+    short_stream = _with_idat(png, zlib.compress(b'\x00' * 50))
+    truncated = png[:png.index(b'IDAT') + 40]
+    for data in (corrupt, short_stream, truncated, png[:20]):
+        with pytest.raises(ValueError, match='malformed PNG'):
+            compact_scan(data)
+    with pytest.raises(ValueError, match='malformed PNG'):
+        scan_summary(base64.b64encode(corrupt).decode())
+
+
+def test_tiny_pages_hash_without_warnings():
+    pages = load_pages([encode_png(_page(seed, shape)) for seed, shape in
+                        enumerate([(5, 3), (5, 3), (1, 1), (120, 90)])])
+    with np.errstate(all='raise'):
+        hashes = [page.difference_hash() for page in pages]
+    assert hashes[0] != hashes[1]
+    summary = compact_scan([encode_png(_page(seed, (6, 4))) for seed in range(3)])
+    assert summary['pages'] == 3 and summary['parts']
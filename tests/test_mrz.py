@@ -0,0 +1,70 @@
+"""
+Tests for the TD3 machine-readable zone parser.
+"""
+
+from document_classification_agent.mrz import check_digit, find_td3, find_td3_span, format_td3, parse_td3
+
+# Specimen passport from ICAO Doc 9303 part 4
+SPECIMEN_LINE1 = 'P<UTOERIKSSON<<ANNA<MARIA<<<<<<<<<<<<<<<<<<<'
+SPECIMEN_LINE2 = 'L898902C36UTO7408122F1204159ZE184226B<<<<<10'
+
+
+def test_check_digit_matches_icao_specimen():
+    assert check_digit('L898902C3') == '6'
+    assert check_digit('740812') == '2'
+    assert check_digit('120415') == '9'
+    assert check_digit('ZE184226B<<<<<') == '1'
+    assert check_digit('L898902C36' + '7408122' + '120415' + '9ZE184226B<<<<<1') == '0'
+
+
+def test_check_digit_counts_filler_as_zero():
+    assert check_digit('<<<<<<<<<') == '0'
+    assert check_digit('AB<') == check_digit('AB0')
+
+
+def test_parse_td3_reads_specimen():
+    parsed = parse_td3(SPECIMEN_LINE1, SPECIMEN_LINE2)
+    assert parsed == {
+        'document_code': 'P',
+        'issuing_state': 'UTO',
+        'passport_number': 'L898902C3',
+        'surname': 'ERIKSSON',
+        'given_names': 'ANNA MARIA',
+        'nationality': 'UTO',
+        'date_of_birth': '1974-08-12',
+        'sex': 'F',
+        'date_of_expiry': '2012-04-15',
+        'personal_number': 'ZE184226B',
+    }
+
+
+def test_parse_td3_rejects_each_bad_check_digit():
+    # Passport number, birth date, expiry date, personal number and composite check digits
+    for position in (9, 19, 27, 42, 43):
+        digit = SPECIMEN_LINE2[position]
+        corrupted = SPECIMEN_LINE2[:position] + str((int(digit) + 1) % 10) + SPECIMEN_LINE2[position + 1:]
+        assert parse_td3(SPECIMEN_LINE1, corrupted) is None, position
+
+
+def test_parse_td3_rejects_wrong_line_length():
+    assert parse_td3(SPECIMEN_LINE1[:-1], SPECIMEN_LINE2) is None
+
+
+def test_format_td3_round_trips():
+    lines = format_td3('X1234567', "O'Brien", 'Mary Ann', 'IRL', '850315', 'F', '300101', personal_number='')
+    parsed = parse_td3(*lines.split('\n'))
+    assert parsed['passport_number'] == 'X1234567'
+    assert parsed['surname'] == 'O BRIEN'
+    assert parsed['given_names'] == 'MARY ANN'
+    assert parsed['date_of_birth'] == '1985-03-15'
+    assert parsed['personal_number'] == ''
+
+
+def test_find_td3_skips_invalid_zone_and_reads_bytes():
+    invalid = SPECIMEN_LINE1 + '\n' + SPECIMEN_LINE2[:9] + '0' + SPECIMEN_LINE2[10:]
+    text = f"PASSPORT\n{invalid}\nnotes\n{SPECIMEN_LINE1}\n{SPECIMEN_LINE2}\n"
+    assert find_td3(text)['passport_number'] == 'L898902C3'
+    start, end = find_td3_span(text)
+    assert text[start:end] == SPECIMEN_LINE1 + '\n' + SPECIMEN_LINE2
+    assert find_td3(text.encode('ascii')) == find_td3(text)
+    assert find_td3('no machine readable zone') is None
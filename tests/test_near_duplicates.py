@@ -0,0 +1,110 @@
+"""
+Tests for near-duplicate lookup and result reuse.
+"""
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from document_classification_agent.field_extractor import extract_fields  # noqa: E402
+from document_classification_agent.mrz import format_td3  # noqa: E402
+from document_classification_agent.near_duplicates import LSH_BANDS, NearDuplicateIndex, reuse_result  # noqa: E402
+from document_classification_agent.sample_data import SAMPLE_DOCUMENTS  # noqa: E402
+
+# Boilerplate every customer's form shares, so two customers' forms are near-duplicates
+TEMPLATE_TERMS = '\n'.join(
+    f"Section {i}. The institution verifies the identity of each customer under its customer identification "
+    f"program, retains records of the documents used for {i * 12} months and reports suspicious activity."
+    for i in range(1, 13))
+
+
+def _kyc_form(name, customer_id, address):
+    """A customer's KYC form on the shared template, with the address written without its label."""
+    return (f"Know Your Customer (KYC) Verification Document\n\nCustomer Name: {name}\nCustomer ID: {customer_id}\n"
+            f"Date of Birth: January 15, 1985\nPhone: (555) 123-4567\nEmail: kyc@bank.example\n"
+            f"ID Document Type: Driver's License\nDocument Number: DL123456789\nVerification Date: March 15, 2024\n"
+            f"Risk Level: Low\n\nResidence on file:\n{address}\n\n{TEMPLATE_TERMS}\n")
+
+
+def _indexed(document, extraction):
+    index = NearDuplicateIndex(':memory:')
+    index.add(document, {'document_type': 'kyc', 'confidence': 0.9}, extraction)
+    return index
+
+
+def _llm_extraction(document, **filled):
+    """The local extraction of a document plus fields the model filled from unlabelled text."""
+    extraction = extract_fields('kyc', document)
+    extraction['extracted_fields'].update(filled)
+    extraction['missing_fields'] = [field for field in extraction['missing_fields'] if field not in filled]
+    return extraction
+
+
+def test_model_filled_fields_are_not_copied_to_another_customer():
+    john = _kyc_form('John Smith', 'KYC-2024-001', '123 Main Street, New York, NY 10001')
+    jane = _kyc_form('Jane Roe', 'KYC-2024-002', '9 Elm Road, Springfield, IL 62701')
+    index = _indexed(john, _llm_extraction(john, address='123 Main Street, New York, NY 10001'))
+
+    match = index.lookup(jane)
+    assert match is not None
+    result = reuse_result(match, jane)
+    fields = result['extraction']['extracted_fields']
+    assert 'address' in result['unresolved']
+    assert 'address' not in fields and 'address' in result['extraction']['missing_fields']
+    assert '123 Main Street, New York, NY 10001' not in str(result)
+    # Labelled fields are read from Jane's own lines
+    assert fields['customer_name'] == 'Jane Roe' and fields['customer_id'] == 'KYC-2024-002'
+    assert sorted(result['reextracted']) == ['customer_id', 'customer_name']
+
+
+def test_fully_labelled_near_duplicate_is_reused_without_unresolved_fields():
+    original = SAMPLE_DOCUMENTS['kyc'] + TEMPLATE_TERMS
+    resubmitted = original.replace('Risk Level: Low', 'Risk Level: High')
+    index = _indexed(original, extract_fields('kyc', original))
+    result = reuse_result(index.lookup(resubmitted), resubmitted)
+    assert result['unresolved'] == [] and result['reextracted'] == ['risk_level']
+    assert result['extraction']['extracted_fields'] == extract_fields('kyc', resubmitted)['extracted_fields']
+
+
+def test_dissimilar_document_is_not_matched():
+    index = _indexed(SAMPLE_DOCUMENTS['kyc'] + TEMPLATE_TERMS, None)
+    assert index.lookup(SAMPLE_DOCUMENTS['w9']) is None
+
+
+def test_verified_mrz_still_wins_over_a_changed_label():
+    mrz = format_td3('P123456789', 'JOHNSON', 'MARY ELIZABETH', 'USA', '900612', 'F', '300114')
+    original = SAMPLE_DOCUMENTS['passport'] + TEMPLATE_TERMS + '\n' + mrz + '\n'
+    edited = original.replace('Surname: JOHNSON', 'Surname: JOHNSTON')
+    index = NearDuplicateIndex(':memory:')
+    index.add(original, {'document_type': 'passport'}, extract_fields('passport', original))
+    result = reuse_result(index.lookup(edited), edited)
+    assert result['unresolved'] == []
+    assert result['extraction']['extracted_fields']['surname'] == 'JOHNSON'
+    assert result['extraction']['mrz_conflicts']['surname'] == 'JOHNSTON'
+
+
+def test_entries_of_an_old_fingerprint_do_not_hide_a_current_match():
+    john = _kyc_form('John Smith', 'KYC-2024-001', '123 Main Street, New York, NY 10001')
+    index = NearDuplicateIndex(':memory:')
+    fingerprint = ['old']
+    index.fingerprint = lambda: fingerprint[0]
+    # Exact copies from before an instruction change share every band, more than the current entry does
+    for _ in range(10):
+        index.add(john, {'document_type': 'kyc', 'confidence': 0.9})
+    fingerprint[0] = 'new'
+    current = index.add(john.replace('KYC-2024-001', 'KYC-2024-009'), {'document_type': 'kyc', 'confidence': 0.8})
+
+    match = index.lookup(john)
+    assert match is not None and match['entry'] == current
+    assert index.threshold <= match['similarity'] < 1 and match['classification']['confidence'] == 0.8
+
+
+def test_adding_the_same_document_again_replaces_its_entry():
+    document = SAMPLE_DOCUMENTS['kyc'] + TEMPLATE_TERMS
+    index = NearDuplicateIndex(':memory:')
+    first = index.add(document, {'document_type': 'kyc', 'confidence': 0.7})
+    # Whitespace differences normalize to the same text
+    second = index.add(document.replace('\n', '\n\n'), {'document_type': 'kyc', 'confidence': 0.9})
+    assert first == second and len(index) == 1
+    assert index._conn.execute('SELECT COUNT(*) FROM buckets').fetchone()[0] == LSH_BANDS
+    assert index.lookup(document)['classification']['confidence'] == 0.9
@@ -0,0 +1,71 @@
+"""
+Tests for the result cache keys and backends.
+"""
+
+from types import SimpleNamespace
+
+from document_classification_agent.result_cache import (
+    InMemoryLRUBackend,
+    ResultCache,
+    SQLiteBackend,
+    agent_fingerprint,
+)
+
+
+def _agent(name='classifier', model='gemini-2.0-flash', instruction='Classify the document.'):
+    return SimpleNamespace(name=name, model=model, instruction=instruction)
+
+
+def test_key_ignores_whitespace_and_case():
+    cache = ResultCache(InMemoryLRUBackend(), lambda: [_agent()])
+    assert cache.key('classification', 'W-9 Form\n\n  Name: Jane') == cache.key('classification', 'w-9 form name: jane')
+    assert cache.key('classification', 'W-9 Form') != cache.key('classification', 'W-8 Form')
+
+
+def test_key_separates_result_kinds():
+    cache = ResultCache(InMemoryLRUBackend(), lambda: [_agent()])
+    assert cache.key('classification', 'text') != cache.key('extraction', 'text')
+
+
+def test_fingerprint_changes_with_agent_instruction_and_model():
+    base = agent_fingerprint([_agent()])
+    assert agent_fingerprint([_agent()]) == base
+    assert agent_fingerprint([_agent(instruction='Classify carefully.')]) != base
+    assert agent_fingerprint([_agent(model='gemini-2.5-flash')]) != base
+    # BaseLlm instances are fingerprinted by their model name
+    assert agent_fingerprint([_agent(model=SimpleNamespace(model='gemini-2.0-flash'))]) == base
+
+
+def test_editing_an_agent_invalidates_cached_results():
+    agents = [_agent()]
+    cache = ResultCache(InMemoryLRUBackend(), lambda: agents)
+    cache.put('classification', 'text', {'document_type': 'w9'})
+    assert cache.get('classification', 'text') == {'document_type': 'w9'}
+    agents[0] = _agent(instruction='New prompt.')
+    assert cache.get('classification', 'text') is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_memory_backend_evicts_least_recently_used_and_expired():
+    now = [0.0]
+    backend = InMemoryLRUBackend(max_entries=2, ttl=10, clock=lambda: now[0])
+    backend.set('a', 1)
+    backend.set('b', 2)
+    backend.get('a')
+    backend.set('c', 3)
+    assert backend.get('b') is None and backend.get('a') == 1
+    now[0] = 11
+    assert backend.get('a') is None
+    assert backend.evictions == 2
+
+
+def test_sqlite_backend_persists_across_connections(tmp_path):
+    path = str(tmp_path / 'results.db')
+    backend = SQLiteBackend(path)
+    backend.set('key', {'fields': ['name']})
+    backend.close()
+    reopened = SQLiteBackend(path, max_entries=1)
+    assert reopened.get('key') == {'fields': ['name']}
+    reopened.set('other', 1)
+    assert len(reopened) == 1 and reopened.get('key') is None
+    reopened.close()
@@ -0,0 +1,90 @@
+"""
+Tests for the callbacks that route documents around the agents and record their results in state.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from google.adk.models import LlmRequest
+from google.genai import types
+from local_llm import install_local_model
+
+from document_classification_agent.result_cache import InMemoryLRUBackend, ResultCache
+from document_classification_agent.routing import KeywordFastPathRouter, ResultCacheCallbacks
+from document_classification_agent.sample_data import SAMPLE_DOCUMENTS
+
+
+def _user(text):
+    return types.Content(role='user', parts=[types.Part(text=text)])
+
+
+def test_fast_path_decides_once_per_invocation_from_the_user_message():
+    router = KeywordFastPathRouter({'kyc': 'kyc_extractor'})
+    context = SimpleNamespace(invocation_id='e-1', user_content=_user(SAMPLE_DOCUMENTS['kyc']), state={})
+    response = router(context, LlmRequest(contents=[_user(SAMPLE_DOCUMENTS['kyc'])]))
+    assert response.content.parts[0].function_call.args == {'agent_name': 'kyc_extractor'}
+
+    # Another agent's turn, rewritten by ADK as user-role context, is not scored again
+    transcript = _user(f"For context:\n[kyc_extractor] said: {SAMPLE_DOCUMENTS['kyc']}")
+    assert router(context, LlmRequest(contents=[_user(SAMPLE_DOCUMENTS['kyc']), transcript])) is None
+    assert (router.fast_path_count, router.llm_path_count) == (1, 0)
+
+    # A new invocation is scored from its own user message, whatever the request ends with
+    context = SimpleNamespace(invocation_id='e-2', user_content=_user(SAMPLE_DOCUMENTS['unknown']), state={})
+    assert router(context, LlmRequest(contents=[transcript])) is None
+    assert (router.fast_path_count, router.llm_path_count) == (1, 1)
+
+
+async def _final_state(document):
+    """Run the document through the agent tree on the routing model; returns the session state."""
+    from google.adk.runners import InMemoryRunner
+
+    from document_classification_agent import agent
+
+    runner = InMemoryRunner(agent=agent.multi_agent_root, app_name='test')
+    session = await runner.session_service.create_session(app_name='test', user_id='user')
+    async for _ in runner.run_async(user_id='user', session_id=session.id, new_message=_user(document)):
+        pass
+    session = await runner.session_service.get_session(app_name='test', user_id='user', session_id=session.id)
+    return session.state
+
+
+def test_extraction_state_is_a_dict_on_the_local_and_model_paths():
+    from document_classification_agent import agent
+    from document_classification_agent.result_cache import walk_agents
+    from document_classification_agent.stub_model import routing_model
+
+    previous = install_local_model(agent.multi_agent_root, routing_model())
+    cache_enabled, agent.result_cache_callbacks.enabled = agent.result_cache_callbacks.enabled, False
+    try:
+        local = asyncio.run(_final_state(SAMPLE_DOCUMENTS['kyc']))
+        # A missing phone number sends the document to the extraction specialist's model
+        model = asyncio.run(_final_state(SAMPLE_DOCUMENTS['kyc'].replace('Phone: (555) 123-4567\n', '')))
+    finally:
+        for sub_agent in walk_agents(agent.multi_agent_root):
+            sub_agent.model = previous[sub_agent.name]
+        agent.result_cache_callbacks.enabled = cache_enabled
+
+    assert local['result_source'] == 'local_extraction'
+    assert isinstance(local['extraction'], dict) and local['extraction']['extracted_fields']
+    assert model.get('result_source') is None
+    assert isinstance(model['extraction'], dict) and 'phone_number' in model['extraction']['missing_fields']
+    assert model['extraction_reply'] == 'Extraction complete'
+
+
+def test_result_cache_callbacks_keep_each_agent_tree_apart():
+    def context(root, state):
+        invocation = SimpleNamespace(agent=SimpleNamespace(root_agent=root))
+        return SimpleNamespace(_invocation_context=invocation, user_content=_user(SAMPLE_DOCUMENTS['w9']), state=state)
+
+    multi_agent = SimpleNamespace(name='root', model='gemini-2.0-flash', instruction='Route.', sub_agents=[])
+    single_shot = SimpleNamespace(name='single_shot', model='gemini-2.0-flash', instruction='Answer.', sub_agents=[])
+    # The default agents are neither tree, as when root_agent is the other mode's root
+    callbacks = ResultCacheCallbacks(ResultCache(InMemoryLRUBackend(), lambda: [single_shot]))
+    callbacks.after_agent(context(multi_agent, {'classification': {'document_type': 'w9'},
+                                                'extraction': {'extracted_fields': {}}}))
+
+    assert callbacks.before_agent(context(single_shot, {})) is None
+    state = {}
+    assert callbacks.before_agent(context(multi_agent, state)) is not None
+    assert state['result_source'] == 'result_cache'
@@ -0,0 +1,133 @@
+"""
+Tests for extraction specialists run speculatively while the LLM classifies.
+"""
+
+import asyncio
+
+import pytest
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+from local_llm import LatencyModel, install_local_model, text_response
+
+from document_classification_agent.result_cache import walk_agents
+from document_classification_agent.routing import LocalExtractionCallback
+from document_classification_agent.sample_data import SAMPLE_DOCUMENTS
+
+
+class _OverruledClassifier:
+    """Routing responder whose classifier calls every document unknown instead of transferring it."""
+
+    def __init__(self, responder):
+        self.responder = responder
+
+    def __call__(self, llm_request):
+        response = self.responder(llm_request)
+        call = response.content.parts[0].function_call
+        if (call is not None and call.name == 'transfer_to_agent'
+                and 'classify_document_with_llm' in llm_request.tools_dict):
+            return text_response('Unsupported document')
+        return response
+
+
+@pytest.fixture
+def speculation(monkeypatch):
+    """The agent tree on a routing model that overrules the keyword type, speculating on the top type."""
+    from document_classification_agent import agent
+    from document_classification_agent.stub_model import routing_model
+
+    # Each call takes long enough that a two-call speculation finishes before the three-call LLM flow
+    model = routing_model(LatencyModel(0.1))
+    model.responder = _OverruledClassifier(model.responder)
+    previous = install_local_model(agent.multi_agent_root, model)
+    speculation = agent.speculative_extraction
+    monkeypatch.setattr(agent.keyword_fast_path, 'enabled', False)
+    monkeypatch.setattr(agent.result_cache_callbacks, 'enabled', False)
+    for sub_agent in agent.multi_agent_root.sub_agents:
+        for callback in sub_agent.before_agent_callback or []:
+            if isinstance(callback, LocalExtractionCallback):
+                monkeypatch.setattr(callback, 'enabled', False)
+    monkeypatch.setattr(speculation, 'enabled', True)
+    monkeypatch.setattr(speculation, 'top_k', 1)
+    speculation.reset_stats()
+    try:
+        yield speculation
+    finally:
+        for sub_agent in walk_agents(agent.multi_agent_root):
+            sub_agent.model = previous[sub_agent.name]
+        speculation.reset_stats()
+
+
+async def _run(documents):
+    """Run each document in a fresh session; returns the sessions after their runs."""
+    from document_classification_agent import agent
+
+    runner = InMemoryRunner(agent=agent.multi_agent_root, app_name='test')
+    sessions = []
+    for document in documents:
+        session = await runner.session_service.create_session(app_name='test', user_id='user')
+        message = types.Content(role='user', parts=[types.Part(text=document)])
+        async for _ in runner.run_async(user_id='user', session_id=session.id, new_message=message):
+            pass
+        sessions.append(await runner.session_service.get_session(app_name='test', user_id='user',
+                                                                 session_id=session.id))
+    return sessions
+
+
+def test_mispredicted_speculation_leaves_the_session_alone_and_counts_as_waste(speculation, monkeypatch):
+    branches = []
+    run = speculation._run
+
+    async def recorded_run(*args):
+        branches.append(await run(*args))
+        return branches[-1]
+
+    monkeypatch.setattr(speculation, '_run', recorded_run)
+    session, = asyncio.run(_run([SAMPLE_DOCUMENTS['kyc']]))
+
+    # The branch extracted the document on its session copy
+    (state_delta, reply), = branches
+    assert isinstance(state_delta['extraction'], dict) and reply is not None
+    # None of it reached the live session, since the LLM flow never chose kyc
+    assert 'extraction' not in session.state and 'extraction_reply' not in session.state
+    assert not any(event.author == 'kyc_extraction_specialist' for event in session.events)
+    assert (speculation.launched, speculation.used, speculation.wasted) == (1, 0, 1)
+    assert speculation.wasted_calls == 2
+
+
+def test_speculation_stops_once_the_waste_budget_is_spent(speculation, monkeypatch):
+    monkeypatch.setattr(speculation, 'max_wasted_calls_per_document', 0.5)
+    asyncio.run(_run([SAMPLE_DOCUMENTS['kyc']] * 3))
+    # The first document's wasted calls (2) exceed 0.5 per document for the next two
+    assert speculation.documents == 3
+    assert speculation.launched == 1 and speculation.over_budget == 2
+    assert speculation.wasted_calls == 2
+
+
+def test_speculation_still_running_is_cancelled_when_the_run_ends(speculation, monkeypatch):
+    from document_classification_agent import agent
+    from document_classification_agent.stub_model import routing_model
+
+    # The kyc specialist's model is slower than the whole LLM flow, so its branch is mid-call at the end;
+    # the fixture puts every agent's model back
+    agent.kyc_extraction_agent.model = routing_model(LatencyModel(5.0))
+    outcomes = []
+    run = speculation._run
+
+    async def recorded_run(*args):
+        try:
+            return await run(*args)
+        except asyncio.CancelledError:
+            outcomes.append('cancelled')
+            raise
+
+    monkeypatch.setattr(speculation, '_run', recorded_run)
+
+    async def run_and_settle():
+        sessions = await _run([SAMPLE_DOCUMENTS['kyc']])
+        await asyncio.sleep(0)  # let the cancellation reach the branch
+        return sessions
+
+    session, = asyncio.run(run_and_settle())
+    assert outcomes == ['cancelled']
+    assert (speculation.launched, speculation.used, speculation.wasted, speculation.wasted_calls) == (1, 0, 1, 1)
+    assert 'extraction' not in session.state
@@ -0,0 +1,54 @@
+"""
+Tests for the per-stage latency histograms.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from document_classification_agent.tracing import JsonlSpanSink, StageHistograms, StageTracer, load_spans
+
+
+def _span(duration_ms, kind='model', stage='classifier', **attributes):
+    return {'kind': kind, 'stage': stage, 'start_time_unix_nano': 0,
+            'end_time_unix_nano': int(duration_ms * 1e6), 'attributes': attributes, 'status': 'OK'}
+
+
+def test_buckets_and_percentiles_are_exact_below_the_reservoir_size():
+    histograms = StageHistograms(bounds_ms=(1, 10, 100))
+    for duration in (0.5, 1, 5, 10, 50, 500):
+        histograms.add(_span(duration, prompt_tokens=3))
+    stats = histograms.summary()['model classifier']
+    # A duration equal to a bound falls in that bound's bucket
+    assert stats['buckets'] == [2, 2, 1, 1]
+    assert stats['count'] == 6 and stats['max_ms'] == 500 and stats['total_ms'] == 566.5
+    assert stats['p50_ms'] == 5 and stats['p99_ms'] == 500
+    assert stats['prompt_tokens'] == 18
+
+
+def test_memory_per_stage_is_bounded():
+    histograms = StageHistograms(reservoir_size=100)
+    for i in range(10000):
+        histograms.add(_span(i % 100))
+    histograms.add(_span(1, kind='tool', stage='classify'))
+    assert all(len(samples) <= 100 for samples in histograms._samples.values())
+    summary = histograms.summary()
+    stats = summary['model classifier']
+    assert stats['count'] == 10000 and sum(stats['buckets']) == 10000 and stats['max_ms'] == 99
+    # The reservoir is a uniform sample, so its median lands near the true one
+    assert 35 <= stats['p50_ms'] <= 65
+    assert summary['tool classify']['count'] == 1
+
+
+def test_each_run_is_written_when_it_ends_without_close(tmp_path):
+    path = str(tmp_path / 'trace.jsonl')
+    tracer = StageTracer(JsonlSpanSink(path))
+
+    async def run(invocation_id):
+        context = SimpleNamespace(app_name='app', invocation_id=invocation_id)
+        await tracer.before_run_callback(invocation_context=context)
+        await tracer.after_run_callback(invocation_context=context)
+
+    asyncio.run(run('first'))
+    assert [span['attributes']['invocation_id'] for span in load_spans(path)] == ['first']
+    asyncio.run(run('second'))
+    assert [span['attributes']['invocation_id'] for span in load_spans(path)] == ['first', 'second']
@@ -0,0 +1,108 @@
+"""Tests for the weather provider's cache, request coalescing and client lifetime, against the local stub API."""
+
+import asyncio
+
+from weather_provider import WeatherProvider, WeatherUnavailable
+from weather_stub_server import WeatherStubServer
+
+
+def test_concurrent_misses_share_one_upstream_request():
+    async def main():
+        async with WeatherStubServer(latency=0.05, jitter=0) as server:
+            provider = WeatherProvider(server.url)
+            spellings = ['New York, NY', ' new york ,ny', 'NEW YORK, NY.'] * 4
+            results = await asyncio.gather(*(provider.conditions(location) for location in spellings))
+            await provider.aclose()
+            return server.requests, provider, results
+
+    requests, provider, results = asyncio.run(main())
+    assert requests == 1
+    assert provider.upstream_requests == 1 and provider.coalesced == 11
+    assert all(result == results[0] for result in results)
+
+
+def test_cached_conditions_expire_after_ttl():
+    async def main():
+        async with WeatherStubServer(latency=0, jitter=0) as server:
+            provider = WeatherProvider(server.url, ttl=0.1)
+            await provider.conditions('Paris')
+            await provider.conditions('paris')
+            cached = server.requests
+            await asyncio.sleep(0.15)
+            await provider.conditions('Paris')
+            await provider.aclose()
+            return cached, server.requests, provider.hits
+
+    cached, requests, hits = asyncio.run(main())
+    assert cached == 1 and hits == 1
+    assert requests == 2
+
+
+def test_failure_reaches_every_waiter_and_is_not_cached():
+    async def main():
+        # A port with nothing listening refuses the first lookups; a server started on it then answers the retry
+        async with WeatherStubServer() as gone:
+            port = gone.port
+        provider = WeatherProvider(f'http://127.0.0.1:{port}')
+        failures = await asyncio.gather(*(provider.conditions('Berlin') for _ in range(5)), return_exceptions=True)
+        stats = provider.stats()
+        async with WeatherStubServer(port=port, latency=0, jitter=0) as server:
+            conditions = await provider.conditions('Berlin')
+            await provider.aclose()
+            return failures, stats, conditions, server.requests
+
+    failures, stats, conditions, requests = asyncio.run(main())
+    assert all(isinstance(failure, WeatherUnavailable) for failure in failures)
+    assert stats['upstream_requests'] == 1 and stats['errors'] == 1 and stats['entries'] == 0
+    assert conditions['condition'] and requests == 1
+
+
+def _serve_stub_while(run):
+    """Serve a stub API on its own loop while run(url) uses it from other loops in a worker thread."""
+    loop = asyncio.new_event_loop()
+    server = WeatherStubServer(latency=0, jitter=0)
+    loop.run_until_complete(server.start())
+    try:
+        return loop.run_until_complete(loop.run_in_executor(None, run, server.url))
+    finally:
+        loop.run_until_complete(server.close())
+        loop.close()
+
+
+def test_client_is_closed_when_asyncio_run_shuts_its_loop_down():
+    provider = WeatherProvider(ttl=0)
+
+    async def lookup():
+        await provider.conditions('Rome')
+        return provider._client
+
+    def run(url):
+        provider.base_url = url
+        return asyncio.run(lookup())
+
+    client = _serve_stub_while(run)
+    assert client.is_closed
+
+
+def test_moving_to_another_loop_closes_the_client_on_its_own_loop():
+    provider = WeatherProvider(ttl=0)
+    first = asyncio.new_event_loop()
+
+    async def lookup():
+        await provider.conditions('Madrid')
+        return provider._client
+
+    def run(url):
+        # The first loop stays open, as under a long-lived server, while the provider moves to a second one
+        provider.base_url = url
+        old_client = first.run_until_complete(lookup())
+        new_client = asyncio.run(lookup())
+        first.run_until_complete(asyncio.sleep(0.05))  # runs the closer the move cancelled
+        return old_client, new_client
+
+    try:
+        old_client, new_client = _serve_stub_while(run)
+    finally:
+        first.close()
+    assert old_client is not new_client
+    assert old_client.is_closed and new_client.is_closed
@@ -0,0 +1,150 @@
+"""
+Tests for the SQLite job queue's leases and the worker loop that holds them.
+"""
+
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+from local_llm import LatencyModel, install_local_model
+
+from document_classification_agent import worker_service
+from document_classification_agent.result_cache import walk_agents
+from document_classification_agent.sample_data import SAMPLE_DOCUMENTS
+from document_classification_agent.worker_service import JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.db'))
+    yield queue
+    queue.close()
+
+
+def test_claim_leases_a_job_to_one_worker(queue):
+    queue.enqueue(['first', 'second'])
+    first = queue.claim('a')
+    second = queue.claim('b')
+    assert (first.document, second.document) == ('first', 'second')
+    assert queue.claim('c') is None
+
+
+def test_expired_lease_is_claimed_again_and_fences_the_old_attempt(queue):
+    queue.enqueue(['document'])
+    stale = queue.claim('a', lease=-1)  # already expired
+    current = queue.claim('b')
+    assert current.id == stale.id and current.attempts == stale.attempts + 1
+    assert not queue.renew(stale)
+    assert not queue.ack(stale, {'by': 'a'})
+    assert queue.ack(current, {'by': 'b'})
+    assert queue.results()[current.id]['result'] == {'by': 'b'}
+
+
+def test_renewed_lease_is_not_claimed_again(queue):
+    queue.enqueue(['document'])
+    job = queue.claim('a', lease=-1)
+    assert queue.renew(job, lease=60)
+    assert queue.claim('b') is None
+
+
+def test_release_returns_the_job_without_using_an_attempt(queue):
+    queue.enqueue(['document'])
+    job = queue.claim('a')
+    assert queue.release(job)
+    assert queue.claim('b').attempts == job.attempts
+
+
+def _take_over(path):
+    """Claim the running job for another attempt, as a worker that found its lease expired would."""
+    connection = sqlite3.connect(path, timeout=30.0)
+    with connection:
+        connection.execute("UPDATE jobs SET attempts = attempts + 1 WHERE status = 'running'")
+    connection.close()
+
+
+def _drain_slow_job(path, lease, take_over_after=None):
+    """
+    Process one document that needs the extraction model, slower than ``lease``, with two work loops.
+
+    ``take_over_after`` seconds in, another attempt takes the job over.
+    """
+    from document_classification_agent import agent
+    from document_classification_agent.stub_model import routing_model
+
+    queue = JobQueue(path)
+    # A missing phone number sends the document to the extraction specialist: two model calls of 0.4 s
+    queue.enqueue([SAMPLE_DOCUMENTS['kyc'].replace('Phone: (555) 123-4567\n', '')])
+    previous = install_local_model(agent.root_agent, routing_model(LatencyModel(0.4)))
+    cache_enabled, agent.result_cache_callbacks.enabled = agent.result_cache_callbacks.enabled, False
+    take_over = threading.Timer(take_over_after, _take_over, (path,)) if take_over_after else None
+    try:
+        if take_over:
+            take_over.start()
+        totals = asyncio.run(worker_service._serve(queue, 'worker', agent.root_agent, 2, 2, lambda: False,
+                                                   exit_when_empty=True, grace=1.0, lease=lease))
+        return totals, next(iter(queue.results().values()))
+    finally:
+        if take_over:
+            take_over.join()
+        for sub_agent in walk_agents(agent.root_agent):
+            sub_agent.model = previous[sub_agent.name]
+        agent.result_cache_callbacks.enabled = cache_enabled
+        queue.close()
+
+
+def test_lease_is_renewed_while_a_job_runs_past_it(tmp_path):
+    totals, job = _drain_slow_job(str(tmp_path / 'jobs.db'), lease=0.5)
+    assert job['status'] == 'done' and job['attempts'] == 1
+    assert totals['documents'] == 1 and totals['lost_leases'] == 0
+
+
+def test_without_renewal_a_long_job_is_claimed_again(tmp_path, monkeypatch):
+    # Control for the test above: renewing too late lets the other loop take the job over, again and again
+    monkeypatch.setattr(worker_service, 'LEASE_RENEW_FRACTION', 100)
+    _, job = _drain_slow_job(str(tmp_path / 'jobs.db'), lease=0.5)
+    assert job['attempts'] > 1
+
+
+def test_run_is_abandoned_when_another_attempt_takes_the_job(tmp_path):
+    totals, job = _drain_slow_job(str(tmp_path / 'jobs.db'), lease=0.5, take_over_after=0.25)
+    # The first run stopped at its next renewal; the taken-over attempt's lease expired and the job ran once more
+    assert totals['lost_leases'] == 1 and totals['documents'] == 1
+    assert job['status'] == 'done' and job['attempts'] == 3
+
+
+def test_failed_renewal_retries_the_job_and_keeps_the_worker_running(tmp_path, monkeypatch):
+    renew = JobQueue.renew
+    failures = []
+
+    def renew_failing_once(self, job, lease):
+        if not failures:
+            failures.append(job.attempts)
+            raise sqlite3.OperationalError('database is locked')
+        return renew(self, job, lease)
+
+    monkeypatch.setattr(JobQueue, 'renew', renew_failing_once)
+    monkeypatch.setattr(worker_service, 'JOB_RETRY_BASE_DELAY', 0.01)
+    totals, job = _drain_slow_job(str(tmp_path / 'jobs.db'), lease=0.5)
+    assert failures == [1]
+    assert job['status'] == 'done' and job['attempts'] == 2
+    assert totals['documents'] == 1 and totals['failures'] == 0
+
+
+def test_ack_after_the_lease_expired_is_counted_as_a_lost_lease(tmp_path, monkeypatch):
+    path = str(tmp_path / 'jobs.db')
+    ack = JobQueue.ack
+    acks = []
+
+    def ack_after_take_over(self, job, result):
+        # The first attempt's lease runs out just before it acks, and another attempt takes the job
+        if not acks:
+            _take_over(path)
+        acks.append(ack(self, job, result))
+        return acks[-1]
+
+    monkeypatch.setattr(JobQueue, 'ack', ack_after_take_over)
+    totals, job = _drain_slow_job(path, lease=0.5)
+    assert acks == [False, True]
+    assert totals['documents'] == 1 and totals['lost_leases'] == 1
+    assert job['status'] == 'done' and job['attempts'] == 3